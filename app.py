@@ -1,58 +1,213 @@
-from flask import Flask, render_template, jsonify, request
-import json
-from datetime import datetime, timedelta
+from flask import Flask, Response, make_response, render_template, jsonify, request, send_file
+import importlib
+import math
+import os
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
 from data.synthetic_data import (
-    get_dashboard_metrics, get_drivers_data, get_vehicles_data,
-    get_routes_data, get_weather_data, get_cost_analysis, get_driver_analytics
+    HUB_CITIES, get_dashboard_metrics
 )
+from data.cost_model import get_cost_analysis, run_ev_scenarios
+from data.distance_matrix import get_distance_matrix
+from data.fanout import SourceUnavailable, gather
+from data.driver_analytics import get_driver_analytics
+from data.fleet_store import get_fleet_store, reload_fleet_store
+from data.fuel_prices import (
+    DEFAULT_REGION as FUEL_DEFAULT_REGION, FUEL_TYPES, get_fuel_prices, overlay_fuel_prices
+)
+from data.leaderboard import CATEGORIES as LEADERBOARD_CATEGORIES, get_leaderboard_index
+from data.live_tracking import get_position_store, start_simulator
+from data.paths import INSTANCE_DIR
+from data.records import VehicleStatus
+from data.reports import get_report, list_reports, report_file, start_pool as start_report_pool, submit_report
+from data.road_graph import get_road_graph
+from data.rollups import EVENT_TYPES, KPI_PERIODS, RESOLUTIONS, get_rollups, overlay_dashboard
+from data.spatial import (
+    KINDS as GEO_KINDS, MAX_RADIUS_KM as GEO_MAX_RADIUS_KM, MAX_RESULTS as GEO_MAX_RESULTS, get_spatial_index,
+    index_fleet
+)
+from data.scheduler import (
+    MAX_AUTO_ASSIGN_DAYS, MAX_WEEKLY_DRIVING_MINUTES, PENDING_ROUTE_STATUS, ScheduleConflict, duration_minutes,
+    get_scheduler, to_minute
+)
+from data.route_planner import MAX_BATCH_SIZE, plan_route, plan_routes, start_pool as start_batch_pool
+from data.weather_impact import get_weather_engine, stations_from_weather
+from data.telemetry import decode_frame, get_telemetry_store, samples_from_json, start_flusher
+from data.vrp_solver import DEFAULT_TIME_BUDGET, MAX_DELIVERIES, solve_cvrp
+from json_provider import collection_response, dumps, install_json_provider, project, requested_fields
+from response_cache import FileCache, cached_response, invalidate, set_cache_backend
 
 app = Flask(__name__)
+# orjson when installed, stdlib otherwise; datetimes are ISO 8601 either way
+install_json_provider(app)
+
+# Load the fleet once at startup; every request reads the same indexed snapshot
+get_fleet_store()
+
+LIVE_KEEPALIVE_SECONDS = 15
+LIVE_MIN_INTERVAL_SECONDS = 0.25
+# Each open stream holds a server thread; past this many, new ones get 503
+LIVE_MAX_STREAMS = int(os.environ.get('WISE_ROUTES_MAX_STREAMS', 0)) or 32
+_stream_slots = threading.BoundedSemaphore(LIVE_MAX_STREAMS)
+TELEMETRY_FLUSH_SECONDS = 60
+
+# wsgi.py sets this: the gunicorn master imports the app and runs warm_up()
+# once, and start_background_tasks() runs in each worker after the fork
+PRELOAD = os.environ.get('WISE_ROUTES_PRELOAD') == '1'
+# Heavy modules that endpoints import on first use; warm_up() loads them ahead
+LAZY_MODULES = ('pandas', 'data.importer')
+WARMUP = {'ready': False, 'seconds': None, 'steps': {}}
+profiler = None
+
+def warm_up():
+    """Build everything requests share: data stores, indexes, search arrays, analytics and templates"""
+    started = time.perf_counter()
+    steps = {
+        'fleet': get_fleet_store,
+        'road_graph': lambda: get_road_graph().prepare_search(),
+        'fuel_prices': get_fuel_prices,
+        'spatial_index': get_spatial_index,
+        'leaderboard': get_leaderboard_index,
+        'driver_analytics': get_driver_analytics,
+        'weather': get_weather_engine,
+        'rollups': get_rollups,
+        'scheduler': get_scheduler,
+        'templates': lambda: [app.jinja_env.get_template(name) for name in app.jinja_env.list_templates()],
+        'modules': lambda: [importlib.import_module(name) for name in LAZY_MODULES]
+    }
+    for name, step in steps.items():
+        step_started = time.perf_counter()
+        step()
+        WARMUP['steps'][name] = round((time.perf_counter() - step_started) * 1000, 1)
+    WARMUP['seconds'] = round(time.perf_counter() - started, 3)
+    WARMUP['ready'] = True
+
+def start_process_pools():
+    """Fork the route batch and report pools while the process has a single thread"""
+    start_batch_pool()
+    start_report_pool()
+
+def start_background_tasks():
+    """Start the threads of a serving process, and warm it up unless preloaded"""
+    # Local simulator feeding live tracking until real telemetry is connected
+    if os.environ.get('WISE_ROUTES_SIMULATOR', '1') == '1':
+        start_simulator(get_fleet_store().routes,
+                        on_complete=lambda route: get_rollups().record('route_completed', distance_km=route.distance))
+    start_flusher(TELEMETRY_FLUSH_SECONDS)
+    if profiler is not None:
+        profiler.start()
+    if not WARMUP['ready']:
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+# Response cache: in-process by default, WISE_ROUTES_CACHE=file shares it between workers
+if os.environ.get('WISE_ROUTES_CACHE') == 'file':
+    set_cache_backend(FileCache(os.path.join(INSTANCE_DIR, 'response_cache')))
+
+PAGE_CACHE_SECONDS = 60
+API_CACHE_SECONDS = 300
+
+def fleet_version():
+    return get_fleet_store().version
+
+def page_response(html, stale):
+    """Rendered page, flagged (and kept out of the cache) if any source was stale"""
+    response = make_response(html)
+    if stale:
+        response.headers['Warning'] = '110 - "Response is Stale"'
+        response.headers['X-Stale-Sources'] = ','.join(stale)
+    return response
+
+@app.errorhandler(SourceUnavailable)
+def source_unavailable(error):
+    """A page source timed out before its first value: ask the client to retry"""
+    return 'Dados ainda carregando, tente novamente em instantes', 503, {'Retry-After': '5'}
+
+def fuel_prices_version():
+    return get_fuel_prices().version
+
+def costs_version():
+    return f'{fuel_prices_version()}:{fleet_version()}'
+
+def dashboard_metrics():
+    """Dashboard metrics with KPIs and trends from the event rollups and fuel prices from the price store"""
+    return overlay_fuel_prices(overlay_dashboard(get_dashboard_metrics(), get_rollups()), get_fuel_prices())
 
 @app.route('/')
 def dashboard():
-    metrics = get_dashboard_metrics()
-    return render_template('dashboard.html', metrics=metrics)
+    sources, stale = gather('dashboard', {'dashboard_metrics': dashboard_metrics})
+    return page_response(render_template('dashboard.html', metrics=sources['dashboard_metrics']), stale)
 
 @app.route('/map')
 def map_view():
-    routes = get_routes_data()
-    return render_template('map.html', routes=routes)
+    sources, stale = gather('map', {'routes': lambda: get_fleet_store().routes})
+    return page_response(render_template('map.html', routes=sources['routes']), stale)
 
 @app.route('/drivers')
 def drivers():
-    drivers_data = get_drivers_data()
-    analytics = get_driver_analytics()
-    return render_template('drivers.html', 
-                         drivers=drivers_data,
+    sources, stale = gather('drivers', {
+        'drivers': lambda: get_fleet_store().drivers,
+        'routes': lambda: [r for r in get_fleet_store().routes if r.status == PENDING_ROUTE_STATUS],
+        'driver_analytics': get_driver_analytics
+    })
+    analytics = sources['driver_analytics']
+    return page_response(render_template('drivers.html', 
+                         drivers=sources['drivers'],
+                         routes=sources['routes'],
                          best_driver=analytics['best_driver'],
                          fuel_savings=analytics['fuel_savings'],
                          efficiency_target=analytics['efficiency_target'],
-                         drivers_meeting_target=analytics['drivers_meeting_target'])
+                         drivers_meeting_target=analytics['drivers_meeting_target']), stale)
 
 @app.route('/vehicles')
 def vehicles():
-    vehicles_data = get_vehicles_data()
+    vehicles_data = get_fleet_store().vehicles
     return render_template('vehicles.html', vehicles=vehicles_data)
 
 @app.route('/costs')
+@cached_response('costs', ttl=PAGE_CACHE_SECONDS, depends_on=costs_version)
 def costs():
-    cost_data = get_cost_analysis()
-    return render_template('costs.html', costs=cost_data)
+    sources, stale = gather('costs', {'cost_analysis': get_cost_analysis})
+    return page_response(render_template('costs.html', costs=sources['cost_analysis']), stale)
+
+def forecast_version():
+    return f'{get_weather_engine().version}:{fleet_version()}'
 
 @app.route('/weather')
+@cached_response('weather', ttl=PAGE_CACHE_SECONDS, depends_on=forecast_version)
 def weather():
-    weather_data = get_weather_data()
-    return render_template('weather.html', weather=weather_data)
+    engine = get_weather_engine()
+    sources, stale = gather('weather', {
+        'weather': engine.conditions,
+        'route_impacts': lambda: engine.route_impacts(get_fleet_store())
+    })
+    return page_response(render_template('weather.html', weather=sources['weather'],
+                                         route_impacts=sources['route_impacts']), stale)
 
 @app.route('/reports')
 def reports():
-    return render_template('reports.html')
+    return render_template('reports.html', recent_reports=list_reports())
+
+@app.route('/api/drivers')
+def list_drivers():
+    """Stream every driver; supports ?fields= and ?format=ndjson"""
+    return collection_response(get_fleet_store().drivers)
+
+@app.route('/api/vehicles')
+def list_vehicles():
+    """Stream every vehicle; supports ?fields= and ?format=ndjson"""
+    return collection_response(get_fleet_store().vehicles)
+
+@app.route('/api/routes')
+def list_routes():
+    """Stream every route for the map; supports ?fields= and ?format=ndjson"""
+    return collection_response(get_fleet_store().routes)
 
 @app.route('/api/driver/<int:driver_id>')
 def get_driver_details(driver_id):
     """Get detailed information about a specific driver"""
-    drivers = get_drivers_data()
-    driver = next((d for d in drivers if d['id'] == driver_id), None)
+    driver = get_fleet_store().get_driver(driver_id)
     
     if not driver:
         return jsonify({'error': 'Driver not found'}), 404
@@ -62,34 +217,38 @@ def get_driver_details(driver_id):
 @app.route('/api/driver/<int:driver_id>/performance')
 def get_driver_performance(driver_id):
     """Get performance analytics for a specific driver"""
-    drivers = get_drivers_data()
-    driver = next((d for d in drivers if d['id'] == driver_id), None)
+    driver = get_fleet_store().get_driver(driver_id)
     
     if not driver:
         return jsonify({'error': 'Driver not found'}), 404
     
+    # Driving statistics from the assigned vehicle's recent telemetry
+    vehicle = get_fleet_store().get_vehicle_by_plate(driver.vehicle_assigned)
+    telemetry = get_telemetry_store().vehicle_summary(vehicle.id) if vehicle else None
+    
     # Enhanced performance data
     performance_data = {
         'driver_id': driver_id,
-        'name': driver['name'],
+        'name': driver.name,
         'current_metrics': {
-            'avg_consumption': driver['avg_consumption'],
-            'efficiency_score': driver['efficiency_score'],
-            'km_driven': driver['km_driven'],
-            'safety_score': driver['safety_score'],
-            'punctuality_score': driver['punctuality_score']
+            'avg_consumption': driver.avg_consumption,
+            'efficiency_score': driver.efficiency_score,
+            'km_driven': driver.km_driven,
+            'safety_score': driver.safety_score,
+            'punctuality_score': driver.punctuality_score
         },
-        'monthly_performance': driver['monthly_performance'],
-        'performance_history': driver['performance_history'],
-        'certifications': driver['certifications'],
+        'monthly_performance': driver.monthly_performance,
+        'performance_history': driver.performance_history,
+        'certifications': driver.certifications,
+        'telemetry': telemetry,
         'recommendations': [
             'Manter velocidade constante entre 80-90 km/h',
             'Evitar acelerações bruscas nos primeiros 5 minutos',
             'Realizar manutenção preventiva regularmente'
         ],
         'goals': {
-            'fuel_efficiency': driver['avg_consumption'] + 0.5,
-            'safety_target': min(driver['safety_score'] + 2, 100),
+            'fuel_efficiency': driver.avg_consumption + 0.5,
+            'safety_target': min(driver.safety_score + 2, 100),
             'training_completion': 100
         }
     }
@@ -103,24 +262,24 @@ def get_drivers_analytics():
     return jsonify(analytics)
 
 @app.route('/api/drivers/training')
+@cached_response('drivers', ttl=API_CACHE_SECONDS, depends_on=fleet_version)
 def get_training_modules():
     """Get available training modules and completion status"""
     analytics = get_driver_analytics()
     return jsonify({
         'modules': analytics['training_modules'],
-        'completion_stats': {
-            'total_modules': len(analytics['training_modules']),
-            'avg_completion': sum(m['completion_rate'] for m in analytics['training_modules']) / len(analytics['training_modules'])
-        }
+        'completion_stats': analytics['training_summary']
     })
 
 @app.route('/api/drivers/rewards')
+@cached_response('drivers', ttl=API_CACHE_SECONDS, depends_on=fleet_version)
 def get_reward_system():
     """Get reward system information and statistics"""
     analytics = get_driver_analytics()
     return jsonify(analytics['reward_system'])
 
 @app.route('/api/drivers/tips')
+@cached_response('drivers', ttl=API_CACHE_SECONDS, depends_on=fleet_version)
 def get_efficiency_tips():
     """Get fuel efficiency tips and recommendations"""
     analytics = get_driver_analytics()
@@ -131,125 +290,374 @@ def get_efficiency_tips():
 
 @app.route('/api/driver/assign-route', methods=['POST'])
 def assign_route_to_driver():
-    """Assign a route to a specific driver"""
-    data = request.get_json()
+    """Assign a route to a driver.
     
-    assignment = {
-        'assignment_id': f"assign_{hash(str(data)) % 10000}",
-        'driver_id': data.get('driver_id'),
-        'route_id': data.get('route_id'),
-        'scheduled_date': data.get('scheduled_date'),
-        'estimated_duration': data.get('estimated_duration'),
+    Body: driver_id, route_id, scheduled_date (ISO date or datetime),
+    optional start_time (HH:MM), estimated_duration, cargo_details and
+    special_instructions. Repeating the request, or its Idempotency-Key
+    header, returns the existing assignment.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Envie a atribuição como objeto JSON'}), 400
+    store = get_fleet_store()
+    try:
+        driver = store.get_driver(int(data['driver_id']))
+        route = store.get_route(int(data['route_id']))
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'driver_id e route_id são obrigatórios'}), 400
+    if driver is None or route is None:
+        return jsonify({'error': 'Motorista ou rota não encontrado'}), 404
+    
+    try:
+        start = data.get('scheduled_date') or route.date
+        if data.get('start_time'):
+            start = f"{start[:10]}T{data['start_time']}"
+        start = to_minute(start)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Data ou horário inválido'}), 400
+    duration = None
+    if data.get('estimated_duration'):
+        duration = duration_minutes(data['estimated_duration'])
+        if duration is None:
+            return jsonify({'error': 'Duração inválida. Use minutos ou "5h 30min", '
+                                     f'até {MAX_WEEKLY_DRIVING_MINUTES // 60}h'}), 400
+    
+    details = {
         'cargo_details': data.get('cargo_details'),
-        'special_instructions': data.get('special_instructions', ''),
-        'status': 'scheduled',
-        'created_at': datetime.now().isoformat()
+        'special_instructions': data.get('special_instructions', '')
     }
+    key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    if key is not None and not isinstance(key, str):
+        return jsonify({'error': 'idempotency_key deve ser um texto'}), 400
+    try:
+        assignment, created = get_scheduler().assign(driver, route, start, duration, details, key)
+    except ScheduleConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
     
     return jsonify({
         'success': True,
         'assignment': assignment,
-        'message': 'Rota atribuída com sucesso'
-    })
+        'message': 'Rota atribuída com sucesso' if created else 'Atribuição já existente'
+    }), 201 if created else 200
+
+@app.route('/api/driver/auto-assign', methods=['POST'])
+def auto_assign_routes():
+    """Assign the pending routes of {start, days} to available drivers; {dry_run: true} only simulates"""
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Envie os parâmetros como objeto JSON'}), 400
+    try:
+        first_day = date.fromisoformat(data.get('start') or date.today().isoformat())
+        days = int(data.get('days', 7))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'start deve ser uma data ISO e days um inteiro'}), 400
+    if not 1 <= days <= MAX_AUTO_ASSIGN_DAYS:
+        return jsonify({'error': f'days deve estar entre 1 e {MAX_AUTO_ASSIGN_DAYS}'}), 400
+    
+    store = get_fleet_store()
+    started = time.perf_counter()
+    result = get_scheduler().auto_assign(store.drivers, store.routes, first_day, days, bool(data.get('dry_run')))
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return jsonify(result)
+
+@app.route('/api/driver/assignments/<assignment_id>', methods=['DELETE'])
+def cancel_assignment(assignment_id):
+    """Cancel an assignment and free the driver's time"""
+    assignment = get_scheduler().cancel(assignment_id)
+    if assignment is None:
+        return jsonify({'error': 'Atribuição não encontrada'}), 404
+    return jsonify({'success': True, 'assignment': assignment})
 
 @app.route('/api/driver/<int:driver_id>/schedule')
 def get_driver_schedule(driver_id):
-    """Get driver's schedule and assignments"""
-    import random
-    
-    # Generate sample schedule data
-    schedule = []
-    for i in range(7):  # Next 7 days
-        date = datetime.now() + timedelta(days=i)
-        if random.random() < 0.7:  # 70% chance of having assignment
-            schedule.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'route': f'Rota {random.choice(["SP-RJ", "CWB-SP", "BH-RJ"])}',
-                'start_time': f'{random.randint(6, 10):02d}:00',
-                'estimated_duration': f'{random.randint(4, 8)}h {random.randint(0, 59)}min',
-                'status': random.choice(['scheduled', 'in_progress', 'completed'])
-            })
+    """Driver's assignments and driving hours for ?days= (default 7) days from ?start= (default today)"""
+    if get_fleet_store().get_driver(driver_id) is None:
+        return jsonify({'error': 'Motorista não encontrado'}), 404
+    try:
+        first_day = date.fromisoformat(request.args.get('start') or date.today().isoformat())
+    except ValueError:
+        return jsonify({'error': 'start deve ser uma data ISO'}), 400
+    days = min(max(request.args.get('days', 7, type=int), 1), MAX_AUTO_ASSIGN_DAYS)
     
-    return jsonify({
-        'driver_id': driver_id,
-        'schedule': schedule,
-        'total_assignments': len(schedule)
-    })
+    result = get_scheduler().schedule(driver_id, first_day, days)
+    schedule = [dict(a, date=a['start'][:10], start_time=a['start'][11:16]) for a in result.pop('assignments')]
+    return jsonify(dict(result, driver_id=driver_id, schedule=schedule, total_assignments=len(schedule)))
 
 @app.route('/api/drivers/leaderboard')
 def get_drivers_leaderboard():
-    """Get driver performance leaderboard"""
-    drivers = get_drivers_data()
+    """Get driver performance leaderboard.
     
-    # Sort drivers by efficiency score
-    leaderboard = sorted(drivers, key=lambda x: x['efficiency_score'], reverse=True)[:10]
+    Query parameters: category (one of LEADERBOARD_CATEGORIES), k (page
+    size), offset, depot and fields.
+    """
+    category = request.args.get('category', 'efficiency_score')
+    k = request.args.get('k', 10, type=int)
+    if k is None or not 1 <= k <= 100:
+        return jsonify({'error': 'k deve ser um inteiro entre 1 e 100'}), 400
+    offset = max(request.args.get('offset', 0, type=int) or 0, 0)
+    depot = request.args.get('depot')
+    fields = requested_fields()
     
-    for i, driver in enumerate(leaderboard):
-        driver['rank'] = i + 1
-        driver['badge'] = 'gold' if i < 3 else 'silver' if i < 6 else 'bronze'
+    index = get_leaderboard_index()
+    try:
+        driver_ids, total = index.page(category, k, offset, depot)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Copy the records so the shared store is never mutated
+    store = get_fleet_store()
+    leaderboard = []
+    for i, driver_id in enumerate(driver_ids):
+        rank = offset + i + 1
+        leaderboard.append(dict(
+            project(store.get_driver(driver_id), fields), rank=rank,
+            badge='gold' if rank <= 3 else 'silver' if rank <= 6 else 'bronze'
+        ))
     
     return jsonify({
         'leaderboard': leaderboard,
-        'categories': ['efficiency_score', 'avg_consumption', 'safety_score', 'punctuality_score']
+        'category': category,
+        'depot': depot,
+        'offset': offset,
+        'total': total,
+        'categories': list(LEADERBOARD_CATEGORIES),
+        'depots': index.depots()
     })
 
+@app.route('/api/driver/<int:driver_id>', methods=['PATCH'])
+def update_driver(driver_id):
+    """Update a driver's metrics; rankings and analytics follow"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Envie os campos do motorista como objeto JSON'}), 400
+    
+    try:
+        driver = get_fleet_store().update_driver(driver_id, **data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not driver:
+        return jsonify({'error': 'Driver not found'}), 404
+    
+    return jsonify(driver)
+
+@app.route('/api/fleet/reload', methods=['POST'])
+def reload_fleet():
+    """Rebuild the in-memory fleet store from the data source"""
+    store = reload_fleet_store()
+    invalidate('drivers')
+    index_fleet(get_spatial_index(), store)
+    return jsonify({'success': True, 'fleet': store.stats()})
+
+@app.route('/api/ready')
+def readiness():
+    """200 once this process is warmed up (see warm_up()), 503 before"""
+    status = dict(WARMUP, pid=os.getpid(), preloaded=PRELOAD)
+    return jsonify(status), 200 if WARMUP['ready'] else 503
+
+@app.route('/api/import/<kind>', methods=['POST'])
+def import_data(kind):
+    """Upload a CSV/XLSX of drivers, vehicles or routes and import it in the background"""
+    from data.importer import KINDS as IMPORT_KINDS, save_upload, start_import
+    
+    if kind not in IMPORT_KINDS:
+        return jsonify({'error': f"Tipo de importação inválido: {kind}. Use {', '.join(IMPORT_KINDS)}"}), 400
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': 'Envie o arquivo no campo "file"'}), 400
+    
+    def reload_after_import(state):
+        index_fleet(get_spatial_index(), reload_fleet_store())
+        invalidate('drivers')
+    
+    try:
+        path = save_upload(upload.stream, upload.filename or '')
+        key = start_import(path, kind, on_complete=reload_after_import)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'import_id': key, 'status_url': f'/api/import/{key}'}), 202
+
+@app.route('/api/import/<import_id>')
+def get_import_status(import_id):
+    """Progress of an import: rows done, imported and rejected"""
+    from data.importer import load_checkpoint
+    
+    state = load_checkpoint(import_id) if import_id.isalnum() else None
+    if state is None:
+        return jsonify({'error': 'Importação não encontrada'}), 404
+    return jsonify(state)
+
+@app.route('/api/reports', methods=['GET', 'POST'])
+def reports_api():
+    """Submit a report job (POST) or list recent reports (GET)"""
+    if request.method == 'GET':
+        return jsonify({'reports': list_reports()})
+    
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Envie os parâmetros do relatório como objeto JSON'}), 400
+    try:
+        state = submit_report(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    report_id = state['report_id']
+    return jsonify(dict(state, status_url=f'/api/reports/{report_id}',
+                        download_url=f'/api/reports/{report_id}/download')), \
+        200 if state['status'] == 'completed' else 202
+
+@app.route('/api/reports/<report_id>')
+def get_report_status(report_id):
+    """Status of a report job"""
+    state = get_report(report_id)
+    if state is None:
+        return jsonify({'error': 'Relatório não encontrado'}), 404
+    return jsonify(state)
+
+@app.route('/api/reports/<report_id>/download')
+def download_report(report_id):
+    """Download a finished report"""
+    state = get_report(report_id)
+    if state is None:
+        return jsonify({'error': 'Relatório não encontrado'}), 404
+    if state['status'] != 'completed':
+        return jsonify({'error': 'Relatório ainda não está pronto', 'status': state['status']}), 409
+    return send_file(report_file(state), as_attachment=True, download_name=state['filename'])
+
 # API endpoints
 @app.route('/api/route-optimization', methods=['POST'])
 def optimize_route():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Envie a requisição de rota como objeto JSON'}), 400
+    
+    # Shortest path on the road graph for the requested optimization type
+    try:
+        optimized_route = plan_route(data, get_weather_engine().planning_forecast(),
+                                     get_fuel_prices().regional('diesel_s10'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(optimized_route)
+
+@app.route('/api/route-optimization/batch', methods=['POST'])
+def optimize_routes_batch():
+    """Plan many routes at once, streaming NDJSON lines as each completes"""
     data = request.get_json()
+    route_requests = data.get('requests') if isinstance(data, dict) else data
+    
+    if not isinstance(route_requests, list) or not all(isinstance(r, dict) for r in route_requests):
+        return jsonify({'error': 'Envie uma lista de requisições de rota'}), 400
+    if len(route_requests) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'Máximo de {MAX_BATCH_SIZE} rotas por lote'}), 400
+    
+    forecast = get_weather_engine().planning_forecast()
+    fuel_prices = get_fuel_prices().regional('diesel_s10')
+    
+    def generate():
+        for line in plan_routes(route_requests, forecast, fuel_prices):
+            yield dumps(line) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/api/distance-matrix', methods=['POST'])
+def distance_matrix():
+    """Distance, duration and cost between every origin and destination hub"""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Envie um objeto JSON'}), 400
+    origins = data.get('origins') or [c['name'] for c in HUB_CITIES]
+    destinations = data.get('destinations') or origins
+    for field, places in (('origins', origins), ('destinations', destinations)):
+        if not isinstance(places, list) or not all(isinstance(p, str) for p in places):
+            return jsonify({'error': f'{field} deve ser uma lista de nomes de cidades'}), 400
     
-    # Enhanced route optimization with multiple algorithms
-    origin = data.get('origin', '')
-    destination = data.get('destination', '')
-    vehicle_id = data.get('vehicle', '')
-    cargo_weight = data.get('cargoWeight', 0)
-    optimization_type = data.get('optimizationType', 'fastest')
     avoid_tolls = data.get('avoidTolls', False)
+    if not isinstance(avoid_tolls, bool):
+        return jsonify({'error': 'avoidTolls deve ser true ou false'}), 400
     
-    # Simulate advanced route calculation
-    base_distance = 450.5
-    base_duration = 390  # minutes
-    base_fuel_cost = 285.75
-    
-    # Apply optimization factors
-    if optimization_type == 'economical':
-        base_distance *= 1.1  # Longer but more economical route
-        base_duration *= 1.15
-        base_fuel_cost *= 0.85
-    elif optimization_type == 'shortest':
-        base_distance *= 0.9
-        base_duration *= 1.05
-        base_fuel_cost *= 0.95
-    
-    if avoid_tolls:
-        base_distance *= 1.2
-        base_duration *= 1.3
-        base_fuel_cost *= 0.9  # No toll costs
-    
-    # Weight factor
-    weight_factor = 1 + (cargo_weight / 30000) * 0.2
-    base_fuel_cost *= weight_factor
-    
-    optimized_route = {
-        'route_id': f"route_{hash(f'{origin}{destination}') % 10000}",
-        'distance': round(base_distance, 1),
-        'duration_minutes': int(base_duration),
-        'duration_formatted': f"{int(base_duration // 60)}h {int(base_duration % 60)}min",
-        'fuel_cost': round(base_fuel_cost, 2),
-        'toll_cost': 0 if avoid_tolls else round(base_distance * 0.15, 2),
-        'total_cost': round(base_fuel_cost + (0 if avoid_tolls else base_distance * 0.15), 2),
-        'optimization_type': optimization_type,
-        'waypoints': [
-            {'lat': -25.4284, 'lng': -49.2733, 'name': 'Curitiba', 'type': 'origin'},
-            {'lat': -24.5, 'lng': -48.5, 'name': 'Ponto Intermediário', 'type': 'waypoint'},
-            {'lat': -23.5505, 'lng': -46.6333, 'name': 'São Paulo', 'type': 'destination'}
-        ],
-        'traffic_conditions': 'moderate',
-        'weather_impact': 'minimal',
-        'estimated_fuel_consumption': round(base_distance / 8.5, 1)
-    }
+    try:
+        matrix, origin_names, destination_names, cached = get_distance_matrix(
+            origins, destinations,
+            data.get('optimizationType', 'fastest'),
+            avoid_tolls,
+            get_fuel_prices().regional('diesel_s10')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify(optimized_route)
+    # Unreachable pairs (only possible when avoiding tolls) become null
+    def to_rows(values, digits):
+        return [[round(float(v), digits) if math.isfinite(v) else None for v in row] for row in values]
+    
+    return jsonify({
+        'origins': origin_names,
+        'destinations': destination_names,
+        'distance_km': to_rows(matrix[0], 1),
+        'duration_minutes': to_rows(matrix[1], 0),
+        'cost': to_rows(matrix[2], 2),
+        'cached': cached
+    })
+
+@app.route('/api/route-optimization/vrp', methods=['POST'])
+def plan_deliveries():
+    """Assign deliveries to available vehicles and order each tour"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Envie o plano de entregas como objeto JSON'}), 400
+    stops = data.get('deliveries', [])
+    if not isinstance(stops, list) or not all(isinstance(d, dict) for d in stops):
+        return jsonify({'error': 'deliveries deve ser uma lista de entregas'}), 400
+    if len(stops) > MAX_DELIVERIES:
+        return jsonify({'error': f'Máximo de {MAX_DELIVERIES} entregas por plano'}), 400
+    vehicle_ids = data.get('vehicleIds')
+    if vehicle_ids is not None and (not isinstance(vehicle_ids, list) or not all(
+            isinstance(i, int) and not isinstance(i, bool) for i in vehicle_ids)):
+        return jsonify({'error': 'vehicleIds deve ser uma lista de ids de veículos'}), 400
+    time_budget = data.get('timeBudget', DEFAULT_TIME_BUDGET)
+    if isinstance(time_budget, bool) or not isinstance(time_budget, (int, float)) or not math.isfinite(time_budget):
+        return jsonify({'error': 'timeBudget deve ser um número de segundos'}), 400
+    
+    # Depot may be a hub name or explicit coordinates
+    depot = data.get('depot', HUB_CITIES[0]['name'])
+    if isinstance(depot, str):
+        graph = get_road_graph()
+        node = graph.find_node(depot)
+        if node is None:
+            return jsonify({'error': f'Depósito desconhecido: {depot}'}), 400
+        depot = graph.node(node)
+    
+    try:
+        deliveries = [
+            {'id': d.get('id', i + 1), 'lat': float(d['lat']), 'lng': float(d['lng']), 'weight': float(d.get('weight', 0))}
+            for i, d in enumerate(stops)
+        ]
+        depot = {'lat': float(depot['lat']), 'lng': float(depot['lng'])}
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Entregas e depósito precisam de lat e lng'}), 400
+    if not all(math.isfinite(p[name]) for p in deliveries + [depot] for name in ('lat', 'lng')):
+        return jsonify({'error': 'Latitude e longitude devem ser números finitos'}), 400
+    
+    # Vehicles without a cargo capacity cannot take deliveries
+    vehicles = [v for v in get_fleet_store().vehicles
+                if v.status == VehicleStatus.AVAILABLE and v.cargo_capacity and v.cargo_capacity > 0]
+    if vehicle_ids:
+        vehicles = [v for v in vehicles if v.id in vehicle_ids]
+    if not vehicles:
+        return jsonify({'error': 'Nenhum veículo disponível'}), 409
+    
+    try:
+        plan = solve_cvrp(depot, deliveries, vehicles, time_budget)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(plan)
 
 @app.route('/api/route-alternatives', methods=['POST'])
 def get_route_alternatives():
@@ -280,63 +688,341 @@ def get_route_alternatives():
 
 @app.route('/api/live-tracking/<route_id>')
 def get_live_tracking(route_id):
-    # Simulate live tracking data
-    import random
-    
-    tracking_data = {
-        'route_id': route_id,
-        'current_position': {
-            'lat': -24.8 + random.uniform(-0.5, 0.5),
-            'lng': -48.2 + random.uniform(-0.5, 0.5)
-        },
-        'progress_percentage': random.randint(15, 85),
-        'estimated_arrival': '14:30',
-        'current_speed': random.randint(60, 90),
-        'fuel_remaining': random.randint(40, 80),
-        'driver_status': random.choice(['driving', 'break', 'loading']),
-        'alerts': []
-    }
+    """Latest tracking state of one route"""
+    tracking_data = get_position_store().get(route_id)
     
-    # Add random alerts
-    if random.random() < 0.3:
-        tracking_data['alerts'].append({
-            'type': 'traffic',
-            'message': 'Trânsito intenso detectado à frente',
-            'severity': 'medium'
-        })
+    if not tracking_data:
+        return jsonify({'error': 'Route not tracked'}), 404
     
     return jsonify(tracking_data)
 
+@app.route('/api/live-tracking/stream')
+def stream_live_tracking():
+    """Server-Sent Events stream of every tracked route.
+    
+    The first event is a full snapshot; later events carry only the fields
+    that changed. Reconnecting clients send Last-Event-ID and receive just
+    what they missed. ?routes=1,2 limits the stream to some routes.
+    """
+    if not _stream_slots.acquire(blocking=False):
+        return jsonify({'error': 'Limite de conexões ao vivo atingido, tente novamente'}), 503, {'Retry-After': '5'}
+    store = get_position_store()
+    route_ids = set(request.args['routes'].split(',')) if request.args.get('routes') else None
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    
+    def event(name, payload, version):
+        return f"id: {version}\nevent: {name}\ndata: {dumps(payload)}\n\n"
+    
+    def generate():
+        if last_event_id.isdigit():
+            version, deltas = store.changes_since(int(last_event_id), route_ids)
+            yield event('delta', deltas, version)
+        else:
+            version, snapshot = store.snapshot(route_ids)
+            yield event('snapshot', snapshot, version)
+        while True:
+            new_version, deltas = store.wait_for_changes(version, LIVE_KEEPALIVE_SECONDS, route_ids)
+            if deltas:
+                yield event('delta', deltas, new_version)
+            elif new_version == version:
+                yield ': keep-alive\n\n'
+            version = new_version
+            # Coalesce bursts of updates into one event per interval
+            time.sleep(LIVE_MIN_INTERVAL_SECONDS)
+    
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(_stream_slots.release)
+    return response
+
+@app.route('/api/telemetry/ingest', methods=['POST'])
+def ingest_telemetry():
+    """Accept a batch of GPS/CAN samples as JSON or a binary frame"""
+    try:
+        if request.mimetype == 'application/octet-stream':
+            samples = decode_frame(request.get_data())
+        else:
+            data = request.get_json()
+            records = data.get('samples') if isinstance(data, dict) else data
+            samples = samples_from_json(records)
+        # Only fleet vehicles get a buffer; unknown ids are counted as rejected
+        vehicle_ids = (v.id for v in get_fleet_store().vehicles)
+        latest, rejected = get_telemetry_store().ingest(samples, vehicle_ids)
+    except (ValueError, TypeError, AttributeError, OverflowError):
+        return jsonify({'error': 'Lote de telemetria inválido'}), 400
+    
+    # Vehicles on a fleet route drive the live tracking stream; other route
+    # ids are ignored so they never become tracked routes
+    store = get_fleet_store()
+    positions = get_position_store()
+    index = get_spatial_index()
+    for vehicle_id, sample in latest.items():
+        index.update('vehicle', vehicle_id, float(sample['lat']), float(sample['lng']),
+                     speed_kmh=round(float(sample['speed_kmh']), 1))
+        if sample['route_id'] and store.get_route(int(sample['route_id'])) is not None:
+            positions.update(
+                int(sample['route_id']),
+                current_position={'lat': round(float(sample['lat']), 5), 'lng': round(float(sample['lng']), 5)},
+                current_speed=int(sample['speed_kmh']),
+                fuel_remaining=int(sample['fuel_level']),
+                source='telemetry'
+            )
+    
+    return jsonify({'accepted': len(samples) - rejected, 'rejected': rejected, 'vehicles': len(latest)})
+
+@app.route('/api/events', methods=['POST'])
+def record_events():
+    """Record route completions, fuel fills and incidents into the dashboard rollups"""
+    data = request.get_json(silent=True)
+    events = data.get('events') if isinstance(data, dict) and 'events' in data else data
+    if isinstance(events, dict):
+        events = [events]
+    if not isinstance(events, list) or not all(isinstance(e, dict) and e.get('type') in EVENT_TYPES for e in events):
+        return jsonify({'error': f"Eventos precisam de um tipo entre {', '.join(EVENT_TYPES)}"}), 400
+    try:
+        recorded = get_rollups().record_many(events)
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Lote de eventos inválido'}), 400
+    
+    return jsonify({'recorded': recorded})
+
+@app.route('/api/dashboard/trends')
+def get_dashboard_trends():
+    """Rolled-up series of the latest ``buckets`` minutes, hours, days or months"""
+    resolution = request.args.get('resolution', 'hour')
+    if resolution not in RESOLUTIONS:
+        return jsonify({'error': f"Resolução inválida. Use: {', '.join(RESOLUTIONS)}"}), 400
+    buckets = min(max(request.args.get('buckets', 24, type=int), 1), RESOLUTIONS[resolution][1])
+    return jsonify(get_rollups().series(resolution, buckets))
+
+@app.route('/api/dashboard/kpis')
+def get_dashboard_kpis():
+    period = request.args.get('period', 'day')
+    if period not in KPI_PERIODS:
+        return jsonify({'error': f"Período inválido. Use: {', '.join(KPI_PERIODS)}"}), 400
+    return jsonify(get_rollups().kpis(period))
+
+@app.route('/api/telemetry/vehicle/<int:vehicle_id>')
+def get_vehicle_telemetry(vehicle_id):
+    """Driving statistics from a vehicle's buffered telemetry"""
+    summary = get_telemetry_store().vehicle_summary(vehicle_id)
+    
+    if not summary:
+        return jsonify({'error': 'No telemetry for vehicle'}), 404
+    
+    return jsonify(summary)
+
 @app.route('/api/waypoints', methods=['POST'])
 def manage_waypoints():
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'Envie a ação como objeto JSON'}), 400
     action = data.get('action')
     
     if action == 'add':
+        try:
+            lat, lng = float(data['lat']), float(data['lng'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'Latitude e longitude são obrigatórias'}), 400
+        if not (math.isfinite(lat) and math.isfinite(lng)):
+            return jsonify({'success': False, 'error': 'Latitude e longitude devem ser números finitos'}), 400
         waypoint = {
-            'id': f"wp_{hash(str(data)) % 10000}",
-            'lat': data.get('lat'),
-            'lng': data.get('lng'),
+            'id': f"wp_{uuid.uuid4().hex[:12]}",
+            'lat': lat,
+            'lng': lng,
             'name': data.get('name', 'Ponto de Parada'),
             'type': data.get('type', 'stop'),
             'duration_minutes': data.get('duration', 15)
         }
+        get_spatial_index().update('waypoint', waypoint['id'], lat, lng, name=waypoint['name'],
+                                   type=waypoint['type'], duration_minutes=waypoint['duration_minutes'])
         return jsonify({'success': True, 'waypoint': waypoint})
     
     elif action == 'remove':
         waypoint_id = data.get('waypoint_id')
+        get_spatial_index().remove('waypoint', waypoint_id)
         return jsonify({'success': True, 'removed_id': waypoint_id})
     
     return jsonify({'success': False, 'error': 'Invalid action'})
 
-@app.route('/api/fuel-prices')
-def fuel_prices():
+def geo_kinds():
+    """Kinds from ``?kinds=vehicle,route``, or None for every kind"""
+    kinds = request.args.get('kinds')
+    if not kinds:
+        return None
+    kinds = set(k.strip() for k in kinds.split(','))
+    if not kinds <= set(GEO_KINDS):
+        raise ValueError(f"Tipos inválidos. Use: {', '.join(GEO_KINDS)}")
+    return kinds
+
+def geo_filter():
+    """Property filter from ``?status=``"""
+    status = request.args.get('status')
+    return (lambda point: point.get('status') == status) if status else None
+
+def geo_args(*names):
+    values = [request.args.get(name, type=float) for name in names]
+    if None in values:
+        raise ValueError(f"Parâmetros obrigatórios: {', '.join(names)}")
+    # float() accepts 'nan' and 'inf', which no grid cell can hold
+    if not all(math.isfinite(v) for v in values):
+        raise ValueError(f"Parâmetros devem ser números finitos: {', '.join(names)}")
+    return values
+
+@app.route('/api/geo/radius')
+def geo_radius():
+    """Vehicles, routes, waypoints and depots within ``km`` of a point"""
+    try:
+        lat, lng, km = geo_args('lat', 'lng', 'km')
+        kinds = geo_kinds()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    results = get_spatial_index().within_radius(lat, lng, min(km, GEO_MAX_RADIUS_KM), kinds, geo_filter())
+    return jsonify({'count': len(results), 'results': results})
+
+@app.route('/api/geo/bbox')
+def geo_bbox():
+    """Points inside the map viewport"""
+    try:
+        south, west, north, east = geo_args('south', 'west', 'north', 'east')
+        kinds = geo_kinds()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    results = get_spatial_index().in_bbox(south, west, north, east, kinds, geo_filter())
+    return jsonify({'count': len(results), 'truncated': len(results) == GEO_MAX_RESULTS, 'results': results})
+
+@app.route('/api/geo/nearest')
+def geo_nearest():
+    """The ``k`` points closest to a location, e.g. available vehicles near a pickup"""
+    try:
+        lat, lng = geo_args('lat', 'lng')
+        kinds = geo_kinds()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    k = request.args.get('k', 5, type=int)
+    if k is None or not 1 <= k <= 100:
+        return jsonify({'error': 'k deve ser um inteiro entre 1 e 100'}), 400
+    results = get_spatial_index().nearest(lat, lng, k, kinds, geo_filter())
+    return jsonify({'count': len(results), 'results': results})
+
+@app.route('/api/weather/route-impacts')
+def get_weather_route_impacts():
+    """Weather delay and risk of every active route under the current forecast"""
+    engine = get_weather_engine()
+    impacts = engine.route_impacts(get_fleet_store())
+    level = request.args.get('level')
+    if level:
+        impacts = [i for i in impacts if i['level'] == level]
+    return jsonify({
+        'forecast_version': engine.version,
+        'forecast_issued_at': engine.forecast().issued_at,
+        'routes': impacts
+    })
+
+@app.route('/api/weather/forecast', methods=['POST'])
+def update_weather_forecast():
+    """Replace the forecast with per-city records and rescore all active routes"""
+    data = request.get_json(silent=True)
+    records = data.get('stations') if isinstance(data, dict) else data
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        return jsonify({'error': 'Envie uma lista de estações da previsão'}), 400
+    try:
+        forecast = stations_from_weather(records)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    engine = get_weather_engine()
+    engine.update_forecast(forecast)
+    impacts = engine.route_impacts(get_fleet_store())
     return jsonify({
-        'gasolina_comum_curitiba': 5.89,
-        'gasolina_aditivada_curitiba': 6.15,
-        'diesel_s10': 5.45,
-        'vale_gasolina_interestadual': 5.95
+        'forecast_version': engine.version,
+        'stations': len(records),
+        'routes_scored': len(impacts),
+        'routes_affected': sum(1 for i in impacts if i['level'] != 'minimal')
     })
 
+@app.route('/api/costs')
+@cached_response('costs', ttl=API_CACHE_SECONDS, depends_on=costs_version)
+def get_costs():
+    """Monthly fleet costs per vehicle and per route with the default EV scenario"""
+    return jsonify(get_cost_analysis())
+
+@app.route('/api/costs/ev-scenarios', methods=['POST'])
+def simulate_ev_scenarios():
+    """Monte Carlo payback distributions for a set of EV transition scenarios"""
+    data = request.get_json(silent=True)
+    scenarios = data.get('scenarios') if isinstance(data, dict) and 'scenarios' in data else data
+    if isinstance(scenarios, dict):
+        scenarios = [scenarios]
+    if not isinstance(scenarios, list) or not all(isinstance(s, dict) for s in scenarios):
+        return jsonify({'error': 'Envie um cenário ou uma lista de cenários'}), 400
+    
+    started = time.perf_counter()
+    try:
+        results = run_ev_scenarios(get_fleet_store(), scenarios)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'scenarios': results, 'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)})
+
+@app.route('/api/fuel-prices')
+@cached_response('fuel-prices', ttl=API_CACHE_SECONDS, depends_on=fuel_prices_version)
+def fuel_prices():
+    """Latest price of every fuel type in ?region= (default PR)"""
+    region = request.args.get('region', FUEL_DEFAULT_REGION)
+    try:
+        prices = get_fuel_prices().prices(region, request.args.get('at'))
+    except ValueError:
+        return jsonify({'error': 'Datas devem estar no formato ISO 8601'}), 400
+    if not prices:
+        return jsonify({'error': f'Sem cotações para a região {region}'}), 404
+    return jsonify(prices)
+
+@app.route('/api/fuel-prices', methods=['POST'])
+def add_fuel_prices():
+    """Append quotes: {fuel_type, region, price, ts} or a list of them"""
+    data = request.get_json(silent=True)
+    quotes = data.get('quotes') if isinstance(data, dict) and 'quotes' in data else data
+    if isinstance(quotes, dict):
+        quotes = [quotes]
+    if not isinstance(quotes, list) or not quotes or not all(isinstance(q, dict) for q in quotes):
+        return jsonify({'error': 'Envie uma cotação ou uma lista de cotações'}), 400
+    
+    store = get_fuel_prices()
+    try:
+        added = store.add_many(quotes)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'added': added, 'version': store.version})
+
+@app.route('/api/fuel-prices/<fuel_type>')
+@cached_response('fuel-prices', ttl=API_CACHE_SECONDS, depends_on=fuel_prices_version)
+def fuel_price_history(fuel_type):
+    """Latest price, moving averages, changes and quotes between ?start= and ?end="""
+    if fuel_type not in FUEL_TYPES:
+        return jsonify({'error': f"Combustível inválido. Use: {', '.join(FUEL_TYPES)}"}), 400
+    region = request.args.get('region', FUEL_DEFAULT_REGION)
+    store = get_fuel_prices()
+    try:
+        summary = store.summary(fuel_type, region, request.args.get('end'))
+        summary['history'] = store.history(fuel_type, region, request.args.get('start'), request.args.get('end'))
+    except KeyError:
+        return jsonify({'error': f'Sem cotações de {fuel_type} na região {region}'}), 404
+    except ValueError:
+        return jsonify({'error': 'Datas devem estar no formato ISO 8601'}), 400
+    summary['regions'] = store.regional(fuel_type, request.args.get('end'))
+    return jsonify(summary)
+
+# Opt-in profiling: Server-Timing headers, /metrics and the slow-request profiler
+if os.environ.get('WISE_ROUTES_INSTRUMENT') == '1':
+    from instrumentation import init_instrumentation
+    slow_ms = os.environ.get('WISE_ROUTES_PROFILE_SLOW_MS')
+    profiler = init_instrumentation(app, globals(), float(slow_ms) if slow_ms else None)
+
+if not PRELOAD:
+    # Pools fork here, before the simulator and flusher threads exist
+    start_process_pools()
+    start_background_tasks()
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,24 @@
+"""Scratch instance folder for the benchmarks.
+
+The load suite posts fuel quotes, assigns routes, records waypoints and
+imports files, so it must never run against the real ``instance/``. Call
+``use_scratch_instance()`` before anything from ``app`` or ``data`` is
+imported: it points the app at a temporary folder (database included) that
+is removed on exit, or at ``WISE_ROUTES_BENCH_INSTANCE_DIR`` when set, which
+is kept.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+
+def use_scratch_instance():
+    """Point the app at a throwaway instance folder; returns its path"""
+    path = os.environ.get('WISE_ROUTES_BENCH_INSTANCE_DIR')
+    if not path:
+        path = tempfile.mkdtemp(prefix='wise-routes-bench-')
+        atexit.register(shutil.rmtree, path, ignore_errors=True)
+    os.environ['WISE_ROUTES_INSTANCE_DIR'] = path
+    os.environ['WISE_ROUTES_DATABASE'] = os.path.join(path, 'wise_routes.db')
+    return path
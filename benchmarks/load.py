@@ -0,0 +1,209 @@
+"""Load and latency benchmark for every Flask route.
+
+Runs in-process through Flask's test client, or against the app served by a
+threaded WSGI server (``--server``), with a configurable request mix and
+concurrency. Reports p50/p95/p99 latency, throughput and, from a separate
+single-threaded pass under tracemalloc, allocations per request for each
+route.
+
+    python -m benchmarks.load --mix all --requests 50 --concurrency 4
+    python -m benchmarks.load --save benchmarks/baseline.json
+    python -m benchmarks.load --compare benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('WISE_ROUTES_BATCH_WORKERS', '1')
+
+from benchmarks.instance import use_scratch_instance  # noqa: E402
+
+use_scratch_instance()
+
+from app import app  # noqa: E402
+from benchmarks.scenarios import MIXES, SCENARIOS, resolve, uncovered_rules  # noqa: E402
+
+# Regressions beyond this fraction of the baseline are flagged
+REGRESSION_THRESHOLD = 0.25
+
+
+class InProcessClient:
+    """Sends requests through Flask's test client"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def send(self, scenario):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = app.test_client()
+        response = client.open(
+            scenario['path'], method=scenario['method'], json=scenario.get('json'),
+            data=scenario.get('data'), content_type=scenario.get('content_type'),
+            buffered=not scenario.get('stream')
+        )
+        if scenario.get('stream'):
+            next(iter(response.response))
+        else:
+            response.get_data()
+        response.close()
+        return response.status_code
+
+
+class ServerClient:
+    """Sends requests over HTTP to the app under a threaded WSGI server"""
+
+    def __init__(self):
+        import requests
+        from werkzeug.serving import make_server
+
+        self._requests = requests
+        self._server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.base_url = f'http://127.0.0.1:{self._server.server_port}'
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self._local = threading.local()
+
+    def send(self, scenario):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        headers = {'Content-Type': scenario['content_type']} if scenario.get('content_type') else None
+        with session.request(scenario['method'], self.base_url + scenario['path'], json=scenario.get('json'),
+                             data=scenario.get('data'), headers=headers, stream=bool(scenario.get('stream'))) as response:
+            if scenario.get('stream'):
+                next(response.iter_content(chunk_size=None))
+            else:
+                response.content
+            return response.status_code
+
+    def close(self):
+        self._server.shutdown()
+
+
+def run_load(client, scenarios, mix, total_requests, concurrency, seed=0):
+    """Send ``total_requests`` drawn from ``mix``; returns per-route latencies"""
+    names = [name for name in mix if name in scenarios]
+    weights = [mix[name] for name in names]
+    plan = random.Random(seed).choices(names, weights, k=total_requests)
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+
+    def send(name):
+        started = time.perf_counter()
+        status = client.send(scenarios[name])
+        return name, time.perf_counter() - started, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for name, elapsed, status in pool.map(send, plan):
+            latencies[name].append(elapsed)
+            if status >= 400:
+                errors[name] += 1
+    wall = time.perf_counter() - started
+    return latencies, errors, wall
+
+
+def measure_allocations(client, scenarios, names, repeat=3):
+    """Peak and net KB allocated per request, single-threaded"""
+    allocations = {}
+    for name in names:
+        client.send(scenarios[name])
+        tracemalloc.start()
+        peaks, nets = [], []
+        for _ in range(repeat):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            client.send(scenarios[name])
+            after, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            nets.append(after - before)
+        tracemalloc.stop()
+        allocations[name] = {'peak_kb': round(max(peaks) / 1024, 1), 'net_kb': round(float(np.mean(nets)) / 1024, 1)}
+    return allocations
+
+
+def summarize(latencies, errors, wall, allocations):
+    routes = {}
+    for name, values in latencies.items():
+        if not values:
+            continue
+        ms = np.array(values) * 1000
+        routes[name] = {
+            'requests': len(values),
+            'errors': errors[name],
+            'p50_ms': round(float(np.percentile(ms, 50)), 2),
+            'p95_ms': round(float(np.percentile(ms, 95)), 2),
+            'p99_ms': round(float(np.percentile(ms, 99)), 2),
+            **allocations.get(name, {})
+        }
+    total = sum(r['requests'] for r in routes.values())
+    return {'throughput_rps': round(total / wall, 1), 'wall_seconds': round(wall, 2), 'routes': routes}
+
+
+def print_report(report, baseline=None):
+    print(f"{'route':32} {'reqs':>5} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak KB':>9} {'net KB':>8}")
+    for name, r in sorted(report['routes'].items()):
+        line = (f"{name:32} {r['requests']:>5} {r['errors']:>4} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+                f"{r['p99_ms']:>9.2f} {r.get('peak_kb', 0):>9.1f} {r.get('net_kb', 0):>8.1f}")
+        base = (baseline or {}).get('routes', {}).get(name)
+        if base and base['p95_ms']:
+            change = (r['p95_ms'] - base['p95_ms']) / base['p95_ms']
+            flag = '  REGRESSION' if change > REGRESSION_THRESHOLD else ''
+            line += f"  p95 {change:+.0%} vs baseline{flag}"
+        print(line)
+    print(f"throughput: {report['throughput_rps']} req/s over {report['wall_seconds']} s")
+    if baseline:
+        change = (report['throughput_rps'] - baseline['throughput_rps']) / baseline['throughput_rps']
+        print(f"throughput {change:+.0%} vs baseline")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mix', default='all', choices=sorted(MIXES))
+    parser.add_argument('--requests', type=int, default=None, help='total requests (default: 20 per route in the mix)')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--server', action='store_true', help='serve the app with a threaded WSGI server')
+    parser.add_argument('--no-allocations', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--save', metavar='PATH', help='write the report as JSON')
+    parser.add_argument('--compare', metavar='PATH', help='compare against a saved report')
+    args = parser.parse_args(argv)
+
+    missing = uncovered_rules(app)
+    if missing:
+        print('warning: routes without a scenario: ' + ', '.join(missing), file=sys.stderr)
+
+    scenarios = {s['name']: resolve(s) for s in SCENARIOS}
+    mix = MIXES[args.mix]
+    client = ServerClient() if args.server else InProcessClient()
+    total = args.requests or 20 * len(mix)
+    try:
+        allocations = {} if args.no_allocations else measure_allocations(client, scenarios, list(mix))
+        latencies, errors, wall = run_load(client, scenarios, mix, total, args.concurrency)
+    finally:
+        if args.server:
+            client.close()
+
+    report = summarize(latencies, errors, wall, allocations)
+    report.update({'mix': args.mix, 'concurrency': args.concurrency, 'mode': 'server' if args.server else 'in-process'})
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Micro-benchmarks for the data layer.
+
+Times every ``get_*`` function in data/synthetic_data.py plus the hot
+engine calls, and reports the best per-call time in microseconds.
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --save benchmarks/baseline_micro.json
+    python -m benchmarks.micro --compare benchmarks/baseline_micro.json
+"""
+import argparse
+import inspect
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.instance import use_scratch_instance  # noqa: E402
+
+use_scratch_instance()
+
+from data import synthetic_data  # noqa: E402
+from data.cost_model import get_cost_analysis  # noqa: E402
+from data.driver_analytics import compute_driver_analytics  # noqa: E402
+from data.fleet_store import FleetStore  # noqa: E402
+from data.fuel_prices import get_fuel_prices  # noqa: E402
+from data.road_graph import get_road_graph  # noqa: E402
+from data.route_planner import plan_route  # noqa: E402
+
+REGRESSION_THRESHOLD = 0.25
+
+
+def benchmarks():
+    """Name -> zero-argument callable"""
+    cases = {
+        name: func for name, func in inspect.getmembers(synthetic_data, inspect.isfunction)
+        if name.startswith('get_') and func.__module__ == synthetic_data.__name__
+    }
+    store = FleetStore.load()
+    graph = get_road_graph()
+    fuel_prices = get_fuel_prices()
+    source, target = graph.find_node('Porto Alegre'), graph.find_node('Belo Horizonte')
+    cases.update({
+        'FleetStore.load': FleetStore.load,
+        'FleetStore.get_driver': lambda: store.get_driver(10),
+        'compute_driver_analytics': lambda: compute_driver_analytics(store.drivers),
+        'RoadGraph.shortest_path': lambda: graph.shortest_path(source, target, 'economical'),
+        'RoadGraph.shortest_path_tree': lambda: graph.shortest_path_tree(source),
+        'FuelPriceStore.latest': lambda: fuel_prices.latest('diesel_s10', 'SP'),
+        'FuelPriceStore.moving_average': lambda: fuel_prices.moving_average('diesel_s10', 'SP', 30),
+        'get_cost_analysis': get_cost_analysis,
+        'plan_route': lambda: plan_route({'origin': 'Curitiba', 'destination': 'Rio de Janeiro'}),
+    })
+    return cases
+
+
+def run(repeat=5, min_time=0.2):
+    results = {}
+    for name, func in benchmarks().items():
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        number = max(number, int(number * min_time / 0.2))
+        best = min(timer.repeat(repeat=repeat, number=number)) / number
+        results[name] = {'us_per_call': round(best * 1e6, 2)}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--save', metavar='PATH', help='write results as JSON')
+    parser.add_argument('--compare', metavar='PATH', help='compare against saved results')
+    args = parser.parse_args(argv)
+
+    results = run()
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    for name, r in sorted(results.items()):
+        line = f"{name:34} {r['us_per_call']:>12.2f} us"
+        if name in baseline:
+            change = (r['us_per_call'] - baseline[name]['us_per_call']) / baseline[name]['us_per_call']
+            flag = '  REGRESSION' if change > REGRESSION_THRESHOLD else ''
+            line += f"  {change:+.0%} vs baseline{flag}"
+        print(line)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""A* on a state-sized road graph.
+
+The bundled road network has a few dozen nodes, so the micro-benchmarks say
+nothing about ``RoadGraph.shortest_path`` on a real state network (~100k
+intersections). This builds a synthetic one instead: a jittered grid over
+Paraná with two-way roads, a share of them removed so paths must detour,
+mixed speeds and a few tolls. It times the build, ``prepare_search`` and A*
+between random far-apart node pairs for every metric, and with tolls
+avoided.
+
+    python -m benchmarks.road_graph
+    python -m benchmarks.road_graph --nodes 250000 --pairs 10
+    python -m benchmarks.road_graph --save benchmarks/baseline_road_graph.json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.road_graph import METRICS, RoadGraph, haversine_km  # noqa: E402
+
+# Paraná's bounding box
+LAT_RANGE = (-26.7, -22.5)
+LNG_RANGE = (-54.6, -48.0)
+SPEEDS_KMH = (40, 60, 80, 100, 110)
+REMOVED_ROADS = 0.15
+TOLL_SHARE = 0.03
+
+
+def grid_graph(nodes, seed=0):
+    """A RoadGraph of about ``nodes`` nodes laid out as a jittered grid"""
+    rng = np.random.default_rng(seed)
+    side = math.ceil(math.sqrt(nodes))
+    count = side * side
+    rows, cols = np.divmod(np.arange(count), side)
+    lat_step = (LAT_RANGE[1] - LAT_RANGE[0]) / side
+    lng_step = (LNG_RANGE[1] - LNG_RANGE[0]) / side
+    lat = LAT_RANGE[0] + (rows + rng.uniform(0.1, 0.9, count)) * lat_step
+    lng = LNG_RANGE[0] + (cols + rng.uniform(0.1, 0.9, count)) * lng_step
+
+    index = np.arange(count).reshape(side, side)
+    sources = np.concatenate([index[:, :-1].ravel(), index[:-1, :].ravel()])
+    targets = np.concatenate([index[:, 1:].ravel(), index[1:, :].ravel()])
+    kept = rng.random(len(sources)) >= REMOVED_ROADS
+    sources, targets = sources[kept], targets[kept]
+    distance = haversine_km(lat[sources], lng[sources], lat[targets], lng[targets]) * rng.uniform(1.05, 1.4, len(sources))
+    speed = rng.choice(SPEEDS_KMH, len(sources)).astype(float)
+    toll = np.where(rng.random(len(sources)) < TOLL_SHARE, rng.uniform(5, 15, len(sources)), 0.0)
+
+    # Two-way roads, as from_csv builds them
+    return RoadGraph(
+        np.arange(count), [f'n{i}' for i in range(count)], ['PR'] * count, lat, lng,
+        np.concatenate([sources, targets]), np.concatenate([targets, sources]),
+        np.concatenate([distance, distance]), np.concatenate([speed, speed]),
+        np.concatenate([toll, toll]), ['PR-000'] * (2 * len(sources)),
+    )
+
+
+def far_pairs(graph, pairs, seed=0):
+    """Random node pairs at least half the state apart"""
+    rng = np.random.default_rng(seed + 1)
+    min_km = haversine_km(LAT_RANGE[0], LNG_RANGE[0], LAT_RANGE[1], LNG_RANGE[1]) / 2
+    found = []
+    while len(found) < pairs:
+        a, b = (int(i) for i in rng.integers(graph.node_count, size=2))
+        if haversine_km(graph.lat[a], graph.lng[a], graph.lat[b], graph.lng[b]) >= min_km:
+            found.append((a, b))
+    return found
+
+
+def _percentile(times, q):
+    return round(float(np.percentile(times, q)) * 1000, 1)
+
+
+def run(nodes, pairs, seed=0):
+    started = time.perf_counter()
+    graph = grid_graph(nodes, seed)
+    results = {
+        'nodes': graph.node_count,
+        'edges': graph.edge_count,
+        'build_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+    started = time.perf_counter()
+    graph.prepare_search()
+    results['prepare_search_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    cases = [(metric, False) for metric in METRICS] + [('fastest', True)]
+    searches = far_pairs(graph, pairs, seed)
+    for metric, avoid_tolls in cases:
+        times, unreachable = [], 0
+        for source, target in searches:
+            started = time.perf_counter()
+            path = graph.shortest_path(source, target, metric, avoid_tolls)
+            times.append(time.perf_counter() - started)
+            unreachable += path is None
+        name = f'shortest_path.{metric}' + ('.avoid_tolls' if avoid_tolls else '')
+        results[name] = {'p50_ms': _percentile(times, 50), 'p95_ms': _percentile(times, 95),
+                         'max_ms': _percentile(times, 100), 'unreachable': unreachable}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=100000, help='graph size (rounded up to a square grid)')
+    parser.add_argument('--pairs', type=int, default=20, help='searches per metric')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', metavar='PATH', help='write results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args.nodes, args.pairs, args.seed)
+    print(f"{results['nodes']} nodes, {results['edges']} edges: built in {results['build_ms']} ms, "
+          f"search arrays in {results['prepare_search_ms']} ms")
+    for name, r in results.items():
+        if isinstance(r, dict):
+            print(f"{name:34} p50 {r['p50_ms']:>9.1f} ms  p95 {r['p95_ms']:>9.1f} ms  "
+                  f"max {r['max_ms']:>9.1f} ms  unreachable {r['unreachable']}")
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
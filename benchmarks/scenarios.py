@@ -0,0 +1,177 @@
+"""Request scenarios covering every route in app.py.
+
+Each scenario is one request: method, path and an optional JSON or binary
+body. ``path`` may be a callable evaluated once the app is loaded, for
+routes whose ids only exist at runtime. ``MIXES`` weights scenarios into
+request mixes for the load runner.
+"""
+import random
+
+import numpy as np
+
+from data.live_tracking import get_position_store
+from data.telemetry import SAMPLE_DTYPE, encode_frame
+
+
+def _tracked_route():
+    _, snapshot = get_position_store().snapshot()
+    return f"/api/live-tracking/{next(iter(snapshot), '1')}"
+
+
+def _telemetry_frame(count=1000):
+    samples = np.zeros(count, SAMPLE_DTYPE)
+    samples['vehicle_id'] = np.arange(count) % 5 + 1
+    samples['ts'] = np.arange(count, dtype=float)
+    samples['lat'] = -25.4
+    samples['lng'] = -49.2
+    samples['speed_kmh'] = 75
+    return encode_frame(samples)
+
+
+def _deliveries(count=200, seed=7):
+    rng = random.Random(seed)
+    return [{'id': i, 'lat': -25.4 + rng.uniform(-1, 1), 'lng': -49.2 + rng.uniform(-1, 1),
+             'weight': rng.randint(50, 300)} for i in range(count)]
+
+
+ROUTE_REQUEST = {'origin': 'Curitiba, PR', 'destination': 'São Paulo, SP', 'vehicle': 'volvo-fh',
+                 'cargoWeight': 15000, 'optimizationType': 'fastest', 'avoidTolls': False}
+IMPORT_BOUNDARY = 'wise-routes-benchmark'
+IMPORT_BODY = (f'--{IMPORT_BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="routes.csv"\r\n'
+               f'Content-Type: text/csv\r\n\r\nid,origin_name,destination_name\r\n1,Curitiba,Londrina\r\n'
+               f'--{IMPORT_BOUNDARY}--\r\n').encode()
+HUBS = ['Curitiba', 'São Paulo', 'Rio de Janeiro', 'Belo Horizonte', 'Porto Alegre']
+
+SCENARIOS = [
+    # Pages
+    {'name': 'page_dashboard', 'rule': '/', 'method': 'GET', 'path': '/'},
+    {'name': 'page_map', 'rule': '/map', 'method': 'GET', 'path': '/map'},
+    {'name': 'page_drivers', 'rule': '/drivers', 'method': 'GET', 'path': '/drivers'},
+    {'name': 'page_vehicles', 'rule': '/vehicles', 'method': 'GET', 'path': '/vehicles'},
+    {'name': 'page_costs', 'rule': '/costs', 'method': 'GET', 'path': '/costs'},
+    {'name': 'page_weather', 'rule': '/weather', 'method': 'GET', 'path': '/weather'},
+    {'name': 'page_reports', 'rule': '/reports', 'method': 'GET', 'path': '/reports'},
+    # Drivers
+    {'name': 'drivers_list', 'rule': '/api/drivers', 'method': 'GET', 'path': '/api/drivers'},
+    {'name': 'vehicles_list', 'rule': '/api/vehicles', 'method': 'GET', 'path': '/api/vehicles?format=ndjson'},
+    {'name': 'routes_list', 'rule': '/api/routes', 'method': 'GET',
+     'path': '/api/routes?fields=id,origin,destination,status'},
+    {'name': 'driver_details', 'rule': '/api/driver/<int:driver_id>', 'method': 'GET', 'path': '/api/driver/3'},
+    {'name': 'driver_update', 'rule': '/api/driver/<int:driver_id>', 'method': 'PATCH', 'path': '/api/driver/3',
+     'json': {'status': 'Ativo'}},
+    {'name': 'driver_performance', 'rule': '/api/driver/<int:driver_id>/performance', 'method': 'GET',
+     'path': '/api/driver/3/performance'},
+    {'name': 'driver_schedule', 'rule': '/api/driver/<int:driver_id>/schedule', 'method': 'GET',
+     'path': '/api/driver/3/schedule'},
+    {'name': 'driver_assign_route', 'rule': '/api/driver/assign-route', 'method': 'POST',
+     'path': '/api/driver/assign-route', 'json': {'driver_id': 3, 'route_id': 1, 'scheduled_date': '2026-01-05'}},
+    # Dry run, so pending routes stay unassigned between runs
+    {'name': 'driver_auto_assign', 'rule': '/api/driver/auto-assign', 'method': 'POST',
+     'path': '/api/driver/auto-assign', 'json': {'days': 7, 'dry_run': True}},
+    {'name': 'driver_assignment_cancel', 'rule': '/api/driver/assignments/<assignment_id>', 'method': 'DELETE',
+     'path': '/api/driver/assignments/asg_unknown'},
+    {'name': 'drivers_analytics', 'rule': '/api/drivers/analytics', 'method': 'GET', 'path': '/api/drivers/analytics'},
+    {'name': 'drivers_training', 'rule': '/api/drivers/training', 'method': 'GET', 'path': '/api/drivers/training'},
+    {'name': 'drivers_rewards', 'rule': '/api/drivers/rewards', 'method': 'GET', 'path': '/api/drivers/rewards'},
+    {'name': 'drivers_tips', 'rule': '/api/drivers/tips', 'method': 'GET', 'path': '/api/drivers/tips'},
+    {'name': 'drivers_leaderboard', 'rule': '/api/drivers/leaderboard', 'method': 'GET',
+     'path': '/api/drivers/leaderboard?category=safety_score&k=10'},
+    # Rejected before anything is stored, so the benchmark never changes the database
+    {'name': 'import_upload', 'rule': '/api/import/<kind>', 'method': 'POST', 'path': '/api/import/unknown',
+     'data': IMPORT_BODY, 'content_type': f'multipart/form-data; boundary={IMPORT_BOUNDARY}'},
+    {'name': 'import_status', 'rule': '/api/import/<import_id>', 'method': 'GET', 'path': '/api/import/0'},
+    # Identical parameters: after the first run this returns the cached report
+    {'name': 'report_submit', 'rule': '/api/reports', 'method': 'POST', 'path': '/api/reports',
+     'json': {'type': 'efficiency', 'period': 'last-week', 'format': 'csv'}},
+    {'name': 'report_list', 'rule': '/api/reports', 'method': 'GET', 'path': '/api/reports'},
+    {'name': 'report_status', 'rule': '/api/reports/<report_id>', 'method': 'GET', 'path': '/api/reports/0'},
+    {'name': 'report_download', 'rule': '/api/reports/<report_id>/download', 'method': 'GET',
+     'path': '/api/reports/0/download'},
+    {'name': 'fleet_reload', 'rule': '/api/fleet/reload', 'method': 'POST', 'path': '/api/fleet/reload'},
+    {'name': 'readiness', 'rule': '/api/ready', 'method': 'GET', 'path': '/api/ready'},
+    # Routing
+    {'name': 'route_optimization', 'rule': '/api/route-optimization', 'method': 'POST',
+     'path': '/api/route-optimization', 'json': ROUTE_REQUEST},
+    {'name': 'route_optimization_batch', 'rule': '/api/route-optimization/batch', 'method': 'POST',
+     'path': '/api/route-optimization/batch',
+     'json': [dict(ROUTE_REQUEST, origin=o, destination=d) for o in HUBS for d in HUBS]},
+    {'name': 'route_vrp', 'rule': '/api/route-optimization/vrp', 'method': 'POST',
+     'path': '/api/route-optimization/vrp', 'json': {'deliveries': _deliveries(), 'timeBudget': 0.5}},
+    {'name': 'distance_matrix', 'rule': '/api/distance-matrix', 'method': 'POST', 'path': '/api/distance-matrix',
+     'json': {'origins': HUBS}},
+    {'name': 'route_alternatives', 'rule': '/api/route-alternatives', 'method': 'POST',
+     'path': '/api/route-alternatives', 'json': ROUTE_REQUEST},
+    {'name': 'waypoints', 'rule': '/api/waypoints', 'method': 'POST', 'path': '/api/waypoints',
+     'json': {'action': 'add', 'lat': -24.5, 'lng': -48.5}},
+    # Dashboard rollups
+    {'name': 'events_record', 'rule': '/api/events', 'method': 'POST', 'path': '/api/events',
+     'json': {'events': [{'type': 'route_completed', 'distance_km': 420, 'on_time': True, 'fuel_liters': 48},
+                         {'type': 'fuel_fill', 'liters': 120, 'cost': 654.0}, {'type': 'incident'}]}},
+    {'name': 'dashboard_trends', 'rule': '/api/dashboard/trends', 'method': 'GET',
+     'path': '/api/dashboard/trends?resolution=day&buckets=30'},
+    {'name': 'dashboard_kpis', 'rule': '/api/dashboard/kpis', 'method': 'GET', 'path': '/api/dashboard/kpis?period=week'},
+    # Geo queries
+    {'name': 'geo_radius', 'rule': '/api/geo/radius', 'method': 'GET',
+     'path': '/api/geo/radius?lat=-25.43&lng=-49.27&km=20'},
+    {'name': 'geo_bbox', 'rule': '/api/geo/bbox', 'method': 'GET',
+     'path': '/api/geo/bbox?south=-26&west=-50&north=-22&east=-43&kinds=vehicle,route'},
+    {'name': 'geo_nearest', 'rule': '/api/geo/nearest', 'method': 'GET',
+     'path': '/api/geo/nearest?lat=-24.5&lng=-48.5&k=3&kinds=vehicle&status=Dispon%C3%ADvel'},
+    # Tracking and telemetry
+    {'name': 'live_tracking', 'rule': '/api/live-tracking/<route_id>', 'method': 'GET', 'path': _tracked_route},
+    {'name': 'live_tracking_stream', 'rule': '/api/live-tracking/stream', 'method': 'GET',
+     'path': '/api/live-tracking/stream', 'stream': True},
+    {'name': 'telemetry_ingest', 'rule': '/api/telemetry/ingest', 'method': 'POST', 'path': '/api/telemetry/ingest',
+     'data': _telemetry_frame(), 'content_type': 'application/octet-stream'},
+    {'name': 'telemetry_vehicle', 'rule': '/api/telemetry/vehicle/<int:vehicle_id>', 'method': 'GET',
+     'path': '/api/telemetry/vehicle/1'},
+    {'name': 'weather_route_impacts', 'rule': '/api/weather/route-impacts', 'method': 'GET',
+     'path': '/api/weather/route-impacts'},
+    # Same stations every run, so the forecast only changes version
+    {'name': 'weather_forecast', 'rule': '/api/weather/forecast', 'method': 'POST', 'path': '/api/weather/forecast',
+     'json': [{'city': c, 'condition': 'Chuva Forte' if c == 'São Paulo' else 'Ensolarado', 'wind_speed': 15,
+               'visibility': 'Boa', 'temperature': 22} for c in HUBS]},
+    # Fleet costs
+    {'name': 'costs_summary', 'rule': '/api/costs', 'method': 'GET', 'path': '/api/costs'},
+    {'name': 'costs_ev_scenarios', 'rule': '/api/costs/ev-scenarios', 'method': 'POST',
+     'path': '/api/costs/ev-scenarios',
+     'json': {'scenarios': [{'name': 'frota', 'fleet_share': 1.0}, {'name': 'metade', 'fleet_share': 0.5},
+                            {'name': 'energia cara', 'electricity_price': 1.2}]}},
+    # Fuel prices
+    {'name': 'fuel_prices', 'rule': '/api/fuel-prices', 'method': 'GET', 'path': '/api/fuel-prices'},
+    {'name': 'fuel_price_history', 'rule': '/api/fuel-prices/<fuel_type>', 'method': 'GET',
+     'path': '/api/fuel-prices/diesel_s10?region=SP&start=2025-01-01'},
+    # Same quote every run into a series of its own, so real regions are untouched
+    {'name': 'fuel_prices_add', 'rule': '/api/fuel-prices', 'method': 'POST', 'path': '/api/fuel-prices',
+     'json': {'fuel_type': 'diesel_s10', 'region': 'benchmark', 'price': 5.45, 'ts': '2026-01-01T00:00:00'}},
+]
+
+# Scenario weights per mix; scenarios missing from a mix are not sent
+MIXES = {
+    'all': {s['name']: 1 for s in SCENARIOS},
+    'pages': {s['name']: 1 for s in SCENARIOS if s['name'].startswith('page_')},
+    # What an open dashboard and map generate every refresh
+    'dashboard': {'page_dashboard': 1, 'fuel_prices': 5, 'live_tracking': 10, 'drivers_leaderboard': 2,
+                  'drivers_tips': 1, 'page_map': 1, 'dashboard_kpis': 1, 'dashboard_trends': 1, 'geo_bbox': 1},
+    'dispatch': {'route_optimization': 10, 'route_optimization_batch': 1, 'distance_matrix': 2,
+                 'route_vrp': 1, 'route_alternatives': 3},
+}
+
+
+def resolve(scenario):
+    """Scenario with its path evaluated"""
+    path = scenario['path']
+    return dict(scenario, path=path() if callable(path) else path)
+
+
+def uncovered_rules(app):
+    """Rules in the app's URL map that no scenario exercises"""
+    covered = {(s['rule'], s['method']) for s in SCENARIOS}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static':
+            continue
+        for method in rule.methods - {'HEAD', 'OPTIONS'}:
+            if (rule.rule, method) not in covered:
+                missing.append(f'{method} {rule.rule}')
+    return sorted(missing)
@@ -0,0 +1,29 @@
+"""Lets tests next to the modules (``data/test_*.py``) import ``data.*``.
+
+Tests post quotes, book routes and write caches, so before anything from
+``app`` or ``data`` is imported the app is pointed at a temporary instance
+folder (database included), removed when the session ends, and the live
+tracking simulator is turned off.
+"""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+INSTANCE_DIR = tempfile.mkdtemp(prefix='wise-routes-test-')
+os.environ['WISE_ROUTES_INSTANCE_DIR'] = INSTANCE_DIR
+os.environ['WISE_ROUTES_DATABASE'] = os.path.join(INSTANCE_DIR, 'wise_routes.db')
+os.environ['WISE_ROUTES_SIMULATOR'] = '0'
+
+
+@pytest.fixture(scope='session', autouse=True)
+def _remove_instance_dir():
+    yield
+    shutil.rmtree(INSTANCE_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def client():
+    from app import app
+    return app.test_client()
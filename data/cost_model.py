@@ -0,0 +1,320 @@
+"""Fleet cost model and Monte Carlo EV transition scenarios.
+
+``fleet_arrays()`` prices every vehicle and route at once with NumPy: fuel from
+distance, consumption and the latest quote in ``data/fuel_prices.py``, tolls
+per km, maintenance and insurance per vehicle, salaries from the drivers
+assigned to each vehicle. A route is priced with the vehicle of the driver
+booked on it, and as a diesel truck while nobody is.
+Monthly distance comes from the last 30 days of route history when the
+database has it, and from the current routes otherwise.
+
+``simulate_ev(scenario)`` draws ``draws`` independent futures month by month
+(diesel and electricity price paths, utilisation, battery degradation and
+replacement) as ``(draws, months)`` arrays and returns the distribution of
+payback periods. A scenario set of a few scenarios x 10k draws runs well
+under a second.
+"""
+import math
+import re
+from datetime import date, timedelta
+
+import numpy as np
+
+from data.fuel_prices import get_fuel_prices
+from data.road_graph import FUEL_EFFICIENCY_KM_L
+
+TOLL_PER_KM = 0.12
+INSURANCE_PER_VEHICLE = 640.0
+DRIVER_MONTHLY_SALARY = 3500.0
+WORKING_DAYS_PER_MONTH = 22
+HISTORY_DAYS = 30
+# Relative monthly distance by vehicle status
+STATUS_UTILISATION = {'Em Uso': 1.0, 'Disponível': 0.6, 'Manutenção': 0.0}
+FUEL_PRICE_KEYS = {'Diesel S10': 'diesel_s10', 'Gasolina': 'gasolina_comum'}
+CO2_KG_PER_LITER = 2.68
+CO2_KG_PER_KWH = 0.08
+
+EV_DEFAULTS = {
+    'fleet_share': 1.0,
+    'vehicle_premium': 90000.0,
+    'kwh_per_km': 1.2,
+    'electricity_price': 0.85,
+    'diesel_growth': 0.04,
+    'diesel_volatility': 0.15,
+    'electricity_growth': 0.03,
+    'electricity_volatility': 0.10,
+    'utilisation_sd': 0.15,
+    'degradation_min': 0.015,
+    'degradation_max': 0.035,
+    'battery_replacement': 60000.0,
+    'replacement_capacity': 0.7,
+    'maintenance_ratio': 0.6,
+    'discount_rate': 0.08,
+    'horizon_years': 10,
+    'draws': 10000,
+    'seed': 42,
+}
+MAX_DRAWS = 50000
+MAX_HORIZON_YEARS = 20
+MAX_SCENARIOS = 20
+HISTOGRAM_BINS = 20
+EFFICIENCY_MONTHS = 6
+
+
+def _hours(estimated_time):
+    """'5h 30min' -> 5.5"""
+    match = re.match(r'\s*(\d+)h\s*(\d+)?', estimated_time or '')
+    return int(match.group(1)) + int(match.group(2) or 0) / 60 if match else 0.0
+
+
+def fuel_price_of(fuel_type, prices):
+    return prices.get(FUEL_PRICE_KEYS.get(fuel_type, 'diesel_s10'), prices['diesel_s10'])
+
+
+def monthly_fleet_km(routes):
+    """Fleet km per month from the route history, or extrapolated from ``routes``"""
+    from data.storage import get_storage
+
+    storage = get_storage()
+    if storage.has_data('routes'):
+        start = (date.today() - timedelta(days=HISTORY_DAYS)).isoformat()
+        totals = storage.daily_route_totals(start)
+        if totals:
+            return sum(distance for _, _, distance in totals) * HISTORY_DAYS / len(totals)
+    return sum(r.distance for r in routes) * WORKING_DAYS_PER_MONTH
+
+
+def route_vehicles(store):
+    """Vehicle of the driver booked on each route, or None where nobody is"""
+    from data.scheduler import get_scheduler
+
+    scheduler = get_scheduler()
+    vehicles = []
+    for route in store.routes:
+        driver = store.get_driver(scheduler.route_driver(route.id))
+        vehicles.append(store.get_vehicle_by_plate(driver.vehicle_assigned) if driver else None)
+    return vehicles
+
+
+def route_costs(routes, prices, vehicles=None):
+    """Fuel, toll and salary cost of each route (arrays aligned with ``routes``).
+
+    ``vehicles`` (aligned with ``routes``, None for unknown) sets each route's
+    fuel type and consumption; routes without one are priced as diesel.
+    """
+    vehicles = vehicles or [None] * len(routes)
+    distance = np.array([r.distance for r in routes], dtype=float)
+    cargo = np.array([r.cargo_weight or 0 for r in routes], dtype=float)
+    hours = np.array([_hours(r.estimated_time) for r in routes], dtype=float)
+    consumption = np.array([(v.avg_consumption if v else 0) or FUEL_EFFICIENCY_KM_L for v in vehicles], dtype=float)
+    price = np.array([fuel_price_of(v.fuel_type if v else None, prices) for v in vehicles], dtype=float)
+    liters = distance / consumption * (1 + cargo / 30000 * 0.2)
+    fuel = liters * price
+    tolls = distance * TOLL_PER_KM
+    salary = hours * DRIVER_MONTHLY_SALARY / (WORKING_DAYS_PER_MONTH * 8)
+    return {'distance': distance, 'liters': liters, 'fuel': fuel, 'tolls': tolls, 'salary': salary,
+            'total': fuel + tolls + salary}
+
+
+def vehicle_costs(vehicles, drivers, fleet_km, prices):
+    """Monthly km and fuel, toll, maintenance, insurance and salary per vehicle"""
+    weights = np.array([STATUS_UTILISATION.get(v.status, 0.6) for v in vehicles], dtype=float)
+    km = fleet_km * weights / weights.sum() if weights.sum() else np.zeros(len(vehicles))
+    consumption = np.array([v.avg_consumption or FUEL_EFFICIENCY_KM_L for v in vehicles], dtype=float)
+    price = np.array([fuel_price_of(v.fuel_type, prices) for v in vehicles], dtype=float)
+    drivers_per_plate = {}
+    for driver in drivers:
+        plate = driver.vehicle_assigned
+        drivers_per_plate[plate] = drivers_per_plate.get(plate, 0) + 1
+    assigned = np.array([drivers_per_plate.get(v.plate, 0) for v in vehicles], dtype=float)
+
+    liters = km / consumption
+    costs = {
+        'km': km,
+        'liters': liters,
+        'fuel': liters * price,
+        'tolls': km * TOLL_PER_KM,
+        'maintenance': np.array([v.maintenance_cost or 0 for v in vehicles], dtype=float),
+        'insurance': np.full(len(vehicles), INSURANCE_PER_VEHICLE),
+        'driver_salaries': assigned * DRIVER_MONTHLY_SALARY,
+    }
+    costs['total'] = costs['fuel'] + costs['tolls'] + costs['maintenance'] + costs['insurance'] + costs['driver_salaries']
+    return costs
+
+
+def fleet_arrays(store, prices):
+    """``(monthly fleet km, per-vehicle cost arrays, per-route cost arrays)``"""
+    fleet_km = monthly_fleet_km(store.routes)
+    return (fleet_km, vehicle_costs(store.vehicles, store.drivers, fleet_km, prices),
+            route_costs(store.routes, prices, route_vehicles(store)))
+
+
+def fleet_costs(store, arrays):
+    """Per-vehicle and per-route costs plus fleet totals for one month"""
+    fleet_km, per_vehicle, per_route = arrays
+    operational = {name: round(float(per_vehicle[name].sum()), 2)
+                   for name in ('fuel', 'maintenance', 'tolls', 'insurance', 'driver_salaries')}
+    total = sum(operational.values())
+    return {
+        'operational_costs': operational,
+        'monthly_km': round(fleet_km),
+        'cost_per_km': round(total / fleet_km, 2) if fleet_km else 0.0,
+        'per_vehicle': [
+            dict({name: round(float(values[i]), 2) for name, values in per_vehicle.items()},
+                 id=v.id, plate=v.plate, model=v.model, status=v.status)
+            for i, v in enumerate(store.vehicles)
+        ],
+        'per_route': [
+            dict({name: round(float(values[i]), 2) for name, values in per_route.items()},
+                 id=r.id, origin=r.origin.name, destination=r.destination.name)
+            for i, r in enumerate(store.routes)
+        ],
+    }
+
+
+def ev_scenario(params=None):
+    """Scenario parameters over EV_DEFAULTS; raises ValueError on bad values"""
+    params = dict(params or {})
+    unknown = set(params) - set(EV_DEFAULTS) - {'name'}
+    if unknown:
+        raise ValueError(f"Parâmetros desconhecidos: {', '.join(sorted(unknown))}")
+    scenario = dict(EV_DEFAULTS)
+    for key, value in params.items():
+        if key == 'name':
+            scenario[key] = str(value)
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+            raise ValueError(f'Valor inválido para {key}')
+        scenario[key] = value
+    if not 0 < scenario['fleet_share'] <= 1:
+        raise ValueError('fleet_share deve estar entre 0 e 1')
+    if scenario['degradation_min'] > scenario['degradation_max']:
+        raise ValueError('degradation_min deve ser menor ou igual a degradation_max')
+    scenario['draws'] = int(min(max(scenario['draws'], 100), MAX_DRAWS))
+    scenario['horizon_years'] = int(min(max(scenario['horizon_years'], 1), MAX_HORIZON_YEARS))
+    return scenario
+
+
+def _price_paths(rng, start, growth, volatility, shape):
+    """Monthly geometric Brownian motion paths starting at ``start``"""
+    dt = 1 / 12
+    shocks = rng.standard_normal(shape) * volatility * np.sqrt(dt) + (growth - volatility ** 2 / 2) * dt
+    return start * np.exp(np.cumsum(shocks, axis=1))
+
+
+def _percentile(values, q):
+    return round(float(np.percentile(values, q)), 2) if len(values) else None
+
+
+def simulate_ev(scenario, vehicle_arrays, prices):
+    """Payback distribution of replacing the busiest ``fleet_share`` of vehicles with EVs"""
+    draws, months = scenario['draws'], scenario['horizon_years'] * 12
+    rng = np.random.default_rng(int(scenario['seed']))
+
+    # Convert the vehicles that drive the most first
+    count = max(1, round(scenario['fleet_share'] * len(vehicle_arrays['km'])))
+    chosen = np.argsort(-vehicle_arrays['km'], kind='stable')[:count]
+    km = vehicle_arrays['km'][chosen]
+    liters_per_km = vehicle_arrays['liters'][chosen].sum() / km.sum() if km.sum() else 0.0
+    maintenance = vehicle_arrays['maintenance'][chosen].sum()
+    investment = scenario['vehicle_premium'] * count
+
+    # (draws, months): utilisation noise, price paths, battery state
+    utilisation = np.clip(1 + rng.standard_normal((draws, months)) * scenario['utilisation_sd'], 0, None)
+    monthly_km = km.sum() * utilisation
+    diesel = _price_paths(rng, prices['diesel_s10'], scenario['diesel_growth'], scenario['diesel_volatility'],
+                          (draws, months))
+    electricity = _price_paths(rng, scenario['electricity_price'], scenario['electricity_growth'],
+                               scenario['electricity_volatility'], (draws, months))
+    degradation = rng.uniform(scenario['degradation_min'], scenario['degradation_max'], (draws, 1)) / 12
+    capacity = 1 - degradation * np.arange(1, months + 1)
+    # Below the replacement threshold the pack is replaced once and degrades again from new
+    replaced = capacity < scenario['replacement_capacity']
+    first_replacement = np.where(replaced.any(axis=1), replaced.argmax(axis=1), months)
+    age = np.arange(months) - np.where(np.arange(months) >= first_replacement[:, None], first_replacement[:, None], -1)
+    capacity = np.maximum(1 - degradation * age, scenario['replacement_capacity'])
+
+    diesel_cost = monthly_km * liters_per_km * diesel + maintenance
+    ev_cost = (monthly_km * scenario['kwh_per_km'] / capacity * electricity
+               + maintenance * scenario['maintenance_ratio'])
+    savings = diesel_cost - ev_cost
+    savings[np.arange(draws), np.minimum(first_replacement, months - 1)] -= np.where(
+        first_replacement < months, scenario['battery_replacement'] * count, 0)
+
+    cumulative = np.cumsum(savings, axis=1) - investment
+    paid = cumulative >= 0
+    paid_back = paid.any(axis=1)
+    payback_years = np.where(paid_back, (paid.argmax(axis=1) + 1) / 12, np.nan)
+    discount = (1 + scenario['discount_rate']) ** (-np.arange(1, months + 1) / 12)
+    npv = savings @ discount - investment
+
+    finite = payback_years[paid_back]
+    histogram, edges = np.histogram(finite, bins=HISTOGRAM_BINS, range=(0, scenario['horizon_years']))
+    liters_saved = monthly_km.mean() * liters_per_km * 12
+    kwh_used = monthly_km.mean() * scenario['kwh_per_km'] * 12
+    return {
+        'name': scenario.get('name'),
+        'vehicles_converted': int(count),
+        'initial_investment': round(investment, 2),
+        'draws': draws,
+        'horizon_years': scenario['horizon_years'],
+        'probability_payback': round(float(paid_back.mean()), 3),
+        'payback_years': {'p10': _percentile(finite, 10), 'p50': _percentile(finite, 50), 'p90': _percentile(finite, 90),
+                          'mean': round(float(finite.mean()), 2) if len(finite) else None},
+        'histogram': {'edges_years': np.round(edges, 2).tolist(), 'counts': histogram.tolist()},
+        'npv': {'p10': _percentile(npv, 10), 'p50': _percentile(npv, 50), 'p90': _percentile(npv, 90)},
+        'monthly_energy_cost': round(float((monthly_km * scenario['kwh_per_km'] / capacity * electricity)[:, :12].mean()), 2),
+        'monthly_savings': round(float(savings[:, :12].mean()), 2),
+        'co2_reduction_percent': round((1 - kwh_used * CO2_KG_PER_KWH / (liters_saved * CO2_KG_PER_LITER)) * 100, 1)
+        if liters_saved else 0.0,
+    }
+
+
+def run_ev_scenarios(store, scenarios, prices=None):
+    """Simulate a set of scenarios against the current fleet"""
+    if not 1 <= len(scenarios) <= MAX_SCENARIOS:
+        raise ValueError(f'Envie de 1 a {MAX_SCENARIOS} cenários')
+    scenarios = [ev_scenario(s) for s in scenarios]
+    prices = prices or get_fuel_prices().prices()
+    _, per_vehicle, _ = fleet_arrays(store, prices)
+    return [simulate_ev(s, per_vehicle, prices) for s in scenarios]
+
+
+def _format_years(years):
+    return f"{years:.1f} anos".replace('.', ',') if years is not None else 'Acima do horizonte'
+
+
+def efficiency_trends(months=EFFICIENCY_MONTHS):
+    """Recorded fleet km/L of each of the last ``months`` months that has any"""
+    from data.rollups import get_rollups
+
+    series = get_rollups().series('month', months)
+    return [{'month': label, 'efficiency': value}
+            for label, value in zip(series['labels'], series['fuel_efficiency']) if value is not None]
+
+
+def get_cost_analysis():
+    """Cost analysis of the current fleet with the default EV scenario"""
+    from data.fleet_store import get_fleet_store
+
+    store = get_fleet_store()
+    fuel_prices = get_fuel_prices()
+    prices = fuel_prices.prices()
+    arrays = fleet_arrays(store, prices)
+    ev = simulate_ev(ev_scenario(), arrays[1], prices)
+    costs = fleet_costs(store, arrays)
+    total = sum(costs['operational_costs'].values())
+    return dict(
+        costs,
+        diesel_price=fuel_prices.summary('diesel_s10'),
+        # Share of the monthly operating cost the default EV scenario saves in its first year
+        monthly_savings=round(ev['monthly_savings'] / total * 100, 1) if total else 0.0,
+        electric_vehicle_analysis={
+            'initial_investment': ev['initial_investment'],
+            'monthly_energy_cost': ev['monthly_energy_cost'],
+            'payback_period': _format_years(ev['payback_years']['p50']),
+            'co2_reduction': f"{ev['co2_reduction_percent']:.0f}%",
+            'simulation': ev
+        },
+        efficiency_trends=efficiency_trends()
+    )
@@ -0,0 +1,125 @@
+"""Many-to-many distance, duration and cost matrices between hubs.
+
+A matrix is built with one shortest-path tree per origin and cached on disk
+as a ``(4, N, M)`` float64 array (distance km, duration min, fuel liters,
+tolls R$); the cost is priced per request from the origin state's fuel price,
+so new quotes apply without recomputing paths. Cache files are keyed by the origin/destination sets, optimization type, toll
+avoidance and the road graph fingerprint, and are opened memory-mapped, so
+repeated planning sessions reuse them without recomputing.
+
+Both caches are bounded: the process keeps the MAX_LOADED most recently used
+matrices mapped, and the cache folder keeps the MAX_FILES most recently used
+files (by modification time, refreshed on every load from disk).
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from data.paths import instance_path
+from data.road_graph import DIESEL_PRICE, METRICS, get_road_graph
+
+CACHE_DIR = 'matrix_cache'
+# Part of the cache key, so files of an older layout are never mapped
+LAYOUT = 'km,min,fuel_l,toll'
+MAX_LOADED = int(os.environ.get('WISE_ROUTES_MATRIX_LOADED', 0)) or 32
+MAX_FILES = int(os.environ.get('WISE_ROUTES_MATRIX_FILES', 0)) or 256
+
+_lock = threading.Lock()
+_loaded = OrderedDict()
+
+
+def matrix_key(origins, destinations, metric, avoid_tolls, fingerprint):
+    payload = json.dumps([LAYOUT, origins, destinations, metric, bool(avoid_tolls), fingerprint])
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def compute_matrix(graph, sources, targets, metric='fastest', avoid_tolls=False):
+    """Build the (4, N, M) matrix for node indexes ``sources`` x ``targets``"""
+    matrix = np.empty((4, len(sources), len(targets)))
+    for i, source in enumerate(sources):
+        for layer, values in enumerate(graph.shortest_path_tree(source, metric, avoid_tolls)):
+            matrix[layer, i] = values[targets]
+    return matrix
+
+
+def get_distance_matrix(origins, destinations=None, metric='fastest', avoid_tolls=False, fuel_prices=None):
+    """Return ``((distance, duration, cost), origin_names, destination_names, cached)``.
+
+    Repeated places are kept once. Fuel is priced at ``fuel_prices[state]`` of
+    the origin (``DIESEL_PRICE`` for states without a quote). Raises
+    ValueError for unknown hubs, optimization types or more places than the
+    road graph has nodes.
+    """
+    if metric not in METRICS:
+        raise ValueError(f'Tipo de otimização inválido: {metric}')
+    graph = get_road_graph()
+    destinations = origins if destinations is None else destinations
+    for places in (origins, destinations):
+        if len(places) > graph.node_count:
+            raise ValueError(f'Máximo de {graph.node_count} locais por lista')
+    sources = _resolve(graph, origins)
+    targets = _resolve(graph, destinations)
+    origin_names = [graph.names[n] for n in sources]
+    destination_names = [graph.names[n] for n in targets]
+
+    key = matrix_key(origin_names, destination_names, metric, avoid_tolls, graph.fingerprint)
+    cached = True
+    with _lock:
+        matrix = _loaded.get(key)
+        if matrix is not None:
+            _loaded.move_to_end(key)
+        else:
+            path = instance_path(CACHE_DIR, f'{key}.npy')
+            if os.path.exists(path):
+                os.utime(path)
+            else:
+                cached = False
+                _save(path, compute_matrix(graph, sources, targets, metric, avoid_tolls))
+                _prune(os.path.dirname(path))
+            matrix = _loaded[key] = np.load(path, mmap_mode='r')
+            while len(_loaded) > MAX_LOADED:
+                _loaded.popitem(last=False)
+    prices = np.array([(fuel_prices or {}).get(graph.states[n], DIESEL_PRICE) for n in sources])
+    cost = matrix[2] * prices[:, None] + matrix[3]
+    return (matrix[0], matrix[1], cost), origin_names, destination_names, cached
+
+
+def _resolve(graph, places):
+    nodes = []
+    for place in places:
+        node = graph.find_node(place)
+        if node is None:
+            raise ValueError(f'Local desconhecido: {place}')
+        nodes.append(node)
+    return list(dict.fromkeys(nodes))
+
+
+def _save(path, matrix):
+    # Write then rename so other workers never map a half-written file
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, matrix)
+    os.replace(tmp_path, path)
+
+
+def _prune(directory):
+    """Delete the least recently used cache files beyond MAX_FILES"""
+    files = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith('.npy'):
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+    files.sort()
+    # Mapped copies stay readable after the file is unlinked
+    for _, path in files[:max(len(files) - MAX_FILES, 0)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,179 @@
+"""Driver analytics derived from the fleet's driver records.
+
+Driver metrics are flattened once into pandas columns (one row per driver,
+plus one row per driver-month for ``performance_history``) and every
+statistic is a column operation. Results are cached per fleet store version,
+so they are recomputed only after the store is reloaded or changed. pandas
+is imported on first use to keep it out of the application's startup.
+
+The ``telemetry`` section is measured rather than recorded: speed and
+distance of each driver's assigned vehicle over its buffered telemetry
+samples, recomputed when new samples arrive.
+"""
+import threading
+
+import numpy as np
+
+from data.fleet_store import get_fleet_store
+from data.road_graph import DIESEL_PRICE
+from data.synthetic_data import get_driver_analytics as get_analytics_catalog
+from data.telemetry import get_telemetry_store
+
+EFFICIENCY_TARGET = 90
+FUEL_BONUS_MIN_SAVINGS = 5.0
+PUNCTUALITY_BONUS_MIN_SCORE = 95
+# Training progress a driver needs to have completed each module, in order
+MODULE_PROGRESS_THRESHOLDS = [70, 80, 90]
+# Samples above this speed count as speeding (fuel use climbs past 90 km/h)
+SPEEDING_KMH = 90
+
+_lock = threading.Lock()
+_cache = {}
+_telemetry_cache = {}
+
+
+def driver_frame(drivers):
+    """One row per driver with the metrics analytics needs"""
+    import pandas as pd
+
+    monthly = [d.monthly_performance for d in drivers]
+    return pd.DataFrame({
+        'id': [d.id for d in drivers],
+        'name': [d.name for d in drivers],
+        'avg_consumption': np.fromiter((d.avg_consumption for d in drivers), float, len(drivers)),
+        'km_driven': np.fromiter((d.km_driven for d in drivers), float, len(drivers)),
+        'efficiency_score': np.fromiter((d.efficiency_score for d in drivers), float, len(drivers)),
+        'safety_score': np.fromiter((d.safety_score for d in drivers), float, len(drivers)),
+        'punctuality_score': np.fromiter((d.punctuality_score for d in drivers), float, len(drivers)),
+        'training_completed': np.fromiter((d.training_completed for d in drivers), float, len(drivers)),
+        'penalties': np.fromiter((d.penalties for d in drivers), int, len(drivers)),
+        'fuel_savings': np.fromiter((m.fuel_savings for m in monthly), float, len(drivers)),
+        'routes_completed': np.fromiter((m.routes_completed for m in monthly), int, len(drivers)),
+        'incidents': np.fromiter((m.incidents for m in monthly), int, len(drivers)),
+    })
+
+
+def history_frame(drivers):
+    """One row per driver-month of ``performance_history``"""
+    import pandas as pd
+
+    histories = [d.performance_history for d in drivers]
+    months = [month for h in histories for month in h.months]
+    return pd.DataFrame({
+        'month': pd.Categorical(months),
+        'consumption': np.concatenate([np.frombuffer(h.consumption) for h in histories] or [np.empty(0)]),
+        'efficiency': np.concatenate([np.frombuffer(h.efficiency) for h in histories] or [np.empty(0)]),
+    })
+
+
+def compute_driver_analytics(drivers):
+    """Analytics for a list of driver records"""
+    analytics = get_analytics_catalog()
+    df = driver_frame(drivers)
+    total = len(df)
+    if not total:
+        return analytics
+
+    best = df.iloc[int(np.lexsort((df['avg_consumption'], df['efficiency_score']))[-1])]
+    analytics['best_driver'] = {
+        'name': best['name'],
+        'avg_consumption': float(best['avg_consumption']),
+        'efficiency_score': int(best['efficiency_score']),
+        'fuel_savings': float(best['fuel_savings'])
+    }
+
+    # km_driven is yearly; savings are a share of this month's diesel spend
+    monthly_liters = df['km_driven'] / 12 / df['avg_consumption']
+    saved_liters = monthly_liters * df['fuel_savings'].clip(lower=0) / 100
+    analytics['fuel_savings'] = round(float(saved_liters.sum() * DIESEL_PRICE), 2)
+    analytics['efficiency_target'] = EFFICIENCY_TARGET
+    analytics['drivers_meeting_target'] = int((df['efficiency_score'] >= EFFICIENCY_TARGET).sum())
+
+    rewards = analytics['reward_system']
+    fuel_eligible = df['fuel_savings'] >= FUEL_BONUS_MIN_SAVINGS
+    rewards['fuel_economy']['eligible_drivers'] = int(fuel_eligible.sum())
+    rewards['fuel_economy']['total_bonuses'] = round(
+        float(df.loc[fuel_eligible, 'fuel_savings'].sum() * rewards['fuel_economy']['bonus_per_percent']), 2)
+    punctual = df['punctuality_score'] >= PUNCTUALITY_BONUS_MIN_SCORE
+    rewards['punctuality']['eligible_drivers'] = int(punctual.sum())
+    rewards['punctuality']['total_bonuses'] = round(
+        float(df.loc[punctual, 'routes_completed'].sum() * rewards['punctuality']['bonus_per_delivery']), 2)
+    safe = (df['incidents'] == 0) & (df['penalties'] == 0)
+    rewards['safety']['eligible_drivers'] = int(safe.sum())
+    rewards['safety']['total_bonuses'] = round(float(safe.sum() * rewards['safety']['monthly_bonus']), 2)
+
+    progress = df['training_completed'].to_numpy()
+    for module, threshold in zip(analytics['training_modules'], MODULE_PROGRESS_THRESHOLDS):
+        participants = int((progress >= threshold).sum())
+        module['participants'] = participants
+        module['total_drivers'] = total
+        module['completion_rate'] = round(participants / total * 100)
+    rates = [m['completion_rate'] for m in analytics['training_modules']]
+    analytics['training_summary'] = {
+        'total_modules': len(rates),
+        'avg_completion': float(np.mean(rates)) if rates else 0.0,
+        'avg_driver_progress': round(float(progress.mean()), 1)
+    }
+
+    history = history_frame(drivers)
+    trends = history.groupby('month', observed=True, sort=False)[['consumption', 'efficiency']].mean()
+    analytics['monthly_trends'] = [
+        {'month': month, 'avg_consumption': round(row.consumption, 2), 'avg_efficiency': round(row.efficiency, 1)}
+        for month, row in trends.iterrows()
+    ]
+    return analytics
+
+
+def telemetry_analytics(store, telemetry):
+    """Speed and distance of each driver's assigned vehicle from its buffered telemetry"""
+    rows, speeds = [], []
+    for driver in store.drivers:
+        vehicle = store.get_vehicle_by_plate(driver.vehicle_assigned)
+        samples = telemetry.recent(vehicle.id) if vehicle is not None else ()
+        if not len(samples):
+            continue
+        speed = samples['speed_kmh']
+        speeds.append(speed)
+        rows.append({
+            'driver_id': driver.id,
+            'name': driver.name,
+            'vehicle_id': vehicle.id,
+            'samples': int(len(samples)),
+            'avg_speed_kmh': round(float(speed.mean()), 1),
+            'speeding_percent': round(float((speed > SPEEDING_KMH).mean() * 100), 1),
+            'distance_km': round(float(samples['odometer_km'][-1] - samples['odometer_km'][0]), 1)
+        })
+    speed = np.concatenate(speeds) if speeds else np.empty(0)
+    return {
+        'drivers_reporting': len(rows),
+        'speeding_kmh': SPEEDING_KMH,
+        'avg_speed_kmh': round(float(speed.mean()), 1) if len(speed) else None,
+        'speeding_percent': round(float((speed > SPEEDING_KMH).mean() * 100), 1) if len(speed) else None,
+        'drivers': rows
+    }
+
+
+def get_driver_analytics():
+    """Analytics for the current fleet, cached until the store changes; the
+    telemetry section is cached until new samples arrive"""
+    store = get_fleet_store()
+    key = (id(store), store.version)
+    analytics = _cache.get(key)
+    if analytics is None:
+        with _lock:
+            analytics = _cache.get(key)
+            if analytics is None:
+                analytics = compute_driver_analytics(store.drivers)
+                _cache.clear()
+                _cache[key] = analytics
+    telemetry = get_telemetry_store()
+    telemetry_key = key + (telemetry.total_samples,)
+    measured = _telemetry_cache.get(telemetry_key)
+    if measured is None:
+        with _lock:
+            measured = _telemetry_cache.get(telemetry_key)
+            if measured is None:
+                measured = telemetry_analytics(store, telemetry)
+                _telemetry_cache.clear()
+                _telemetry_cache[telemetry_key] = measured
+    return dict(analytics, telemetry=measured)
@@ -0,0 +1,126 @@
+"""Concurrent fetching of the independent data sources behind a page.
+
+``gather('page', {'name': fetch, ...})`` runs every source on a shared bounded thread
+pool and waits for each one up to its timeout, so a page costs as much as its
+slowest source instead of the sum of all of them. A source that times out or
+fails is replaced by its last known value; it keeps running in the
+background and refreshes that value when it finishes. Only one fetch per
+source is in flight at a time, so a slow source never piles up threads.
+In-flight fetches and last known values are keyed by ``page.name``, so two
+pages may use the same source name for different data.
+
+A source with no last known value yet (first request after startup) has
+nothing to fall back on: if it is not done by its timeout either, ``gather``
+raises ``SourceUnavailable`` and the fetch goes on filling the value.
+
+For local testing, ``WISE_ROUTES_SOURCE_DELAYS="weather=3,cost_analysis=0.5"``
+adds an artificial delay (seconds) to the named sources on every page
+(``drivers.routes=3`` delays only one page's source).
+"""
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+FANOUT_WORKERS = int(os.environ.get('WISE_ROUTES_FANOUT_WORKERS', 0)) or 8
+DEFAULT_SOURCE_TIMEOUT = 2.0
+
+_lock = threading.Lock()
+_pool = None
+_in_flight = {}
+_last_known = {}
+
+
+class SourceUnavailable(Exception):
+    """A source timed out before it ever produced a value"""
+
+    def __init__(self, key):
+        super().__init__(f'Fonte {key} ainda sem dados')
+        self.key = key
+
+
+def _parse_delays(spec):
+    delays = {}
+    for item in filter(None, (s.strip() for s in spec.split(','))):
+        name, _, seconds = item.partition('=')
+        delays[name.strip()] = float(seconds)
+    return delays
+
+
+FAKE_DELAYS = _parse_delays(os.environ.get('WISE_ROUTES_SOURCE_DELAYS', ''))
+
+
+def delayed(fetch, seconds):
+    """Fake source: ``fetch`` after sleeping ``seconds``"""
+    def slow_fetch():
+        time.sleep(seconds)
+        return fetch()
+    return slow_fetch
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='fanout')
+                atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+    return _pool
+
+
+def _remember(key, future):
+    with _lock:
+        if _in_flight.get(key) is future:
+            del _in_flight[key]
+    if not future.cancelled() and future.exception() is None:
+        _last_known[key] = future.result()
+
+
+def _submit(key, name, fetch):
+    """Start ``fetch`` unless the same source is already running"""
+    pool = _get_pool()
+    with _lock:
+        future = _in_flight.get(key)
+        if future is not None:
+            return future
+        delay = FAKE_DELAYS.get(key, FAKE_DELAYS.get(name))
+        if delay is not None:
+            fetch = delayed(fetch, delay)
+        future = _in_flight[key] = pool.submit(fetch)
+    future.add_done_callback(lambda f: _remember(key, f))
+    return future
+
+
+def gather(page, sources, timeout=DEFAULT_SOURCE_TIMEOUT):
+    """Fetch the ``sources`` of ``page`` concurrently.
+
+    ``sources`` maps a source name to a callable, or to ``(callable,
+    timeout)`` for a per-source timeout. Returns ``(results, stale)`` where
+    ``stale`` lists the sources served from their last known value. Raises
+    ``SourceUnavailable`` if a source without one times out.
+    """
+    started = time.monotonic()
+    futures = {}
+    for name, source in sources.items():
+        fetch, source_timeout = source if isinstance(source, tuple) else (source, timeout)
+        key = f'{page}.{name}'
+        futures[name] = (key, _submit(key, name, fetch), source_timeout)
+
+    results, stale = {}, []
+    for name, (key, future, source_timeout) in futures.items():
+        remaining = source_timeout - (time.monotonic() - started)
+        if key not in _last_known:
+            # Nothing to fall back on: a failure is raised as is
+            try:
+                results[name] = future.result(timeout=max(remaining, 0))
+            except TimeoutError:
+                raise SourceUnavailable(key) from None
+            continue
+        try:
+            results[name] = future.result(timeout=max(remaining, 0))
+        except Exception:
+            # Timed out or failed; the fetch refreshes the value when it ends
+            results[name] = _last_known[key]
+            stale.append(name)
+    return results, stale
@@ -0,0 +1,144 @@
+"""In-memory fleet repository shared by every request.
+
+The store is built once at startup from the database (synthetic data until
+it is seeded, see ``data/storage.py``) and keeps
+primary-key indexes for drivers (id), vehicles (id and plate) and routes (id),
+so lookups are O(1) and return the same record between requests.
+
+To pick up new data, call ``reload_fleet_store()`` (or POST to
+``/api/fleet/reload``); it builds a fresh store and swaps it in atomically, so
+requests already running keep reading the previous snapshot.
+
+``update_driver()`` changes a driver in place, bumps ``version`` and notifies
+subscribers (e.g. the leaderboard index) so derived data stays current.
+"""
+import math
+import threading
+
+from data.records import DriverStatus
+from data.storage import get_drivers_data, get_vehicles_data, get_routes_data, get_storage
+from data.synthetic_data import HUB_CITIES
+
+# Driver fields that can be changed after loading
+UPDATABLE_DRIVER_FIELDS = (
+    'avg_consumption', 'km_driven', 'efficiency_score', 'safety_score',
+    'punctuality_score', 'training_completed', 'penalties', 'bonuses', 'status', 'depot'
+)
+
+# Inclusive bounds of the numeric fields; avg_consumption (km/L) divides
+# fuel estimates, so it must stay above zero
+PERCENT_FIELDS = ('efficiency_score', 'safety_score', 'punctuality_score', 'training_completed')
+COUNT_FIELDS = ('km_driven', 'penalties', 'bonuses')
+
+_lock = threading.Lock()
+_store = None
+
+
+class FleetStore:
+    """Drivers, vehicles and routes indexed by primary key"""
+
+    def __init__(self, drivers, vehicles, routes, version=1):
+        self.drivers = drivers
+        self.vehicles = vehicles
+        self.routes = routes
+        self.version = version
+
+        self._drivers_by_id = {d.id: d for d in drivers}
+        self._vehicles_by_id = {v.id: v for v in vehicles}
+        self._vehicles_by_plate = {v.plate: v for v in vehicles}
+        self._routes_by_id = {r.id: r for r in routes}
+        self._update_lock = threading.Lock()
+        self._listeners = []
+
+    @classmethod
+    def load(cls, version=1):
+        """Build a store from the database, or synthetic data when it is empty"""
+        store = cls(get_drivers_data(), get_vehicles_data(), get_routes_data(), version)
+        storage = get_storage()
+        if storage.has_data():
+            # Persist driver updates
+            store.subscribe(lambda driver, changed: storage.update_driver(driver.id, changed))
+        return store
+
+    def get_driver(self, driver_id):
+        return self._drivers_by_id.get(driver_id)
+
+    def get_vehicle(self, vehicle_id):
+        return self._vehicles_by_id.get(vehicle_id)
+
+    def get_vehicle_by_plate(self, plate):
+        return self._vehicles_by_plate.get(plate)
+
+    def get_route(self, route_id):
+        return self._routes_by_id.get(route_id)
+
+    def subscribe(self, listener):
+        """Call ``listener(driver, changed_fields)`` after each driver update"""
+        self._listeners.append(listener)
+
+    def update_driver(self, driver_id, **fields):
+        """Update driver fields in place; returns the driver or None.
+
+        Every field is checked before anything changes, so a ValueError leaves
+        the driver and the indexes that follow it untouched.
+        """
+        unknown = set(fields) - set(UPDATABLE_DRIVER_FIELDS)
+        if unknown:
+            raise ValueError(f"Campos não editáveis: {', '.join(sorted(unknown))}")
+        for key, value in fields.items():
+            if key == 'status':
+                if value not in [s.value for s in DriverStatus]:
+                    raise ValueError(f"Status inválido. Use {', '.join(s.value for s in DriverStatus)}")
+            elif key == 'depot':
+                if value not in [hub['name'] for hub in HUB_CITIES]:
+                    raise ValueError(f'Base desconhecida: {value}')
+            elif isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise ValueError(f'Valor numérico inválido para {key}')
+            elif key == 'avg_consumption' and value <= 0:
+                raise ValueError('avg_consumption deve ser maior que zero')
+            elif key in PERCENT_FIELDS and not 0 <= value <= 100:
+                raise ValueError(f'{key} deve estar entre 0 e 100')
+            elif key in COUNT_FIELDS and value < 0:
+                raise ValueError(f'{key} não pode ser negativo')
+        driver = self._drivers_by_id.get(driver_id)
+        if driver is None:
+            return None
+        if 'status' in fields:
+            fields['status'] = DriverStatus(fields['status'])
+        with self._update_lock:
+            changed = {k: v for k, v in fields.items() if getattr(driver, k) != v}
+            if not changed:
+                return driver
+            for key, value in changed.items():
+                setattr(driver, key, value)
+            self.version += 1
+            for listener in self._listeners:
+                listener(driver, changed)
+        return driver
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'drivers': len(self.drivers),
+            'vehicles': len(self.vehicles),
+            'routes': len(self.routes)
+        }
+
+
+def get_fleet_store():
+    """Return the current fleet store, loading it on first use"""
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                _store = FleetStore.load()
+    return _store
+
+
+def reload_fleet_store():
+    """Rebuild the fleet store from the data source and swap it in"""
+    global _store
+    with _lock:
+        version = _store.version + 1 if _store is not None else 1
+        _store = FleetStore.load(version)
+    return _store
@@ -0,0 +1,453 @@
+"""Fuel price history per fuel type and region in sorted NumPy arrays.
+
+Each ``(fuel_type, region)`` pair owns one ``PriceSeries``: timestamps
+(local wall-clock seconds, as in ``data/rollups.py``) and prices in parallel
+arrays kept sorted by time, plus a running sum of prices. Appends in time
+order are amortized O(1); a quote older than the newest one is merged in.
+Every query is a binary search over the timestamps:
+
+- latest price at a moment: one ``searchsorted``
+- quotes in a range: two ``searchsorted`` and a slice
+- moving average over a window: two ``searchsorted`` and the running sum
+- percent change over a period: two latest-price lookups
+
+Regions are state codes (``PR``, ``SP``...) by default; any string works,
+so a single station can have its own series. The shared store is loaded
+from ``instance/fuel_prices.npz`` when it exists and seeded with two years
+of synthetic daily quotes otherwise.
+
+New quotes are appended to ``instance/fuel_prices.npz.journal`` (one JSON
+line per quote) and replayed on load. Once the journal holds COMPACT_QUOTES
+quotes a background thread folds it into a new ``.npz`` snapshot, written to
+a temporary file and moved into place, so a request never rewrites the
+whole history and a crash never leaves a half-written store.
+"""
+import json
+import logging
+import os
+import threading
+import zlib
+from datetime import date, timedelta
+
+import numpy as np
+
+from data.paths import instance_path
+from data.rollups import local_seconds
+
+FUEL_TYPES = ('gasolina_comum', 'gasolina_aditivada', 'diesel_s10', 'vale_gasolina')
+REGIONS = ('PR', 'SP', 'RJ', 'MG', 'RS', 'SC')
+DEFAULT_REGION = 'PR'
+# Latest synthetic quote per fuel type in DEFAULT_REGION, and each region's offset from it
+SEED_PRICES = {'gasolina_comum': 5.89, 'gasolina_aditivada': 6.15, 'diesel_s10': 5.45, 'vale_gasolina': 5.95}
+REGION_OFFSETS = {'PR': 0.0, 'SP': -0.06, 'RJ': 0.12, 'MG': 0.04, 'RS': 0.08, 'SC': 0.02}
+SEED_DAYS = 730
+DAY_SECONDS = 86400
+MAX_QUOTES_PER_BATCH = 100000
+# R$ per liter; bounds out typos and values float64 cannot hold
+MAX_PRICE = 1000.0
+STORE_FILE = 'fuel_prices.npz'
+JOURNAL_SUFFIX = '.journal'
+COMPACT_QUOTES = int(os.environ.get('WISE_ROUTES_FUEL_COMPACT_QUOTES', 0)) or 10000
+
+logger = logging.getLogger(__name__)
+
+_store = None
+_lock = threading.Lock()
+
+
+class PriceSeries:
+    """Quotes of one fuel type in one region, sorted by timestamp"""
+
+    __slots__ = ('ts', 'price', 'cumsum', 'size')
+
+    def __init__(self, capacity=64):
+        self.ts = np.zeros(capacity, np.int64)
+        self.price = np.zeros(capacity)
+        # cumsum[i] is the sum of the first i prices
+        self.cumsum = np.zeros(capacity + 1)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def extend(self, ts, prices):
+        """Add quotes; a quote at an existing timestamp replaces it"""
+        ts = np.asarray(ts, np.int64)
+        prices = np.asarray(prices, float)
+        order = np.argsort(ts, kind='stable')
+        ts, prices = ts[order], prices[order]
+        # Within the batch the last quote for a timestamp wins
+        last = np.append(ts[1:] != ts[:-1], True)
+        ts, prices = ts[last], prices[last]
+        if not len(ts):
+            return
+        if self.size and ts[0] <= self.ts[self.size - 1]:
+            self._merge(ts, prices)
+            return
+
+        start, end = self.size, self.size + len(ts)
+        self._reserve(end)
+        self.ts[start:end] = ts
+        self.price[start:end] = prices
+        self.cumsum[start + 1:end + 1] = self.cumsum[start] + np.cumsum(prices)
+        self.size = end
+
+    def _reserve(self, size):
+        capacity = len(self.ts)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2)
+        for name in ('ts', 'price'):
+            grown = np.zeros(capacity, getattr(self, name).dtype)
+            grown[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, grown)
+        cumsum = np.zeros(capacity + 1)
+        cumsum[:self.size + 1] = self.cumsum[:self.size + 1]
+        self.cumsum = cumsum
+
+    def _merge(self, ts, prices):
+        all_ts = np.concatenate([self.ts[:self.size], ts])
+        all_prices = np.concatenate([self.price[:self.size], prices])
+        order = np.argsort(all_ts, kind='stable')
+        all_ts, all_prices = all_ts[order], all_prices[order]
+        # Stable sort puts the new quote after the old one at the same timestamp
+        last = np.append(all_ts[1:] != all_ts[:-1], True)
+        all_ts, all_prices = all_ts[last], all_prices[last]
+        self.size = 0
+        self._reserve(len(all_ts))
+        self.ts[:len(all_ts)] = all_ts
+        self.price[:len(all_ts)] = all_prices
+        self.cumsum[1:len(all_ts) + 1] = np.cumsum(all_prices)
+        self.size = len(all_ts)
+
+    def count_until(self, seconds):
+        """Number of quotes at or before ``seconds``"""
+        return int(self.ts[:self.size].searchsorted(int(seconds), 'right'))
+
+    def latest(self, seconds):
+        """``(ts, price)`` of the newest quote at or before ``seconds``, or None"""
+        i = self.count_until(seconds) - 1
+        return (int(self.ts[i]), float(self.price[i])) if i >= 0 else None
+
+    def between(self, start, end):
+        """Timestamps and prices of the quotes in [start, end]"""
+        ts = self.ts[:self.size]
+        lo, hi = ts.searchsorted(int(start), 'left'), ts.searchsorted(int(end), 'right')
+        return ts[lo:hi], self.price[lo:hi]
+
+    def mean(self, start, end):
+        """Average of the quotes in (start, end], or None without quotes"""
+        ts = self.ts[:self.size]
+        lo, hi = ts.searchsorted(int(start), 'right'), ts.searchsorted(int(end), 'right')
+        return float((self.cumsum[hi] - self.cumsum[lo]) / (hi - lo)) if hi > lo else None
+
+    def means(self, edges):
+        """Average quote in each [edges[i], edges[i + 1]) interval (NaN if empty)"""
+        i = np.searchsorted(self.ts[:self.size], edges, 'left')
+        counts = np.diff(i)
+        sums = self.cumsum[i[1:]] - self.cumsum[i[:-1]]
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+    def at(self, seconds):
+        """Price in effect at each of ``seconds`` (NaN before the first quote)"""
+        i = np.searchsorted(self.ts[:self.size], seconds, 'right') - 1
+        return np.where(i >= 0, self.price[np.maximum(i, 0)], np.nan)
+
+
+class FuelPriceStore:
+    """``PriceSeries`` per ``(fuel_type, region)``; ``version`` changes on every write.
+
+    With a ``path``, quotes added through ``add_many`` are journaled next to
+    the ``.npz`` snapshot at that path.
+    """
+
+    def __init__(self, path=None):
+        self.series = {}
+        self.version = 0
+        self.path = path
+        self._lock = threading.Lock()
+        self._journal_lock = threading.Lock()
+        self._journaled = 0
+        self._compacting = False
+
+    def add(self, fuel_type, region, price, ts=None):
+        """Add one quote at ``ts`` (default now)"""
+        return self.add_many([{'fuel_type': fuel_type, 'region': region, 'price': price, 'ts': ts}])
+
+    def add_many(self, quotes):
+        """Add a batch of quote dicts (``fuel_type``, ``region``, ``price``, optional ``ts``).
+
+        Raises ValueError before anything is stored if any quote is invalid.
+        """
+        if len(quotes) > MAX_QUOTES_PER_BATCH:
+            raise ValueError(f'Máximo de {MAX_QUOTES_PER_BATCH} cotações por lote')
+        grouped = {}
+        for quote in quotes:
+            fuel_type, region = quote.get('fuel_type'), quote.get('region', DEFAULT_REGION)
+            if fuel_type not in FUEL_TYPES:
+                raise ValueError(f'Combustível desconhecido: {fuel_type}')
+            if not isinstance(region, str) or not region:
+                raise ValueError('Região inválida')
+            price = quote.get('price')
+            if isinstance(price, bool) or not isinstance(price, (int, float)) or not 0 < price <= MAX_PRICE:
+                raise ValueError(f'Preço inválido: {price}. Use um valor entre 0 e {MAX_PRICE:g}')
+            try:
+                if isinstance(quote.get('ts'), bool):
+                    raise TypeError
+                seconds = local_seconds(quote.get('ts'))
+            except (ValueError, TypeError, AttributeError, OverflowError, OSError):
+                raise ValueError(f"Data inválida: {quote.get('ts')}")
+            ts, prices = grouped.setdefault((fuel_type, region), ([], []))
+            ts.append(seconds)
+            prices.append(price)
+        self.extend(grouped)
+        if self.path:
+            self._journal(grouped, len(quotes))
+        return len(quotes)
+
+    def extend(self, grouped):
+        """Add ``(fuel_type, region) -> (timestamps, prices)`` arrays"""
+        with self._lock:
+            for key, (ts, prices) in grouped.items():
+                series = self.series.get(key)
+                if series is None:
+                    series = self.series[key] = PriceSeries(max(64, len(ts)))
+                series.extend(ts, prices)
+            self.version += 1
+
+    def _series(self, fuel_type, region):
+        series = self.series.get((fuel_type, region))
+        if series is None:
+            raise KeyError(f'Sem cotações de {fuel_type} em {region}')
+        return series
+
+    def latest(self, fuel_type, region=DEFAULT_REGION, at=None):
+        """``{'ts', 'price'}`` of the quote in effect at ``at`` (default now)"""
+        with self._lock:
+            found = self._series(fuel_type, region).latest(local_seconds(at))
+        return {'ts': found[0], 'price': found[1]} if found else None
+
+    def prices(self, region=DEFAULT_REGION, at=None):
+        """Fuel type -> price in effect in ``region`` at ``at``"""
+        seconds = local_seconds(at)
+        with self._lock:
+            found = {fuel: self.series[(fuel, region)].latest(seconds)
+                     for fuel in FUEL_TYPES if (fuel, region) in self.series}
+        return {fuel: round(quote[1], 3) for fuel, quote in found.items() if quote}
+
+    def regional(self, fuel_type, at=None):
+        """Region -> price of ``fuel_type`` in effect at ``at``"""
+        seconds = local_seconds(at)
+        with self._lock:
+            found = {region: series.latest(seconds) for (fuel, region), series in self.series.items()
+                     if fuel == fuel_type}
+        return {region: round(quote[1], 3) for region, quote in found.items() if quote}
+
+    def history(self, fuel_type, region=DEFAULT_REGION, start=None, end=None):
+        """Quotes between ``start`` and ``end`` (default: the last 30 days)"""
+        end_seconds = local_seconds(end)
+        start_seconds = local_seconds(start) if start is not None else end_seconds - 30 * DAY_SECONDS
+        with self._lock:
+            ts, prices = self._series(fuel_type, region).between(start_seconds, end_seconds)
+            ts, prices = ts.copy(), prices.copy()
+        return {
+            'ts': ts.astype('datetime64[s]').astype(str).tolist(),
+            'prices': np.round(prices, 3).tolist()
+        }
+
+    def daily(self, fuel_type, region=DEFAULT_REGION, days=7, now=None):
+        """Price in effect at the end of each of the last ``days`` days, oldest first"""
+        today = local_seconds(now) // DAY_SECONDS
+        day_ends = (np.arange(today - days + 1, today + 1) + 1) * DAY_SECONDS - 1
+        with self._lock:
+            prices = self._series(fuel_type, region).at(day_ends)
+        return [None if np.isnan(p) else round(float(p), 3) for p in prices.tolist()]
+
+    def moving_average(self, fuel_type, region=DEFAULT_REGION, days=7, at=None):
+        """Average quote over the ``days`` days up to ``at``"""
+        end = local_seconds(at)
+        with self._lock:
+            value = self._series(fuel_type, region).mean(end - days * DAY_SECONDS, end)
+        return round(value, 3) if value is not None else None
+
+    def monthly_average(self, fuel_type, region, start, end):
+        """'YYYY-MM' -> average quote of each month from ``start`` to ``end`` (ISO dates)"""
+        months = np.arange(np.datetime64(start, 'M'), np.datetime64(end, 'M') + 2)
+        edges = months.astype('datetime64[s]').astype(np.int64)
+        with self._lock:
+            averages = self._series(fuel_type, region).means(edges)
+        return {str(month): round(float(avg), 3) for month, avg in zip(months[:-1], averages.tolist())
+                if not np.isnan(avg)}
+
+    def change(self, fuel_type, region=DEFAULT_REGION, days=7, at=None):
+        """Absolute and percent change of the price over the ``days`` days up to ``at``"""
+        end = local_seconds(at)
+        with self._lock:
+            series = self._series(fuel_type, region)
+            current, previous = series.latest(end), series.latest(end - days * DAY_SECONDS)
+        if current is None or previous is None:
+            return {'absolute': None, 'percent': None}
+        return {'absolute': round(current[1] - previous[1], 3),
+                'percent': round((current[1] / previous[1] - 1) * 100, 2)}
+
+    def summary(self, fuel_type, region=DEFAULT_REGION, at=None):
+        """Latest price, moving averages and changes of one series"""
+        latest = self.latest(fuel_type, region, at)
+        return {
+            'fuel_type': fuel_type,
+            'region': region,
+            'price': round(latest['price'], 3) if latest else None,
+            'quoted_at': str(np.datetime64(latest['ts'], 's')) if latest else None,
+            'moving_average': {f'{d}d': self.moving_average(fuel_type, region, d, at) for d in (7, 30)},
+            'change': {f'{d}d': self.change(fuel_type, region, d, at) for d in (1, 7, 30)},
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'series': len(self.series),
+                'quotes': sum(len(s) for s in self.series.values()),
+                'regions': sorted({region for _, region in self.series}),
+                'version': self.version
+            }
+
+    def _snapshot(self):
+        with self._lock:
+            keys = list(self.series)
+            sizes = [len(self.series[key]) for key in keys]
+            return {
+                'keys': np.array([f'{fuel}|{region}' for fuel, region in keys]),
+                'sizes': np.array(sizes, np.int64),
+                'ts': np.concatenate([self.series[key].ts[:n] for key, n in zip(keys, sizes)] or [np.zeros(0, np.int64)]),
+                'price': np.concatenate([self.series[key].price[:n] for key, n in zip(keys, sizes)] or [np.zeros(0)]),
+            }
+
+    @staticmethod
+    def _write(arrays, path):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def save(self, path):
+        """Write every series to one ``.npz`` file, replacing it atomically"""
+        self._write(self._snapshot(), path)
+
+    def _journal(self, grouped, count):
+        """Append ``grouped`` quotes to the journal; compact it in the background when due"""
+        lines = ''.join(json.dumps([fuel, region, int(t), float(p)]) + '\n'
+                        for (fuel, region), (ts, prices) in grouped.items() for t, p in zip(ts, prices))
+        with self._journal_lock:
+            with open(self.path + JOURNAL_SUFFIX, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self._journaled += count
+            # The first write also snapshots a freshly seeded store, so restarts keep its history
+            due = self._journaled >= COMPACT_QUOTES or not os.path.exists(self.path)
+            if due and not self._compacting:
+                self._compacting = True
+                threading.Thread(target=self.compact, name='fuel-prices-compact', daemon=True).start()
+
+    def compact(self):
+        """Fold the journal into a new ``.npz`` snapshot at ``path``"""
+        journal = self.path + JOURNAL_SUFFIX
+        folding = journal + '.folding'
+        try:
+            with self._journal_lock:
+                # Quotes appended from here on go to a fresh journal; a
+                # leftover from a failed compaction is folded in again
+                if os.path.exists(journal) and not os.path.exists(folding):
+                    os.replace(journal, folding)
+                self._journaled = 0
+                arrays = self._snapshot()
+            self._write(arrays, self.path)
+            if os.path.exists(folding):
+                os.remove(folding)
+        except OSError:
+            logger.exception('Falha ao compactar o histórico de combustível')
+        finally:
+            with self._journal_lock:
+                self._compacting = False
+
+    def replay(self, journal):
+        """Re-add the quotes of a journal file; a line torn by a crash is cut off"""
+        grouped = {}
+        with open(journal, 'r+b') as f:
+            end = 0
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Later appends would otherwise be glued to the torn line
+                    f.truncate(end)
+                    break
+                end += len(line)
+                try:
+                    fuel, region, t, p = json.loads(line)
+                except ValueError:
+                    continue
+                ts, prices = grouped.setdefault((fuel, region), ([], []))
+                ts.append(t)
+                prices.append(p)
+        self.extend(grouped)
+        return sum(len(ts) for ts, _ in grouped.values())
+
+    @classmethod
+    def load(cls, path):
+        """Open the store at ``path``: the ``.npz`` snapshot (seeded if missing) plus its journal"""
+        store = cls(path)
+        if os.path.exists(path):
+            with np.load(path) as data:
+                offsets = np.concatenate([[0], np.cumsum(data['sizes'])])
+                ts, prices = data['ts'], data['price']
+                store.extend({
+                    tuple(str(key).split('|', 1)): (ts[offsets[i]:offsets[i + 1]], prices[offsets[i]:offsets[i + 1]])
+                    for i, key in enumerate(data['keys'])
+                })
+        else:
+            synthetic_history(store)
+        # Older quotes first, so a later quote at the same timestamp still wins
+        for journal in (path + JOURNAL_SUFFIX + '.folding', path + JOURNAL_SUFFIX):
+            if os.path.exists(journal):
+                store._journaled += store.replay(journal)
+        return store
+
+
+def synthetic_history(store, days=SEED_DAYS, today=None):
+    """Seed ``store`` with daily random-walk quotes ending at SEED_PRICES"""
+    today = today or date.today()
+    first = local_seconds(today - timedelta(days=days - 1))
+    ts = first + np.arange(days, dtype=np.int64) * DAY_SECONDS
+    grouped = {}
+    for fuel_type, anchor in SEED_PRICES.items():
+        for region, offset in REGION_OFFSETS.items():
+            rng = np.random.default_rng(zlib.crc32(f'{fuel_type}|{region}'.encode()))
+            walk = np.cumsum(rng.normal(0, 0.012, days))
+            grouped[(fuel_type, region)] = (ts, np.round(walk - walk[-1] + anchor + offset, 2))
+    store.extend(grouped)
+
+
+def store_path():
+    return instance_path(STORE_FILE)
+
+
+def get_fuel_prices():
+    """Return the shared price store, loaded from disk or seeded on first use"""
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                _store = FuelPriceStore.load(store_path())
+    return _store
+
+
+def overlay_fuel_prices(metrics, store, region=DEFAULT_REGION):
+    """Fill the dashboard's fuel prices, changes and 7-day history from ``store``"""
+    metrics['fuel_prices'] = store.prices(region)
+    metrics['fuel_price_region'] = region
+    metrics['fuel_price_changes'] = {fuel: store.change(fuel, region, 7) for fuel in metrics['fuel_prices']}
+    metrics['performance_trends']['fuel_price_history'] = {
+        fuel: store.daily(fuel, region, 7) for fuel in metrics['fuel_prices']
+    }
+    return metrics
@@ -0,0 +1,362 @@
+"""Streaming CSV/XLSX import of drivers, vehicles and routes.
+
+Files are read ``chunk_size`` rows at a time (pandas for CSV, openpyxl in
+read-only mode for XLSX), so memory depends on the chunk size and not on the
+file size. Each chunk is validated, turned into ``Driver``, ``Vehicle`` or
+``Route`` records (``data/records.py``) and upserted in one transaction.
+Columns are named as in ``data/storage.py`` (routes use flat
+``origin_name``, ``origin_lat``, ...; nested driver fields are JSON text).
+Dates may be ISO or dd/mm/yyyy.
+
+Invalid rows are skipped and written, with the reason, to
+``instance/imports/<key>.rejected.csv``. After every chunk a checkpoint
+records how many rows are done; importing the same file again resumes from
+there (``restart=True`` starts over). Upserts make a re-imported chunk
+harmless if the process died between writing it and the checkpoint.
+
+Uploads through ``POST /api/import/<kind>`` run in a background thread;
+poll ``GET /api/import/<key>`` for progress. Command line::
+
+    python -m data.importer drivers motoristas.csv --chunk-size 10000
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from data.fleet_store import COUNT_FIELDS, PERCENT_FIELDS
+from data.paths import instance_path
+from data.records import Driver, Route, Vehicle, place
+from data.storage import DRIVER_COLUMNS, ROUTE_COLUMNS, VEHICLE_COLUMNS, get_storage
+
+DEFAULT_CHUNK_SIZE = 5000
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+INT_COLUMNS = {
+    'drivers': ('id', 'km_driven', 'efficiency_score', 'penalties', 'bonuses', 'experience_years',
+                'safety_score', 'punctuality_score', 'training_completed'),
+    'vehicles': ('id', 'cargo_capacity', 'maintenance_cost'),
+    'routes': ('id', 'distance', 'cargo_weight'),
+}
+FLOAT_COLUMNS = {
+    'drivers': ('avg_consumption',),
+    'vehicles': ('avg_consumption',),
+    'routes': ('origin_lat', 'origin_lng', 'destination_lat', 'destination_lng', 'fuel_cost'),
+}
+# Numeric columns that must be above zero (consumption divides distances)
+POSITIVE_COLUMNS = {'drivers': ('avg_consumption',), 'vehicles': ('avg_consumption',), 'routes': ()}
+DATE_COLUMNS = {'drivers': ('hire_date',), 'vehicles': (), 'routes': ('date',)}
+JSON_COLUMNS = {
+    'drivers': ('monthly_performance', 'performance_history', 'certifications', 'contact', 'emergency_contact'),
+    'vehicles': (),
+    'routes': (),
+}
+REQUIRED_COLUMNS = {
+    'drivers': ('id', 'name', 'avg_consumption', 'efficiency_score', 'safety_score', 'punctuality_score'),
+    'vehicles': ('id', 'plate'),
+    'routes': ('id', 'origin_name', 'origin_lat', 'origin_lng', 'destination_name', 'destination_lat',
+               'destination_lng', 'distance'),
+}
+# Accepted (min, max) of numeric columns; routes are drawn, indexed and costed from these,
+# drivers bounded as PATCH /api/driver/<id> bounds them
+RANGES = {
+    'drivers': {**{c: (0, 100) for c in PERCENT_FIELDS}, **{c: (0, None) for c in COUNT_FIELDS}},
+    'vehicles': {},
+    'routes': {'origin_lat': (-90, 90), 'origin_lng': (-180, 180), 'destination_lat': (-90, 90),
+               'destination_lng': (-180, 180), 'distance': (1, None)},
+}
+# Values for optional columns left empty
+DEFAULTS = {
+    'drivers': {'km_driven': 0, 'penalties': 0, 'bonuses': 0, 'experience_years': 0, 'training_completed': 0,
+                'status': 'Ativo'},
+    'vehicles': {'status': 'Disponível'},
+    'routes': {'status': 'Planejada'},
+}
+COLUMNS = {'drivers': DRIVER_COLUMNS, 'vehicles': VEHICLE_COLUMNS, 'routes': ROUTE_COLUMNS}
+KINDS = tuple(COLUMNS)
+
+# Nested driver fields analytics relies on, when the file leaves them empty
+JSON_DEFAULTS = {
+    'monthly_performance': '{"routes_completed": 0, "fuel_savings": 0.0, "customer_rating": 0.0, '
+                           '"incidents": 0, "overtime_hours": 0}',
+    'performance_history': '[]',
+    'certifications': '[]',
+    'contact': '{}',
+    'emergency_contact': '{}',
+}
+
+
+def import_key(path, kind):
+    """Checkpoint key of a file: path, size, mtime and kind"""
+    stat = os.stat(path)
+    identity = f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}:{kind}'
+    return hashlib.sha1(identity.encode()).hexdigest()
+
+
+def load_checkpoint(key):
+    try:
+        with open(instance_path('imports', f'{key}.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_checkpoint(key, progress):
+    path = instance_path('imports', f'{key}.json')
+    tmp_path = f'{path}.{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        json.dump(progress, f)
+    os.replace(tmp_path, path)
+
+
+def _new_state(key, path, kind, status='running'):
+    return {'key': key, 'file': os.path.basename(path), 'kind': kind, 'status': status,
+            'rows_done': 0, 'rows_imported': 0, 'rows_rejected': 0, 'error': None}
+
+
+def iter_chunks(path, chunk_size, skip_rows=0):
+    """DataFrames of ``chunk_size`` rows (all values as str), after ``skip_rows``"""
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        yield from _iter_xlsx_chunks(path, chunk_size, skip_rows)
+        return
+    reader = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_size,
+                         skiprows=lambda i: 0 < i <= skip_rows, skipinitialspace=True)
+    yield from reader
+
+
+def _iter_xlsx_chunks(path, chunk_size, skip_rows):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError('Instale o pacote openpyxl para importar arquivos .xlsx')
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else '' for h in next(rows, ())]
+        for _ in range(skip_rows):
+            next(rows, None)
+        chunk = []
+        for row in rows:
+            chunk.append(['' if v is None else str(v) for v in row])
+            if len(chunk) == chunk_size:
+                yield pd.DataFrame(chunk, columns=header)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        workbook.close()
+
+
+def coerce_chunk(df, kind):
+    """Validate and convert a chunk; returns (records, rejected)
+
+    ``rejected`` is a list of (row position in the chunk, reason).
+    """
+    df = df.rename(columns=lambda c: c.strip().lower())
+    missing = [c for c in REQUIRED_COLUMNS[kind] if c not in df.columns]
+    if missing:
+        raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(missing)}")
+
+    columns = {}
+    errors = pd.Series('', index=df.index)
+    for column in COLUMNS[kind]:
+        raw = df[column].str.strip() if column in df.columns else pd.Series('', index=df.index)
+        present = raw != ''
+        if column in REQUIRED_COLUMNS[kind]:
+            errors = errors.mask(~present & (errors == ''), f'{column} vazio')
+        if column in INT_COLUMNS[kind] or column in FLOAT_COLUMNS[kind]:
+            if column in FLOAT_COLUMNS[kind]:
+                # Decimal comma, as in Brazilian spreadsheets
+                raw = raw.str.replace(',', '.', regex=False)
+            values = pd.to_numeric(raw, errors='coerce')
+            invalid = present & (values.isna() | values.isin([np.inf, -np.inf]))
+            if column in INT_COLUMNS[kind]:
+                invalid |= values.notna() & (values % 1 != 0)
+            low, high = RANGES[kind].get(column, (None, None))
+            if low is not None:
+                invalid |= values < low
+            if high is not None:
+                invalid |= values > high
+            if column in POSITIVE_COLUMNS[kind]:
+                invalid |= values <= 0
+            if column in INT_COLUMNS[kind]:
+                values = values.round().astype('Int64')
+            errors = errors.mask(invalid & (errors == ''), f'{column} inválido')
+            default = DEFAULTS[kind].get(column)
+            values = values.astype(object).where(values.notna(), default)
+        elif column in DATE_COLUMNS[kind]:
+            parsed = pd.to_datetime(raw, errors='coerce', format='mixed', dayfirst=True)
+            errors = errors.mask(present & parsed.isna() & (errors == ''), f'{column} inválido')
+            if column == 'date':
+                values = parsed.dt.strftime('%Y-%m-%d')
+            else:
+                values = parsed.astype(object)
+            values = values.where(parsed.notna(), None)
+        elif column in JSON_COLUMNS[kind]:
+            values = raw.where(present, JSON_DEFAULTS[column])
+        else:
+            values = raw.where(present, DEFAULTS[kind].get(column))
+        columns[column] = values.tolist()
+
+    valid = (errors == '').to_numpy()
+    rejected = [(i, reason) for i, reason in enumerate(errors) if reason]
+    records = []
+    for position, row in zip(np.flatnonzero(valid), zip(*(np.asarray(v, dtype=object)[valid] for v in columns.values()))):
+        record = _record(dict(zip(columns, row)), kind)
+        if record is None:
+            rejected.append((int(position), 'JSON inválido'))
+        else:
+            records.append(record)
+    rejected.sort()
+    return records, rejected
+
+
+def _record(record, kind):
+    """Driver, Vehicle or Route record, or None if a JSON column is invalid"""
+    if kind == 'drivers':
+        try:
+            for column in JSON_COLUMNS[kind]:
+                record[column] = json.loads(record[column])
+            return Driver(**record)
+        except (KeyError, TypeError, ValueError):
+            return None
+    if kind == 'vehicles':
+        return Vehicle(**record)
+    return Route(
+        id=record['id'],
+        origin=place(record['origin_name'], record['origin_lat'], record['origin_lng']),
+        destination=place(record['destination_name'], record['destination_lat'], record['destination_lng']),
+        distance=record['distance'],
+        estimated_time=record['estimated_time'],
+        fuel_cost=record['fuel_cost'],
+        cargo_weight=record['cargo_weight'],
+        status=record['status'],
+        date=record['date']
+    )
+
+
+def import_file(path, kind, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, restart=False):
+    """Import a CSV/XLSX file of ``kind`` records; returns the final progress
+
+    ``progress(state)`` is called after every chunk with rows done,
+    imported and rejected.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Tipo de importação inválido: {kind}. Use {', '.join(KINDS)}")
+    storage = get_storage()
+    storage.init_schema()
+    save = {'drivers': storage.save_drivers, 'vehicles': storage.save_vehicles, 'routes': storage.save_routes}[kind]
+
+    key = import_key(path, kind)
+    state = None if restart else load_checkpoint(key)
+    if state is None:
+        state = _new_state(key, path, kind)
+    if state['status'] == 'completed':
+        return state
+    state['status'] = 'running'
+    state['error'] = None
+    _save_checkpoint(key, state)
+    rejected_path = instance_path('imports', f'{key}.rejected.csv')
+    if state['rows_done'] == 0 and os.path.exists(rejected_path):
+        os.remove(rejected_path)
+
+    try:
+        for chunk in iter_chunks(path, chunk_size, state['rows_done']):
+            records, rejected = coerce_chunk(chunk, kind)
+            save(records)
+            if rejected:
+                with open(rejected_path, 'a', newline='') as f:
+                    writer = csv.writer(f)
+                    for position, reason in rejected:
+                        # Line number in the file, counting the header
+                        writer.writerow([state['rows_done'] + position + 2, reason])
+            state['rows_done'] += len(chunk)
+            state['rows_imported'] += len(records)
+            state['rows_rejected'] += len(rejected)
+            _save_checkpoint(key, state)
+            if progress is not None:
+                progress(dict(state))
+    except Exception as e:
+        state['status'] = 'failed'
+        state['error'] = str(e)
+        _save_checkpoint(key, state)
+        raise
+    state['status'] = 'completed'
+    _save_checkpoint(key, state)
+    if progress is not None:
+        progress(dict(state))
+    return state
+
+
+def save_upload(stream, filename):
+    """Store an uploaded file under instance/uploads, named by content hash.
+
+    Uploading the same file again reuses the stored copy, so its import
+    resumes from the checkpoint.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in ('.csv', '.xlsx', '.xlsm'):
+        raise ValueError('Envie um arquivo .csv ou .xlsx')
+    tmp_path = instance_path('uploads', f'upload.{os.getpid()}.{threading.get_ident()}')
+    digest = hashlib.sha1()
+    with open(tmp_path, 'wb') as f:
+        for block in iter(lambda: stream.read(UPLOAD_BLOCK_SIZE), b''):
+            digest.update(block)
+            f.write(block)
+    path = instance_path('uploads', digest.hexdigest() + extension)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    return path
+
+
+def start_import(path, kind, on_complete=None):
+    """Import in a background thread; returns the key for ``load_checkpoint``"""
+    if kind not in KINDS:
+        raise ValueError(f"Tipo de importação inválido: {kind}. Use {', '.join(KINDS)}")
+    key = import_key(path, kind)
+    if load_checkpoint(key) is None:
+        _save_checkpoint(key, _new_state(key, path, kind, 'queued'))
+
+    def run():
+        try:
+            state = import_file(path, kind)
+        except Exception:
+            # The failure is recorded in the checkpoint
+            return
+        if on_complete is not None:
+            on_complete(state)
+
+    threading.Thread(target=run, name=f'import-{key[:8]}', daemon=True).start()
+    return key
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import drivers, vehicles or routes from CSV/XLSX')
+    parser.add_argument('kind', choices=KINDS)
+    parser.add_argument('path')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and start over')
+    args = parser.parse_args(argv)
+
+    def report(state):
+        label = 'Importação concluída' if state['status'] == 'completed' else 'Em andamento'
+        print(f"{label}: {state['rows_done']} linhas processadas, {state['rows_imported']} importadas, "
+              f"{state['rows_rejected']} rejeitadas", flush=True)
+
+    try:
+        state = import_file(args.path, args.kind, args.chunk_size, report, args.restart)
+    except (RuntimeError, ValueError) as e:
+        parser.exit(1, f'Erro: {e} (execute novamente para continuar de onde parou)\n')
+    if state['rows_rejected']:
+        print(f"Linhas rejeitadas em {instance_path('imports', state['key'] + '.rejected.csv')}")
+
+
+if __name__ == '__main__':
+    main()
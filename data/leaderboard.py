@@ -0,0 +1,85 @@
+"""Incrementally maintained driver leaderboards.
+
+Each ranking category keeps a sorted list of ``(-score, driver_id)`` keys for
+the whole fleet and one per depot. Pages are list slices, and a metric change
+moves a single key found by binary search, so neither depends on re-sorting
+the fleet per request. The index subscribes to fleet store updates and is
+rebuilt when the store is reloaded.
+"""
+import threading
+from bisect import bisect_left, insort
+
+from data.fleet_store import get_fleet_store
+
+# Higher is better in every category (avg_consumption is km/L)
+CATEGORIES = ('efficiency_score', 'avg_consumption', 'safety_score', 'punctuality_score')
+
+_lock = threading.Lock()
+_index = None
+
+
+class LeaderboardIndex:
+    """Sorted ranking keys per category, overall and per depot"""
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._overall = {}
+        self._by_depot = {}
+        for category in CATEGORIES:
+            keys = {d.id: (-getattr(d, category), d.id) for d in store.drivers}
+            self._keys[category] = keys
+            self._overall[category] = sorted(keys.values())
+            by_depot = {}
+            for d in store.drivers:
+                by_depot.setdefault(d.depot, []).append(keys[d.id])
+            self._by_depot[category] = {depot: sorted(k) for depot, k in by_depot.items()}
+        self._depot_of = {d.id: d.depot for d in store.drivers}
+        store.subscribe(self.on_driver_update)
+
+    def on_driver_update(self, driver, changed):
+        driver_id = driver.id
+        with self._lock:
+            old_depot = self._depot_of[driver_id]
+            new_depot = driver.depot
+            for category in CATEGORIES:
+                if category not in changed and old_depot == new_depot:
+                    continue
+                old_key = self._keys[category][driver_id]
+                new_key = (-getattr(driver, category), driver_id)
+                _remove(self._overall[category], old_key)
+                _remove(self._by_depot[category][old_depot], old_key)
+                insort(self._overall[category], new_key)
+                insort(self._by_depot[category].setdefault(new_depot, []), new_key)
+                self._keys[category][driver_id] = new_key
+            self._depot_of[driver_id] = new_depot
+
+    def page(self, category, k=10, offset=0, depot=None):
+        """Return ``(driver ids, total)`` for one page of a ranking"""
+        if category not in CATEGORIES:
+            raise ValueError(f'Categoria inválida: {category}')
+        with self._lock:
+            keys = self._overall[category] if depot is None else self._by_depot[category].get(depot, [])
+            return [driver_id for _, driver_id in keys[offset:offset + k]], len(keys)
+
+    def depots(self):
+        with self._lock:
+            return sorted(d for d, keys in self._by_depot[CATEGORIES[0]].items() if d and keys)
+
+
+def _remove(keys, key):
+    i = bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        del keys[i]
+
+
+def get_leaderboard_index():
+    """Return the index for the current fleet store, rebuilding after reloads"""
+    global _index
+    store = get_fleet_store()
+    if _index is None or _index.store is not store:
+        with _lock:
+            if _index is None or _index.store is not store:
+                _index = LeaderboardIndex(store)
+    return _index
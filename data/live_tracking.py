@@ -0,0 +1,188 @@
+"""In-process live position store and a local route simulator.
+
+``PositionStore`` keeps the latest position, speed, fuel and alerts of every
+active route. Writers (the simulator below or the telemetry ingester) call
+``update()``; every changed field is stamped with a global version, so a
+reader that remembers the last version it saw can ask for exactly the fields
+that changed since then. ``/api/live-tracking/stream`` uses this to push
+deltas for every route over one Server-Sent Events connection.
+"""
+import random
+import threading
+from datetime import datetime, timedelta
+
+from data.records import RouteStatus
+
+_store = None
+_simulator = None
+_lock = threading.Lock()
+
+
+class PositionStore:
+    """Latest tracking state per route with per-field change versions"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._state = {}
+        self._field_versions = {}
+        self._route_versions = {}
+        self._listeners = []
+        self.version = 0
+
+    def subscribe(self, listener):
+        """Call ``listener(route_id, changed_fields)`` after each change (None on removal)"""
+        self._listeners.append(listener)
+
+    def update(self, route_id, **fields):
+        """Merge fields into a route's state; returns the changed fields"""
+        route_id = str(route_id)
+        with self._cond:
+            state = self._state.setdefault(route_id, {'route_id': route_id})
+            delta = {k: v for k, v in fields.items() if state.get(k) != v}
+            if not delta:
+                return delta
+            self.version += 1
+            state.update(delta)
+            versions = self._field_versions.setdefault(route_id, {})
+            for key in delta:
+                versions[key] = self.version
+            self._route_versions[route_id] = self.version
+            self._cond.notify_all()
+        for listener in self._listeners:
+            listener(route_id, delta)
+        return delta
+
+    def remove(self, route_id):
+        route_id = str(route_id)
+        with self._cond:
+            if self._state.pop(route_id, None) is None:
+                return
+            self._field_versions.pop(route_id, None)
+            self.version += 1
+            # A None state tells readers the route is no longer tracked
+            self._route_versions[route_id] = self.version
+            self._cond.notify_all()
+        for listener in self._listeners:
+            listener(route_id, None)
+
+    def get(self, route_id):
+        with self._cond:
+            state = self._state.get(str(route_id))
+            return dict(state) if state is not None else None
+
+    def snapshot(self, route_ids=None):
+        """Return ``(version, {route_id: state})`` for every tracked route"""
+        with self._cond:
+            return self.version, {
+                route_id: dict(state) for route_id, state in self._state.items()
+                if route_ids is None or route_id in route_ids
+            }
+
+    def changes_since(self, since, route_ids=None):
+        """Return ``(version, {route_id: changed fields or None})``"""
+        with self._cond:
+            deltas = {}
+            for route_id, version in self._route_versions.items():
+                if version <= since or (route_ids is not None and route_id not in route_ids):
+                    continue
+                state = self._state.get(route_id)
+                if state is None:
+                    deltas[route_id] = None
+                    continue
+                versions = self._field_versions[route_id]
+                deltas[route_id] = {k: state[k] for k, v in versions.items() if v > since}
+            return self.version, deltas
+
+    def wait_for_changes(self, since, timeout=None, route_ids=None):
+        """Block until something changed after ``since`` (or timeout)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version > since, timeout)
+        return self.changes_since(since, route_ids)
+
+
+class RouteSimulator(threading.Thread):
+    """Moves in-progress routes from origin to destination on a timer"""
+
+    def __init__(self, store, routes, interval=1.0, on_complete=None):
+        super().__init__(name='route-simulator', daemon=True)
+        self.store = store
+        self.interval = interval
+        self.on_complete = on_complete
+        self._stop_event = threading.Event()
+        self._routes = {}
+        for route in routes:
+            if route.status == RouteStatus.IN_PROGRESS:
+                self._routes[str(route.id)] = {
+                    'route': route,
+                    'progress': random.uniform(15, 85),
+                    'speed': random.randint(60, 90),
+                    'fuel': random.uniform(40, 80)
+                }
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.tick()
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def tick(self):
+        for route_id, sim in self._routes.items():
+            route = sim['route']
+            if sim['progress'] >= 100:
+                continue
+            # Real telemetry takes over from the simulation
+            if (self.store.get(route_id) or {}).get('source') == 'telemetry':
+                continue
+            sim['speed'] = min(max(sim['speed'] + random.randint(-5, 5), 40), 100)
+            hours = self.interval / 3600
+            sim['progress'] = min(sim['progress'] + sim['speed'] * hours / route.distance * 100, 100)
+            sim['fuel'] = max(sim['fuel'] - sim['speed'] * hours * 0.05, 5)
+            if sim['progress'] >= 100 and self.on_complete is not None:
+                self.on_complete(route)
+
+            fraction = sim['progress'] / 100
+            origin, destination = route.origin, route.destination
+            remaining_hours = (100 - sim['progress']) / 100 * route.distance / sim['speed']
+            alerts = []
+            if sim['fuel'] < 20:
+                alerts.append({'type': 'fuel', 'message': 'Combustível abaixo de 20%', 'severity': 'high'})
+            self.store.update(
+                route_id,
+                current_position={
+                    'lat': round(origin.lat + (destination.lat - origin.lat) * fraction, 5),
+                    'lng': round(origin.lng + (destination.lng - origin.lng) * fraction, 5)
+                },
+                progress_percentage=int(sim['progress']),
+                estimated_arrival=(datetime.now() + timedelta(hours=remaining_hours)).strftime('%H:%M'),
+                current_speed=sim['speed'],
+                fuel_remaining=int(sim['fuel']),
+                driver_status='driving' if sim['progress'] < 100 else 'unloading',
+                alerts=alerts
+            )
+
+
+def get_position_store():
+    """Return the shared position store"""
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                _store = PositionStore()
+    return _store
+
+
+def start_simulator(routes, interval=1.0, on_complete=None):
+    """Start the background simulator once per process.
+
+    ``on_complete(route)`` is called when a simulated route arrives.
+    """
+    global _simulator
+    store = get_position_store()
+    with _lock:
+        if _simulator is None:
+            _simulator = RouteSimulator(store, routes, interval, on_complete)
+            _simulator.tick()
+            _simulator.start()
+    return _simulator
@@ -0,0 +1,16 @@
+"""Locations for files the app writes at runtime (caches, exports, databases).
+
+Everything lives under the instance folder, ``instance/`` in the project root
+by default, or the directory named by ``WISE_ROUTES_INSTANCE_DIR``.
+"""
+import os
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INSTANCE_DIR = os.environ.get('WISE_ROUTES_INSTANCE_DIR', os.path.join(PROJECT_DIR, 'instance'))
+
+
+def instance_path(*parts):
+    """Path inside the instance folder; the parent directory is created"""
+    path = os.path.join(INSTANCE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
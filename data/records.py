@@ -0,0 +1,238 @@
+"""Compact typed records for drivers, vehicles and routes.
+
+Records are slotted dataclasses: an instance holds its field values and
+nothing else, instead of a dict repeating every key in every record.
+Repeated values are shared. Status and fuel type are ``StrEnum`` members,
+which compare equal to and serialize as their Portuguese labels. Depots,
+models, certifications, dates and places are interned. A driver's
+performance history is two typed arrays plus one month tuple shared by
+every driver with the same months.
+
+Code works with attributes (``driver.monthly_performance.fuel_savings``),
+and records become plain dicts only at the API edge. ``to_dict()`` gives
+the shape the dict records had, and json_provider calls it when encoding.
+``from_dict()`` builds a record from that shape (synthetic data, imports).
+"""
+import sys
+from array import array
+from dataclasses import dataclass
+from datetime import datetime
+from enum import StrEnum
+
+
+class Label(StrEnum):
+    """Enum of display labels"""
+
+    @classmethod
+    def of(cls, value):
+        """The member labelled ``value``, or ``value`` itself (interned) if none is"""
+        try:
+            return cls(value)
+        except ValueError:
+            return sys.intern(value) if isinstance(value, str) else value
+
+
+class DriverStatus(Label):
+    ACTIVE = 'Ativo'
+    ON_ROUTE = 'Em Rota'
+    RESTING = 'Descanso'
+
+
+class VehicleStatus(Label):
+    AVAILABLE = 'Disponível'
+    IN_USE = 'Em Uso'
+    MAINTENANCE = 'Manutenção'
+
+
+class RouteStatus(Label):
+    PLANNED = 'Planejada'
+    IN_PROGRESS = 'Em Andamento'
+    COMPLETED = 'Concluída'
+
+
+class FuelType(Label):
+    DIESEL_S10 = 'Diesel S10'
+    GASOLINE = 'Gasolina'
+
+
+def intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Record:
+    """Base of the record dataclasses"""
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+    def to_dict(self, fields=None):
+        """Plain dict of every field, or of ``fields`` (unknown names are skipped)"""
+        names = self.__slots__ if fields is None else [f for f in fields if f in self.__slots__]
+        return {name: plain(getattr(self, name)) for name in names}
+
+
+def plain(value):
+    """JSON-ready form of a field value"""
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, PerformanceHistory):
+        return value.to_list()
+    if isinstance(value, tuple):
+        return list(value)
+    return value
+
+
+@dataclass(slots=True)
+class Place(Record):
+    name: str
+    lat: float
+    lng: float
+
+    @classmethod
+    def from_dict(cls, data):
+        return place(data['name'], data['lat'], data['lng'])
+
+
+_places = {}
+
+
+def place(name, lat, lng):
+    """Shared Place for a name and coordinates"""
+    key = (name, lat, lng)
+    found = _places.get(key)
+    if found is None:
+        found = _places[key] = Place(intern(name), lat, lng)
+    return found
+
+
+@dataclass(slots=True)
+class MonthlyPerformance(Record):
+    routes_completed: int = 0
+    fuel_savings: float = 0.0
+    customer_rating: float = 0.0
+    incidents: int = 0
+    overtime_hours: int = 0
+
+
+@dataclass(slots=True)
+class Contact(Record):
+    phone: str = None
+    email: str = None
+
+
+@dataclass(slots=True)
+class EmergencyContact(Record):
+    name: str = None
+    phone: str = None
+
+
+_months = {}
+
+
+class PerformanceHistory:
+    """Monthly consumption (km/L) and efficiency score, oldest month first"""
+    __slots__ = ('months', 'consumption', 'efficiency')
+
+    def __init__(self, months=(), consumption=(), efficiency=()):
+        months = tuple(intern(m) for m in months)
+        self.months = _months.setdefault(months, months)
+        self.consumption = array('d', consumption)
+        self.efficiency = array('d', efficiency)
+
+    @classmethod
+    def from_list(cls, entries):
+        entries = entries or []
+        return cls([e['month'] for e in entries], [e['consumption'] for e in entries],
+                   [e['efficiency'] for e in entries])
+
+    def __len__(self):
+        return len(self.months)
+
+    def __eq__(self, other):
+        return (isinstance(other, PerformanceHistory) and self.months == other.months
+                and self.consumption == other.consumption and self.efficiency == other.efficiency)
+
+    def to_list(self):
+        return [{'month': m, 'consumption': c, 'efficiency': int(e) if e.is_integer() else e}
+                for m, c, e in zip(self.months, self.consumption, self.efficiency)]
+
+
+@dataclass(slots=True)
+class Driver(Record):
+    id: int
+    name: str
+    avg_consumption: float
+    km_driven: int
+    efficiency_score: int
+    penalties: int = 0
+    bonuses: int = 0
+    status: DriverStatus = DriverStatus.ACTIVE
+    license_number: str = None
+    hire_date: datetime = None
+    experience_years: int = 0
+    safety_score: int = 0
+    punctuality_score: int = 0
+    training_completed: int = 0
+    monthly_performance: MonthlyPerformance = None
+    performance_history: PerformanceHistory = None
+    certifications: tuple = ()
+    vehicle_assigned: str = None
+    depot: str = None
+    contact: Contact = None
+    emergency_contact: EmergencyContact = None
+
+    def __post_init__(self):
+        self.status = DriverStatus.of(self.status)
+        self.depot = intern(self.depot)
+        self.certifications = tuple(intern(c) for c in self.certifications or ())
+        if isinstance(self.monthly_performance, dict):
+            self.monthly_performance = MonthlyPerformance.from_dict(self.monthly_performance)
+        elif self.monthly_performance is None:
+            self.monthly_performance = MonthlyPerformance()
+        if not isinstance(self.performance_history, PerformanceHistory):
+            self.performance_history = PerformanceHistory.from_list(self.performance_history)
+        if isinstance(self.contact, dict):
+            self.contact = Contact.from_dict(self.contact)
+        if isinstance(self.emergency_contact, dict):
+            self.emergency_contact = EmergencyContact.from_dict(self.emergency_contact)
+
+
+@dataclass(slots=True)
+class Vehicle(Record):
+    id: int
+    model: str
+    plate: str
+    fuel_type: FuelType = FuelType.DIESEL_S10
+    avg_consumption: float = 0.0
+    cargo_capacity: int = 0
+    maintenance_cost: int = 0
+    status: VehicleStatus = VehicleStatus.AVAILABLE
+
+    def __post_init__(self):
+        self.model = intern(self.model)
+        self.fuel_type = FuelType.of(self.fuel_type)
+        self.status = VehicleStatus.of(self.status)
+
+
+@dataclass(slots=True)
+class Route(Record):
+    id: int
+    origin: Place
+    destination: Place
+    distance: int
+    estimated_time: str = None
+    fuel_cost: float = 0.0
+    cargo_weight: int = 0
+    status: RouteStatus = RouteStatus.PLANNED
+    date: str = None
+
+    def __post_init__(self):
+        if isinstance(self.origin, dict):
+            self.origin = Place.from_dict(self.origin)
+        if isinstance(self.destination, dict):
+            self.destination = Place.from_dict(self.destination)
+        self.estimated_time = intern(self.estimated_time)
+        self.status = RouteStatus.of(self.status)
+        self.date = intern(self.date)
@@ -0,0 +1,431 @@
+"""Report engine for /reports.
+
+``submit_report(params)`` queues a report on a process pool, so month-end
+reports over every route never run in a web worker. The worker streams the
+rows straight into a CSV, XLSX (openpyxl) or PDF file under
+``instance/reports``; routes are read from the database in batches, so
+memory does not grow with the period.
+
+Each report is identified by a hash of its parameters (type, resolved
+period, format) and the fleet and fuel price versions. Submitting the same parameters
+again returns the running job, or the finished file while it is younger
+than ``REPORT_CACHE_SECONDS``. Job status is a JSON file next to the
+output, so any worker process can answer a poll or a download.
+
+Until the database is seeded there is no route history, only the few
+active synthetic routes: route reports then add synthetic history for the
+period (generated in the worker, ``SYNTHETIC_ROUTES_PER_DAY`` a day) and
+say so in the job's ``notice`` and the report title.
+"""
+import atexit
+import csv
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+from data.cost_model import get_cost_analysis
+from data.driver_analytics import EFFICIENCY_TARGET
+from data.fleet_store import get_fleet_store
+from data.fuel_prices import DEFAULT_REGION, get_fuel_prices
+from data.paths import instance_path
+from data.records import Route, RouteStatus
+from data.road_graph import DIESEL_PRICE, FUEL_EFFICIENCY_KM_L
+from data.storage import get_storage
+from data.synthetic_data import get_route_history
+
+REPORT_WORKERS = int(os.environ.get('WISE_ROUTES_REPORT_WORKERS', 0)) or 2
+REPORT_CACHE_SECONDS = 3600
+# A job still queued or running after this long is assumed lost and resubmitted
+REPORT_TIMEOUT_SECONDS = 1800
+CO2_KG_PER_LITER = 2.68
+SYNTHETIC_ROUTES_PER_DAY = 200
+SYNTHETIC_NOTICE = ('Banco de dados não populado: histórico de rotas sintético. '
+                    'Popule com python -m data.storage seed --history-days 365')
+
+REPORT_TYPES = {
+    'operational': 'Relatório Operacional',
+    'financial': 'Análise Financeira',
+    'efficiency': 'Eficiência de Motoristas',
+    'routes': 'Análise de Rotas',
+    'fuel': 'Consumo de Combustível',
+    'maintenance': 'Manutenção de Veículos',
+    'environmental': 'Impacto Ambiental',
+}
+PERIOD_DAYS = {'last-week': 7, 'last-month': 30, 'last-quarter': 90, 'last-year': 365}
+FORMATS = {'csv': 'csv', 'excel': 'xlsx', 'pdf': 'pdf'}
+
+_pool_lock = threading.Lock()
+_pool = None
+
+
+def resolve_period(period, start=None, end=None, today=None):
+    """(start, end) ISO dates for a period name or a custom range"""
+    today = today or date.today()
+    if period == 'custom':
+        try:
+            start_date, end_date = date.fromisoformat(start), date.fromisoformat(end)
+        except (TypeError, ValueError):
+            raise ValueError('Informe start e end no formato AAAA-MM-DD')
+        if start_date > end_date:
+            raise ValueError('A data inicial deve ser anterior à final')
+        return start_date.isoformat(), end_date.isoformat()
+    if period not in PERIOD_DAYS:
+        raise ValueError(f"Período inválido: {period}. Use {', '.join(list(PERIOD_DAYS) + ['custom'])}")
+    return (today - timedelta(days=PERIOD_DAYS[period] - 1)).isoformat(), today.isoformat()
+
+
+# Reports that read routes, and so need history for the period
+ROUTE_REPORTS = ('operational', 'financial', 'routes', 'fuel', 'environmental')
+
+
+def _iter_routes(context, start, end):
+    if context['routes'] is None:
+        yield from get_storage().iter_routes_between(start, end)
+        return
+    # History runs up to yesterday; the active routes cover today on
+    days = (date.today() - date.fromisoformat(start)).days
+    for record in get_route_history(days, SYNTHETIC_ROUTES_PER_DAY, context['history_first_id']):
+        if record['date'] > end:
+            break
+        yield Route.from_dict(record)
+    yield from (r for r in context['routes'] if start <= (r.date or '') <= end)
+
+
+def _route_liters(route):
+    return route.distance / FUEL_EFFICIENCY_KM_L
+
+
+def _monthly(routes):
+    """Per-month route count, km, liters and recorded fuel cost"""
+    months = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+    for route in routes:
+        month = months[route.date[:7]]
+        month[0] += 1
+        month[1] += route.distance
+        month[2] += _route_liters(route)
+        month[3] += route.fuel_cost or 0.0
+    return sorted(months.items())
+
+
+def build_operational(context, start, end):
+    columns = ['Data', 'Rotas', 'Concluídas', 'Km', 'Custo combustível (R$)', 'Carga (t)']
+    days = defaultdict(lambda: [0, 0, 0.0, 0.0, 0.0])
+    for route in _iter_routes(context, start, end):
+        day = days[route.date]
+        day[0] += 1
+        day[1] += route.status == RouteStatus.COMPLETED
+        day[2] += route.distance
+        day[3] += route.fuel_cost or 0.0
+        day[4] += (route.cargo_weight or 0) / 1000
+    rows = ([d, n, done, round(km), round(cost, 2), round(cargo, 1)]
+            for d, (n, done, km, cost, cargo) in sorted(days.items()))
+    return columns, rows
+
+
+def build_financial(context, start, end):
+    columns = ['Categoria', 'Valor (R$)', 'Participação (%)']
+    costs = dict(context['costs']['operational_costs'])
+    costs['fuel_routes'] = sum(r.fuel_cost or 0.0 for r in _iter_routes(context, start, end))
+    labels = {'fuel': 'Combustível', 'maintenance': 'Manutenção', 'tolls': 'Pedágios', 'insurance': 'Seguro',
+              'driver_salaries': 'Salários', 'fuel_routes': 'Combustível (rotas do período)'}
+    total = sum(v for k, v in costs.items() if k != 'fuel_routes') or 1.0
+    rows = [[labels.get(k, k), round(v, 2), round(v / total * 100, 1)] for k, v in costs.items()]
+    return columns, iter(rows)
+
+
+def build_efficiency(context, start, end):
+    columns = ['ID', 'Motorista', 'Base', 'Consumo (km/l)', 'Eficiência', 'Segurança', 'Pontualidade',
+               'Treinamento (%)', 'Penalidades', 'Economia (%)', 'Meta']
+    drivers = sorted(context['drivers'], key=lambda d: -d.efficiency_score)
+    rows = ([d.id, d.name, d.depot, d.avg_consumption, d.efficiency_score, d.safety_score,
+             d.punctuality_score, d.training_completed, d.penalties,
+             d.monthly_performance.fuel_savings,
+             'Sim' if d.efficiency_score >= EFFICIENCY_TARGET else 'Não'] for d in drivers)
+    return columns, rows
+
+
+def build_routes(context, start, end):
+    columns = ['ID', 'Data', 'Origem', 'Destino', 'Km', 'Tempo estimado', 'Combustível (R$)', 'Carga (kg)',
+               'Status', 'Litros', 'CO2 (kg)']
+    rows = ([r.id, r.date, r.origin.name, r.destination.name, r.distance,
+             r.estimated_time, r.fuel_cost, r.cargo_weight, r.status, round(_route_liters(r), 1),
+             round(_route_liters(r) * CO2_KG_PER_LITER, 1)] for r in _iter_routes(context, start, end))
+    return columns, rows
+
+
+def build_fuel(context, start, end):
+    columns = ['Mês', 'Rotas', 'Km', 'Litros estimados', 'Custo estimado (R$)', 'Custo registrado (R$)']
+    prices = context['diesel_prices'] or {}
+    rows = ([month, n, round(km), round(liters), round(liters * prices.get(month, DIESEL_PRICE), 2), round(cost, 2)]
+            for month, (n, km, liters, cost) in _monthly(_iter_routes(context, start, end)))
+    return columns, rows
+
+
+def build_maintenance(context, start, end):
+    columns = ['ID', 'Modelo', 'Placa', 'Combustível', 'Status', 'Custo manutenção (R$)', 'Capacidade (kg)']
+    rows = ([v.id, v.model, v.plate, v.fuel_type, v.status, v.maintenance_cost,
+             v.cargo_capacity] for v in context['vehicles'])
+    return columns, rows
+
+
+def build_environmental(context, start, end):
+    columns = ['Mês', 'Rotas', 'Km', 'Litros', 'CO2 (t)', 'CO2 por km (kg)']
+    rows = ([month, n, round(km), round(liters), round(liters * CO2_KG_PER_LITER / 1000, 2),
+             round(liters * CO2_KG_PER_LITER / km, 3) if km else 0]
+            for month, (n, km, liters, _) in _monthly(_iter_routes(context, start, end)))
+    return columns, rows
+
+
+BUILDERS = {
+    'operational': build_operational,
+    'financial': build_financial,
+    'efficiency': build_efficiency,
+    'routes': build_routes,
+    'fuel': build_fuel,
+    'maintenance': build_maintenance,
+    'environmental': build_environmental,
+}
+
+
+def write_csv(path, title, columns, rows):
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_xlsx(path, title, columns, rows):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError('Instale o pacote openpyxl para gerar relatórios Excel')
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title[:31])
+    sheet.append(columns)
+    count = 0
+    for row in rows:
+        sheet.append(row)
+        count += 1
+    workbook.save(path)
+    return count
+
+
+class PDFWriter:
+    """Minimal streaming PDF: monospaced text pages, written one page at a time"""
+
+    PAGE_WIDTH, PAGE_HEIGHT = 842, 595  # A4 landscape
+    FONT_SIZE = 7
+    LINE_HEIGHT = 9
+    MARGIN = 36
+
+    def __init__(self, f):
+        self.f = f
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = 4  # 1 catalog, 2 page tree, 3 font
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    @property
+    def lines_per_page(self):
+        return (self.PAGE_HEIGHT - 2 * self.MARGIN) // self.LINE_HEIGHT
+
+    def _write(self, data):
+        self.f.write(data)
+
+    def _object(self, obj_id, body):
+        self.offsets[obj_id] = self.f.tell()
+        self._write(f'{obj_id} 0 obj\n'.encode() + body + b'\nendobj\n')
+
+    @staticmethod
+    def _escape(text):
+        text = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        return text.encode('cp1252', errors='replace')
+
+    def add_page(self, lines):
+        content = [f'BT /F1 {self.FONT_SIZE} Tf {self.LINE_HEIGHT} TL {self.MARGIN} '
+                   f'{self.PAGE_HEIGHT - self.MARGIN} Td'.encode()]
+        content += [b'(' + self._escape(line) + b') Tj T*' for line in lines]
+        content.append(b'ET')
+        stream = b'\n'.join(content)
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self._object(content_id, f'<< /Length {len(stream)} >>\nstream\n'.encode() + stream + b'\nendstream')
+        self._object(page_id, (f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.PAGE_WIDTH} {self.PAGE_HEIGHT}] '
+                               f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>').encode())
+        self.page_ids.append(page_id)
+
+    def close(self):
+        kids = ' '.join(f'{i} 0 R' for i in self.page_ids)
+        self._object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        self._object(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>'.encode())
+        self._object(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>')
+        xref_offset = self.f.tell()
+        size = self.next_id
+        self._write(f'xref\n0 {size}\n0000000000 65535 f \n'.encode())
+        for obj_id in range(1, size):
+            self._write(f'{self.offsets[obj_id]:010d} 00000 n \n'.encode())
+        self._write(f'trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n'.encode())
+
+
+def write_pdf(path, title, columns, rows, column_width=14):
+    def line(values):
+        return ' '.join(str(v if v is not None else '')[:column_width].ljust(column_width) for v in values)
+
+    header = [title, '', line(columns), '-' * (len(columns) * (column_width + 1))]
+    count = 0
+    with open(path, 'wb') as f:
+        pdf = PDFWriter(f)
+        page = list(header)
+        for row in rows:
+            page.append(line(row))
+            count += 1
+            if len(page) == pdf.lines_per_page:
+                pdf.add_page(page)
+                page = list(header[2:])
+        if len(page) > 2 or not pdf.page_ids:
+            pdf.add_page(page)
+        pdf.close()
+    return count
+
+
+WRITERS = {'csv': write_csv, 'excel': write_xlsx, 'pdf': write_pdf}
+
+
+def _status_path(report_id):
+    return instance_path('reports', f'{report_id}.json')
+
+
+def _save_status(state):
+    path = _status_path(state['report_id'])
+    tmp_path = f'{path}.{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def get_report(report_id):
+    """Status of a report, or None"""
+    if not report_id.isalnum():
+        return None
+    try:
+        with open(_status_path(report_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def report_file(state):
+    return instance_path('reports', state['filename'])
+
+
+def list_reports(limit=10):
+    """Most recently requested reports"""
+    directory = os.path.dirname(instance_path('reports', 'index'))
+    names = sorted((n for n in os.listdir(directory) if n.endswith('.json')),
+                   key=lambda n: os.path.getmtime(os.path.join(directory, n)), reverse=True)
+    return [s for s in (get_report(n[:-5]) for n in names[:limit]) if s is not None]
+
+
+def run_report(state, context):
+    """Build a report into its file (runs in a pool process)"""
+    state = dict(state, status='running', started_at=datetime.now().isoformat())
+    _save_status(state)
+    path = report_file(state)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        columns, rows = BUILDERS[state['type']](context, state['start'], state['end'])
+        title = f"{REPORT_TYPES[state['type']]} - {state['start']} a {state['end']}"
+        if state.get('notice'):
+            title += ' (dados sintéticos)'
+        count = WRITERS[state['format']](tmp_path, title, columns, rows)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        state.update(status='failed', error=str(e), finished_at=datetime.now().isoformat())
+        _save_status(state)
+        return state
+    state.update(status='completed', rows=count, size=os.path.getsize(path), finished_at=datetime.now().isoformat(),
+                 completed_at=time.time())
+    _save_status(state)
+    return state
+
+
+def _get_pool():
+    # app.py forks the pool through start_pool() before starting any thread:
+    # a fork from a threaded process can copy locks held by other threads
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=REPORT_WORKERS)
+                atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+    return _pool
+
+
+def start_pool():
+    """Fork the pool's processes now, before the calling process starts threads"""
+    _get_pool().submit(int).result()
+
+
+def _context(report_type, start, end):
+    """In-memory data the report needs, snapshotted for the worker process"""
+    store = get_fleet_store()
+    routes = None if get_storage().has_data('routes') else store.routes
+    return {
+        'history_first_id': max((r.id for r in store.routes), default=0) + 1,
+        'drivers': store.drivers if report_type == 'efficiency' else [],
+        'vehicles': store.vehicles if report_type == 'maintenance' else [],
+        'costs': get_cost_analysis() if report_type == 'financial' else None,
+        'diesel_prices': get_fuel_prices().monthly_average('diesel_s10', DEFAULT_REGION, start, end)
+        if report_type == 'fuel' else None,
+        'routes': routes,
+    }
+
+
+def submit_report(params):
+    """Queue a report, or return the running or cached one with the same parameters"""
+    if not isinstance(params, dict):
+        raise ValueError('Envie os parâmetros do relatório como objeto JSON')
+    report_type = params.get('type')
+    if report_type not in REPORT_TYPES:
+        raise ValueError(f"Tipo de relatório inválido: {report_type}. Use {', '.join(REPORT_TYPES)}")
+    output_format = params.get('format', 'csv')
+    if output_format not in FORMATS:
+        raise ValueError(f"Formato inválido: {output_format}. Use {', '.join(FORMATS)}")
+    if output_format == 'excel' and importlib.util.find_spec('openpyxl') is None:
+        raise ValueError('Relatórios Excel requerem o pacote openpyxl; use csv ou pdf')
+    start, end = resolve_period(params.get('period', 'last-month'), params.get('start'), params.get('end'))
+
+    version = f'{get_fleet_store().version}:{get_fuel_prices().version}'
+    identity = json.dumps([report_type, start, end, output_format, version])
+    report_id = hashlib.sha1(identity.encode()).hexdigest()
+    state = get_report(report_id)
+    if state is not None:
+        if state['status'] in ('queued', 'running'):
+            if time.time() - state['requested_ts'] < REPORT_TIMEOUT_SECONDS:
+                return state
+        fresh = time.time() - state.get('completed_at', 0) < REPORT_CACHE_SECONDS
+        if state['status'] == 'completed' and fresh and os.path.exists(report_file(state)):
+            return state
+
+    state = {
+        'report_id': report_id, 'type': report_type, 'title': REPORT_TYPES[report_type], 'start': start,
+        'end': end, 'format': output_format, 'status': 'queued', 'error': None,
+        'filename': f'{report_type}-{start}-{end}-{report_id[:8]}.{FORMATS[output_format]}',
+        'requested_at': datetime.now().isoformat(), 'requested_ts': time.time(),
+        'notice': SYNTHETIC_NOTICE if report_type in ROUTE_REPORTS and not get_storage().has_data('routes') else None
+    }
+    _save_status(state)
+    _get_pool().submit(run_report, state, _context(report_type, start, end))
+    return state
@@ -0,0 +1,297 @@
+"""Road network loaded into a compact CSR graph with A* shortest paths.
+
+Nodes and edges are read from CSV files (``road_nodes.csv`` and
+``road_edges.csv`` next to this module by default). Edges are stored as
+NumPy arrays in compressed sparse row order: the outgoing edges of node ``u``
+are ``indptr[u]:indptr[u + 1]`` in every per-edge array.
+
+Three edge weights are supported:
+
+- ``fastest``: travel time in minutes
+- ``shortest``: distance in km
+- ``economical``: fuel cost plus toll cost in R$
+
+``avoid_tolls`` masks out every edge with a toll.
+"""
+import csv
+import hashlib
+import heapq
+import math
+import os
+import threading
+import unicodedata
+
+import numpy as np
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+NODES_FILE = os.path.join(DATA_DIR, 'road_nodes.csv')
+EDGES_FILE = os.path.join(DATA_DIR, 'road_edges.csv')
+
+EARTH_RADIUS_KM = 6371.0
+FUEL_EFFICIENCY_KM_L = 8.5
+DIESEL_PRICE = 5.45
+METRICS = ('fastest', 'shortest', 'economical')
+
+_lock = threading.Lock()
+_graph = None
+
+
+def normalize_place(name):
+    """Normalize a place name for lookups ('São Paulo, SP' -> 'sao paulo')"""
+    name = name.split(',')[0].strip().lower()
+    return ''.join(c for c in unicodedata.normalize('NFKD', name) if not unicodedata.combining(c))
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km; works on scalars and NumPy arrays"""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(h))
+
+
+def fuel_liters(distance_km, speed_kmh):
+    """Fuel burned on a segment; consumption rises away from 80 km/h"""
+    speed_penalty = 1 + ((np.asarray(speed_kmh, dtype=float) - 80) / 100) ** 2
+    return np.asarray(distance_km, dtype=float) / FUEL_EFFICIENCY_KM_L * speed_penalty
+
+
+class RoadGraph:
+    """Directed road graph in CSR layout"""
+
+    def __init__(self, node_ids, names, states, lat, lng, sources, targets,
+                 distance_km, speed_kmh, toll_cost, roads):
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.names = list(names)
+        self.states = list(states)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        self._index_by_name = {normalize_place(n): i for i, n in enumerate(self.names)}
+
+        # Sort edges by source node to build the CSR index
+        order = np.argsort(sources, kind='stable')
+        self.sources = np.asarray(sources, dtype=np.int32)[order]
+        self.targets = np.asarray(targets, dtype=np.int32)[order]
+        self.distance_km = np.asarray(distance_km, dtype=np.float32)[order]
+        self.speed_kmh = np.asarray(speed_kmh, dtype=np.float32)[order]
+        self.toll_cost = np.asarray(toll_cost, dtype=np.float32)[order]
+        self.roads = [roads[i] for i in order]
+        self.indptr = np.zeros(len(self.names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.sources, minlength=len(self.names)), out=self.indptr[1:])
+
+        self.duration_min = (self.distance_km / self.speed_kmh * 60).astype(np.float32)
+        self.fuel_l = fuel_liters(self.distance_km, self.speed_kmh).astype(np.float32)
+        self.has_toll = self.toll_cost > 0
+
+        self._weights = {
+            'fastest': self.duration_min,
+            'shortest': self.distance_km,
+            'economical': (self.fuel_l * DIESEL_PRICE + self.toll_cost).astype(np.float32),
+        }
+        # Shared copy-on-write between forked workers: never written after load
+        for array in (self.lat, self.lng, self.sources, self.targets, self.distance_km, self.speed_kmh,
+                      self.toll_cost, self.indptr, self.duration_min, self.fuel_l, self.has_toll,
+                      *self._weights.values()):
+            array.flags.writeable = False
+        self._search_cache = {}
+        self.fingerprint = hashlib.sha1(b''.join(
+            a.tobytes() for a in (self.lat, self.lng, self.targets, self.indptr, *self._weights.values())
+        )).hexdigest()[:16]
+
+    @classmethod
+    def from_csv(cls, nodes_path=NODES_FILE, edges_path=EDGES_FILE):
+        """Load a road network from node and edge CSV files"""
+        with open(nodes_path, newline='', encoding='utf-8') as f:
+            nodes = list(csv.DictReader(f))
+        with open(edges_path, newline='', encoding='utf-8') as f:
+            edges = list(csv.DictReader(f))
+        position = {int(n['node_id']): i for i, n in enumerate(nodes)}
+        src = np.array([position[int(e['source'])] for e in edges], dtype=np.int64)
+        dst = np.array([position[int(e['target'])] for e in edges], dtype=np.int64)
+
+        def column(rows, name):
+            return np.array([float(r[name]) for r in rows])
+
+        distance, speed, toll = (column(edges, name) for name in ('distance_km', 'speed_kmh', 'toll_cost'))
+        roads = [e['road'] for e in edges]
+        # Two-way roads get an edge in each direction
+        both = np.array([int(e.get('oneway') or 0) == 0 for e in edges], dtype=bool)
+        return cls(
+            [int(n['node_id']) for n in nodes], [n['name'] for n in nodes], [n['state'] for n in nodes],
+            column(nodes, 'lat'), column(nodes, 'lng'),
+            np.concatenate([src, dst[both]]),
+            np.concatenate([dst, src[both]]),
+            np.concatenate([distance, distance[both]]),
+            np.concatenate([speed, speed[both]]),
+            np.concatenate([toll, toll[both]]),
+            roads + [road for road, two_way in zip(roads, both) if two_way],
+        )
+
+    @property
+    def node_count(self):
+        return len(self.names)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    def find_node(self, place):
+        """Resolve a place name to a node index, or None"""
+        if not isinstance(place, str):
+            return None
+        return self._index_by_name.get(normalize_place(place))
+
+    def nearest_node(self, lat, lng):
+        """Index of the node closest to a coordinate"""
+        return int(np.argmin(haversine_km(lat, lng, self.lat, self.lng)))
+
+    def node(self, index):
+        return {
+            'name': self.names[index],
+            'state': self.states[index],
+            'lat': float(self.lat[index]),
+            'lng': float(self.lng[index])
+        }
+
+    def _search_arrays(self, metric):
+        """Plain-list views of the CSR arrays; list indexing is much faster than
+        NumPy scalar indexing inside the Python search loop"""
+        arrays = self._search_cache.get(metric)
+        if arrays is None:
+            weights = self._weights[metric]
+            edge_km = haversine_km(self.lat[self.sources], self.lng[self.sources],
+                                   self.lat[self.targets], self.lng[self.targets])
+            # Cheapest weight per straight-line km keeps the heuristic admissible
+            positive = edge_km > 0
+            per_km = float(np.min(weights[positive] / edge_km[positive])) if positive.any() else 0.0
+            arrays = (
+                self.indptr.tolist(), self.targets.tolist(), weights.tolist(),
+                self.has_toll.tolist(), np.radians(self.lat).tolist(),
+                np.radians(self.lng).tolist(), per_km
+            )
+            self._search_cache[metric] = arrays
+        return arrays
+
+    def prepare_search(self):
+        """Build the search arrays of every metric now rather than on first search"""
+        for metric in METRICS:
+            self._search_arrays(metric)
+        return self
+
+    def shortest_path(self, source, target, metric='fastest', avoid_tolls=False):
+        """A* search between two node indexes.
+
+        Returns a dict with the node path, edge indexes and totals, or None if
+        the target is unreachable.
+        """
+        if metric not in self._weights:
+            raise ValueError(f'Unknown metric: {metric}')
+        indptr, targets, weights, has_toll, lat, lng, per_km = self._search_arrays(metric)
+        lat_t, lng_t, cos_t = lat[target], lng[target], math.cos(lat[target])
+
+        def heuristic(n):
+            h = math.sin((lat_t - lat[n]) / 2) ** 2 + math.cos(lat[n]) * cos_t * math.sin((lng_t - lng[n]) / 2) ** 2
+            return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h)) * per_km
+
+        best = {source: 0.0}
+        parent_edge = {source: -1}
+        heap = [(heuristic(source), 0.0, source)]
+        closed = set()
+        while heap:
+            _, cost, u = heapq.heappop(heap)
+            if u == target:
+                break
+            if u in closed:
+                continue
+            closed.add(u)
+            for e in range(indptr[u], indptr[u + 1]):
+                if avoid_tolls and has_toll[e]:
+                    continue
+                v = targets[e]
+                new_cost = cost + weights[e]
+                if new_cost < best.get(v, math.inf):
+                    best[v] = new_cost
+                    parent_edge[v] = e
+                    heapq.heappush(heap, (new_cost + heuristic(v), new_cost, v))
+        if target not in best:
+            return None
+
+        edges = []
+        node = target
+        while parent_edge[node] != -1:
+            edges.append(parent_edge[node])
+            node = int(self.sources[parent_edge[node]])
+        edges.reverse()
+        return self._summarize([source] + [int(self.targets[e]) for e in edges], edges)
+
+    def shortest_path_tree(self, source, metric='fastest', avoid_tolls=False):
+        """Dijkstra from one node to every other node.
+
+        Returns ``(distance_km, duration_min, fuel_liters, toll_cost)`` arrays
+        indexed by node, accumulated along the paths that are optimal for
+        ``metric``. Unreachable nodes are ``inf``.
+        """
+        if metric not in self._weights:
+            raise ValueError(f'Unknown metric: {metric}')
+        indptr, targets, weights, has_toll = self._search_arrays(metric)[:4]
+        best = [math.inf] * self.node_count
+        parent_edge = [-1] * self.node_count
+        best[source] = 0.0
+        heap = [(0.0, source)]
+        order = []
+        while heap:
+            cost, u = heapq.heappop(heap)
+            if cost > best[u]:
+                continue
+            order.append(u)
+            for e in range(indptr[u], indptr[u + 1]):
+                if avoid_tolls and has_toll[e]:
+                    continue
+                v = targets[e]
+                new_cost = cost + weights[e]
+                if new_cost < best[v]:
+                    best[v] = new_cost
+                    parent_edge[v] = e
+                    heapq.heappush(heap, (new_cost, v))
+
+        # Settled order guarantees a node's parent is accumulated before it
+        if 'totals' not in self._search_cache:
+            self._search_cache['totals'] = (
+                self.sources.tolist(), self.distance_km.tolist(), self.duration_min.tolist(),
+                self.fuel_l.tolist(), self.toll_cost.tolist()
+            )
+        sources, edge_km, edge_min, edge_fuel, edge_toll = self._search_cache['totals']
+        distance = [math.inf] * self.node_count
+        duration = [math.inf] * self.node_count
+        fuel = [math.inf] * self.node_count
+        toll = [math.inf] * self.node_count
+        distance[source] = duration[source] = fuel[source] = toll[source] = 0.0
+        for v in order[1:]:
+            e = parent_edge[v]
+            u = sources[e]
+            distance[v] = distance[u] + edge_km[e]
+            duration[v] = duration[u] + edge_min[e]
+            fuel[v] = fuel[u] + edge_fuel[e]
+            toll[v] = toll[u] + edge_toll[e]
+        return np.array(distance), np.array(duration), np.array(fuel), np.array(toll)
+
+    def _summarize(self, nodes, edges):
+        edges = np.asarray(edges, dtype=np.int64)
+        return {
+            'nodes': nodes,
+            'edges': edges.tolist(),
+            'roads': list(dict.fromkeys(self.roads[e] for e in edges)),
+            'distance_km': float(self.distance_km[edges].sum()),
+            'duration_min': float(self.duration_min[edges].sum()),
+            'fuel_liters': float(self.fuel_l[edges].sum()),
+            'toll_cost': float(self.toll_cost[edges].sum())
+        }
+
+
+def get_road_graph():
+    """Return the shared road graph, loading it on first use"""
+    global _graph
+    if _graph is None:
+        with _lock:
+            if _graph is None:
+                _graph = RoadGraph.from_csv()
+    return _graph
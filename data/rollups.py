@@ -0,0 +1,276 @@
+"""Incrementally maintained minute/hour/day/month aggregates of fleet events.
+
+Every event (a route completed, a fuel fill, an incident) is added to one
+bucket per resolution as it arrives, so the dashboard reads ``count`` buckets
+instead of scanning the raw history. Each resolution is a fixed-size NumPy
+ring of ``BUCKET_DTYPE`` rows: a slot holds the bucket number it belongs to,
+and a slot still holding an older bucket is cleared when it is reused. Memory
+is bounded by ``RESOLUTIONS`` no matter how many events arrive.
+
+Buckets follow local wall-clock time, like the rest of the app. On first use
+the day and month levels are backfilled from the route history in the
+database (minute and hour levels only see live events).
+"""
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+# Resolution -> (bucket seconds, or None for calendar months; buckets kept)
+RESOLUTIONS = {
+    'minute': (60, 1440),
+    'hour': (3600, 720),
+    'day': (86400, 732),
+    'month': (None, 120),
+}
+LABEL_FORMATS = {'minute': '%H:%M', 'hour': '%H:00', 'day': '%d/%m', 'month': '%m/%Y'}
+FIELDS = (
+    'routes_completed', 'distance_km', 'routes_timed', 'routes_on_time',
+    'route_fuel_liters', 'route_fuel_km', 'fuel_fills', 'fuel_liters', 'fuel_cost', 'incidents',
+)
+BUCKET_DTYPE = np.dtype([('bucket', '<i8')] + [(name, '<f8') for name in FIELDS])
+EVENT_TYPES = ('route_completed', 'fuel_fill', 'incident')
+KPI_PERIODS = {'day': ('day', 1), 'week': ('day', 7), 'month': ('month', 1)}
+MAX_EVENTS_PER_BATCH = 10000
+EPOCH = datetime(1970, 1, 1)
+
+_store = None
+_lock = threading.Lock()
+
+
+def local_seconds(ts=None):
+    """Seconds since the epoch of ``ts``'s local wall-clock time.
+
+    ``ts`` may be a naive (local) datetime, a date, an ISO string or a Unix
+    timestamp; None means now.
+    """
+    if ts is None:
+        ts = datetime.now()
+    elif isinstance(ts, (int, float)):
+        ts = datetime.fromtimestamp(ts)
+    elif isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    elif not isinstance(ts, datetime):
+        ts = datetime(ts.year, ts.month, ts.day)
+    if ts.tzinfo is not None:
+        ts = ts.astimezone().replace(tzinfo=None)
+    return int((ts - EPOCH).total_seconds())
+
+
+def event_values(event_type, **values):
+    """Field increments of one event"""
+    if event_type == 'route_completed':
+        distance = float(values.get('distance_km', 0))
+        increments = {'routes_completed': 1, 'distance_km': distance}
+        if values.get('on_time') is not None:
+            increments['routes_timed'] = 1
+            increments['routes_on_time'] = 1 if values['on_time'] else 0
+        if values.get('fuel_liters'):
+            increments['route_fuel_liters'] = float(values['fuel_liters'])
+            increments['route_fuel_km'] = distance
+        return increments
+    if event_type == 'fuel_fill':
+        return {'fuel_fills': 1, 'fuel_liters': float(values.get('liters', 0)),
+                'fuel_cost': float(values.get('cost', 0))}
+    if event_type == 'incident':
+        return {'incidents': 1}
+    raise ValueError(f'Tipo de evento desconhecido: {event_type}')
+
+
+def bucket_numbers(resolution, seconds):
+    """Bucket number of each local-seconds value at ``resolution``"""
+    width, _ = RESOLUTIONS[resolution]
+    seconds = np.asarray(seconds, dtype=np.int64)
+    if width is None:
+        return seconds.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+    return seconds // width
+
+
+def bucket_start(resolution, bucket):
+    """Local datetime at which ``bucket`` starts"""
+    width, _ = RESOLUTIONS[resolution]
+    if width is None:
+        year, month = divmod(int(bucket), 12)
+        return datetime(1970 + year, month + 1, 1)
+    return EPOCH + timedelta(seconds=int(bucket) * width)
+
+
+class Ring:
+    """Fixed number of consecutive buckets at one resolution"""
+
+    def __init__(self, resolution):
+        self.resolution = resolution
+        self.capacity = RESOLUTIONS[resolution][1]
+        self.data = np.zeros(self.capacity, BUCKET_DTYPE)
+        self.data['bucket'] = -1
+
+    def add(self, buckets, increments):
+        """Add ``increments`` (field -> array aligned with ``buckets``)"""
+        unique, inverse = np.unique(buckets, return_inverse=True)
+        slots = unique % self.capacity
+        current = self.data['bucket'][slots]
+        # Reclaim slots holding an older bucket; skip events older than their slot
+        stale = current < unique
+        if stale.any():
+            self.data[slots[stale]] = 0
+            self.data['bucket'][slots[stale]] = unique[stale]
+        live = current <= unique
+        for name, values in increments.items():
+            sums = np.bincount(inverse, weights=values, minlength=len(unique))
+            self.data[name][slots[live]] += sums[live]
+
+    def window(self, last, count):
+        """``count`` buckets ending at bucket ``last``; missing buckets are zero"""
+        count = min(count, self.capacity)
+        buckets = np.arange(last - count + 1, last + 1)
+        rows = self.data[buckets % self.capacity]
+        rows[rows['bucket'] != buckets] = 0
+        rows['bucket'] = buckets
+        return rows
+
+
+class RollupStore:
+    """Rings for every resolution, updated together"""
+
+    def __init__(self):
+        self.rings = {resolution: Ring(resolution) for resolution in RESOLUTIONS}
+        self._lock = threading.Lock()
+        self.total_events = 0
+
+    def record(self, event_type, ts=None, **values):
+        """Add one event at ``ts`` (default now)"""
+        self.record_many([dict(values, type=event_type, ts=ts)])
+
+    def record_many(self, events, resolutions=None):
+        """Add a batch of event dicts (``type``, optional ``ts`` and values)"""
+        if len(events) > MAX_EVENTS_PER_BATCH:
+            raise ValueError(f'Máximo de {MAX_EVENTS_PER_BATCH} eventos por lote')
+        seconds = np.zeros(len(events), np.int64)
+        increments = {name: np.zeros(len(events)) for name in FIELDS}
+        for i, event in enumerate(events):
+            values = {k: v for k, v in event.items() if k not in ('type', 'ts')}
+            for name, value in event_values(event.get('type'), **values).items():
+                increments[name][i] = value
+            seconds[i] = local_seconds(event.get('ts'))
+        self.add(seconds, increments, resolutions)
+        with self._lock:
+            self.total_events += len(events)
+        return len(events)
+
+    def add(self, seconds, increments, resolutions=None):
+        """Add pre-computed ``increments`` at local-seconds ``seconds``"""
+        increments = {name: values for name, values in increments.items() if np.any(values)}
+        with self._lock:
+            for resolution in resolutions or RESOLUTIONS:
+                self.rings[resolution].add(bucket_numbers(resolution, seconds), increments)
+
+    def window(self, resolution, count, now=None):
+        """The latest ``count`` buckets at ``resolution``, oldest first"""
+        last = int(bucket_numbers(resolution, local_seconds(now)))
+        with self._lock:
+            return self.rings[resolution].window(last, count)
+
+    def series(self, resolution, count, now=None):
+        """Chart-ready series of the latest ``count`` buckets"""
+        rows = self.window(resolution, count, now)
+        label_format = LABEL_FORMATS[resolution]
+        return {
+            'resolution': resolution,
+            'labels': [bucket_start(resolution, b).strftime(label_format) for b in rows['bucket'].tolist()],
+            'routes_completed': rows['routes_completed'].astype(int).tolist(),
+            'distance_km': np.round(rows['distance_km'], 1).tolist(),
+            'punctuality': _ratios(rows['routes_on_time'] * 100, rows['routes_timed']),
+            'fuel_efficiency': _ratios(rows['route_fuel_km'], rows['route_fuel_liters']),
+            'fuel_price': _ratios(rows['fuel_cost'], rows['fuel_liters'], 3),
+            'incidents': rows['incidents'].astype(int).tolist(),
+        }
+
+    def totals(self, period='day', now=None):
+        """Summed fields over a KPI period (``day``, ``week`` or ``month``)"""
+        resolution, count = KPI_PERIODS[period]
+        rows = self.window(resolution, count, now)
+        return {name: float(rows[name].sum()) for name in FIELDS}
+
+    def kpis(self, period='day', now=None):
+        """KPIs over ``period``; ratios are None when nothing was recorded"""
+        totals = self.totals(period, now)
+        return {
+            'period': period,
+            'routes_completed': int(totals['routes_completed']),
+            'distance_km': round(totals['distance_km'], 1),
+            'punctuality': _ratio(totals['routes_on_time'] * 100, totals['routes_timed']),
+            'energy_efficiency': _ratio(totals['route_fuel_km'], totals['route_fuel_liters']),
+            'fuel_cost': round(totals['fuel_cost'], 2),
+            'avg_fuel_price': _ratio(totals['fuel_cost'], totals['fuel_liters'], 3),
+            'incidents': int(totals['incidents']),
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'total_events': self.total_events,
+                'buckets': {resolution: ring.capacity for resolution, ring in self.rings.items()},
+                'bytes': sum(ring.data.nbytes for ring in self.rings.values())
+            }
+
+
+def _ratio(numerator, denominator, digits=1):
+    return round(numerator / denominator, digits) if denominator else None
+
+
+def _ratios(numerators, denominators, digits=1):
+    return [_ratio(n, d, digits) for n, d in zip(numerators.tolist(), denominators.tolist())]
+
+
+def overlay_dashboard(metrics, store, now=None):
+    """Replace the dashboard's KPIs and trends with recorded values where there are any"""
+    now = now or datetime.now()
+    today = store.kpis('day', now)
+    if today['routes_completed']:
+        metrics['routes_completed_today'] = today['routes_completed']
+    for name in ('punctuality', 'energy_efficiency'):
+        if today[name] is not None:
+            metrics['kpis'][name] = today[name]
+
+    # Today's hours in the dashboard's six 4-hour groups
+    hours = store.window('hour', 24, now.replace(hour=23))
+    routes = hours['routes_completed'].reshape(6, 4).sum(axis=1)
+    if routes.any():
+        metrics['performance_trends']['hourly_routes'] = routes.astype(int).tolist()
+    # Punctuality gets its own series: efficiency_trend is a different measure.
+    # Groups without timed routes are None, drawn as gaps
+    timed = hours['routes_timed'].reshape(6, 4).sum(axis=1)
+    if timed.any():
+        on_time = hours['routes_on_time'].reshape(6, 4).sum(axis=1)
+        metrics['performance_trends']['punctuality_trend'] = _ratios(on_time * 100, timed)
+    return metrics
+
+
+def backfill(store, storage, days=None):
+    """Load daily route totals from ``storage`` into the day and month levels"""
+    days = days or RESOLUTIONS['day'][1]
+    start = (date.today() - timedelta(days=days - 1)).isoformat()
+    rows = storage.daily_route_totals(start)
+    if not rows:
+        return 0
+    route_dates, routes, distance = zip(*rows)
+    seconds = np.array(route_dates, dtype='datetime64[D]').astype('datetime64[s]').astype(np.int64)
+    store.add(seconds, {'routes_completed': np.array(routes, float), 'distance_km': np.array(distance, float)},
+              resolutions=('day', 'month'))
+    return int(sum(routes))
+
+
+def get_rollups():
+    """Return the shared rollup store, backfilled from the database on first use"""
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                from data.storage import get_storage
+
+                store = RollupStore()
+                storage = get_storage()
+                if storage.has_data('routes'):
+                    backfill(store, storage)
+                _store = store
+    return _store
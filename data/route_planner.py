@@ -0,0 +1,160 @@
+"""Route planning on top of the road graph.
+
+``plan_route()`` takes the same request body as ``/api/route-optimization``
+and returns the response payload. It only depends on its arguments and the
+shared road graph, so ``plan_routes()`` can fan batches out over a process
+pool; each worker loads the graph once. A weather forecast, when given, is
+sent along with every chunk and adds delay, risk and fuel to each route
+(see ``data/weather_impact.py``). Fuel is priced at the diesel quote of the
+origin's state when ``fuel_prices`` (state -> price) is given, and at
+``DIESEL_PRICE`` otherwise.
+"""
+import atexit
+import math
+import os
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from data.road_graph import DIESEL_PRICE, METRICS, get_road_graph
+from data.weather_impact import apply_weather
+
+MAX_BATCH_SIZE = 5000
+# Batches this small are planned inline; pool dispatch would cost more
+INLINE_BATCH_SIZE = 8
+BATCH_WORKERS = int(os.environ.get('WISE_ROUTES_BATCH_WORKERS', 0)) or os.cpu_count() or 1
+
+_pool_lock = threading.Lock()
+_pool = None
+
+
+def format_duration(minutes):
+    return f"{int(minutes // 60)}h {int(minutes % 60)}min"
+
+
+def plan_route(data, forecast=None, fuel_prices=None):
+    """Plan a single origin/destination route, scored against ``forecast``.
+
+    Raises ValueError with a message for the user when the request is
+    malformed or cannot be planned (unknown place or optimization type).
+    """
+    origin = data.get('origin', '')
+    destination = data.get('destination', '')
+    cargo_weight = data.get('cargoWeight', 0) or 0
+    optimization_type = data.get('optimizationType', 'fastest')
+    avoid_tolls = bool(data.get('avoidTolls', False))
+
+    if not isinstance(origin, str) or not origin.strip():
+        raise ValueError('Informe a origem pelo nome da cidade')
+    if not isinstance(destination, str) or not destination.strip():
+        raise ValueError('Informe o destino pelo nome da cidade')
+    if isinstance(cargo_weight, str):
+        try:
+            cargo_weight = float(cargo_weight)
+        except ValueError:
+            raise ValueError('Peso da carga deve ser um número em kg')
+    if isinstance(cargo_weight, bool) or not isinstance(cargo_weight, (int, float)) \
+            or not math.isfinite(cargo_weight) or cargo_weight < 0:
+        raise ValueError('Peso da carga deve ser um número em kg, maior ou igual a zero')
+    if not isinstance(optimization_type, str) or optimization_type not in METRICS:
+        raise ValueError(f'Tipo de otimização inválido: {optimization_type}')
+
+    graph = get_road_graph()
+    source = graph.find_node(origin)
+    target = graph.find_node(destination)
+    if source is None:
+        raise ValueError(f'Origem desconhecida: {origin}')
+    if target is None:
+        raise ValueError(f'Destino desconhecido: {destination}')
+
+    path = graph.shortest_path(source, target, optimization_type, avoid_tolls)
+    tolls_avoided = avoid_tolls
+    if path is None and avoid_tolls:
+        # Some hubs can only be reached through toll roads
+        path = graph.shortest_path(source, target, optimization_type)
+        tolls_avoided = False
+    if path is None:
+        raise ValueError(f'Nenhuma rota entre {origin} e {destination}')
+
+    # Weight factor
+    weight_factor = 1 + (float(cargo_weight) / 30000) * 0.2
+    fuel_liters = path['fuel_liters'] * weight_factor
+    fuel_price = (fuel_prices or {}).get(graph.states[source], DIESEL_PRICE)
+    fuel_cost = fuel_liters * fuel_price
+    toll_cost = path['toll_cost']
+    duration = path['duration_min']
+
+    waypoints = []
+    for i, node in enumerate(path['nodes']):
+        point = graph.node(node)
+        waypoints.append({
+            'lat': point['lat'],
+            'lng': point['lng'],
+            'name': point['name'],
+            'type': 'origin' if i == 0 else 'destination' if i == len(path['nodes']) - 1 else 'waypoint'
+        })
+
+    plan = {
+        'route_id': f"route_{zlib.crc32(f'{origin}{destination}'.encode()) % 10000}",
+        'distance': round(path['distance_km'], 1),
+        'duration_minutes': int(duration),
+        'duration_formatted': format_duration(duration),
+        'fuel_cost': round(fuel_cost, 2),
+        'toll_cost': round(toll_cost, 2),
+        'total_cost': round(fuel_cost + toll_cost, 2),
+        'optimization_type': optimization_type,
+        'avoid_tolls': avoid_tolls,
+        'tolls_avoided': tolls_avoided,
+        'roads': path['roads'],
+        'waypoints': waypoints,
+        'traffic_conditions': 'moderate',
+        'estimated_fuel_consumption': round(fuel_liters, 1),
+        'fuel_price': round(fuel_price, 3)
+    }
+    if forecast is not None:
+        apply_weather(plan, forecast, graph.duration_min[path['edges']])
+    return plan
+
+
+def _plan_chunk(chunk, forecast=None, fuel_prices=None):
+    """Plan (index, request) pairs, reporting errors per request"""
+    results = []
+    for index, data in chunk:
+        try:
+            results.append({'index': index, 'result': plan_route(data, forecast, fuel_prices)})
+        except (ValueError, TypeError, AttributeError) as e:
+            results.append({'index': index, 'error': str(e)})
+    return results
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS, initializer=get_road_graph)
+                atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+    return _pool
+
+
+def start_pool():
+    """Fork the pool's processes now, before the calling process starts threads"""
+    if BATCH_WORKERS > 1:
+        _get_pool().submit(int).result()
+
+
+def plan_routes(requests, forecast=None, fuel_prices=None):
+    """Plan many routes, yielding ``{'index', 'result' | 'error'}`` dicts in
+    completion order rather than request order"""
+    items = list(enumerate(requests))
+    if BATCH_WORKERS == 1 or len(items) <= INLINE_BATCH_SIZE:
+        yield from _plan_chunk(items, forecast, fuel_prices)
+        return
+
+    # A few chunks per worker amortizes IPC while keeping results flowing
+    chunk_size = max(1, len(items) // (BATCH_WORKERS * 4))
+    pool = _get_pool()
+    futures = [pool.submit(_plan_chunk, items[i:i + chunk_size], forecast, fuel_prices)
+               for i in range(0, len(items), chunk_size)]
+    for future in as_completed(futures):
+        yield from future.result()
@@ -0,0 +1,446 @@
+"""Driver assignments with hours-of-service checks and bulk auto-assignment.
+
+Every driver has a ``DriverSchedule``: the start and end minute of each
+assignment in sorted lists, plus driving minutes per calendar day. A
+driver's assignments never overlap, so the ends are sorted too and a conflict
+check is one bisect: only the last assignment starting before the new one
+ends can reach into it. Daily and weekly driving totals are dict lookups.
+
+Assigning a route turns its driving time into driving blocks that follow
+the hours-of-service rules below (a break after 5h30 of continuous driving,
+at most 10h of driving per day, an 11h rest once the day is used up), so a
+long route simply ends later. Assignments that would overlap another one
+or exceed the weekly limit raise ``ScheduleConflict``.
+
+``auto_assign()`` walks the pending routes of a period in date order and
+gives each to the best available driver: efficiency score minus a penalty
+per km between the driver (depot, or where their previous route ends) and
+the route origin, taking the earliest legal start on the route's day.
+
+Assignment ids are random and checked against the store, so they never
+collide. POSTs are idempotent: repeating an ``Idempotency-Key``, or the
+same driver, route and start, returns the existing assignment; cancelling
+an assignment releases its key. Assignments are persisted in the
+``assignments`` table of the database, seeded or not, so they survive
+restarts.
+"""
+import math
+import re
+import threading
+import uuid
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from data.records import DriverStatus, RouteStatus
+from data.road_graph import haversine_km
+from data.rollups import local_seconds
+from data.synthetic_data import HUB_CITIES
+
+MAX_CONTINUOUS_DRIVING_MINUTES = 330
+BREAK_MINUTES = 30
+MAX_DAILY_DRIVING_MINUTES = 600
+DAILY_REST_MINUTES = 660
+MAX_WEEKLY_DRIVING_MINUTES = 3360
+# Minimum time between the end of one assignment and the start of the next
+TURNAROUND_MINUTES = 30
+DEFAULT_START_HOUR = 8
+LATEST_START_HOUR = 20
+AVERAGE_SPEED_KMH = 70
+AVAILABLE_DRIVER_STATUSES = (DriverStatus.ACTIVE, DriverStatus.ON_ROUTE)
+PENDING_ROUTE_STATUS = RouteStatus.PLANNED
+CANCELLED = 'cancelled'
+# One efficiency point is worth this many km of distance to the route origin
+PROXIMITY_KM_PER_POINT = 10
+MAX_CANDIDATES = 20
+MAX_AUTO_ASSIGN_DAYS = 31
+DAY_MINUTES = 1440
+EPOCH = datetime(1970, 1, 1)
+
+_scheduler = None
+_lock = threading.Lock()
+
+
+class ScheduleConflict(ValueError):
+    """The assignment overlaps another one or breaks the weekly driving limit"""
+
+
+def to_minute(value):
+    """Local minute of an ISO date (at DEFAULT_START_HOUR) or datetime"""
+    if isinstance(value, str) and len(value) == 10:
+        value = date.fromisoformat(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return local_seconds(value) // 60 + DEFAULT_START_HOUR * 60
+    return local_seconds(value) // 60
+
+
+def minute_iso(minute):
+    return (EPOCH + timedelta(minutes=int(minute))).isoformat(timespec='minutes')
+
+
+def format_minutes(minutes):
+    return f'{minutes // 60}h {minutes % 60}min'
+
+
+def duration_minutes(value):
+    """Minutes from a number of minutes or a duration such as '5h 30min'.
+
+    None if invalid, or longer than a week of driving: no legal schedule fits
+    it, and planning it would walk its minutes under the scheduler lock.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        minutes = int(value) if math.isfinite(value) and value > 0 else 0
+    elif isinstance(value, str):
+        match = re.fullmatch(r'\s*(\d+)h\s*(?:(\d+)\s*min)?\s*', value)
+        minutes = int(match.group(1)) * 60 + int(match.group(2) or 0) if match else 0
+    else:
+        return None
+    return minutes if 0 < minutes <= MAX_WEEKLY_DRIVING_MINUTES else None
+
+
+def route_minutes(route):
+    """Driving minutes of a route: its estimated time, or its distance at AVERAGE_SPEED_KMH"""
+    return duration_minutes(route.estimated_time) or max(1, round(route.distance / AVERAGE_SPEED_KMH * 60))
+
+
+def route_label(route):
+    return f'{route.origin.name} → {route.destination.name}'
+
+
+def _week(day):
+    """Monday-based week number of a day number (1970-01-01 was a Thursday)"""
+    return (day + 3) // 7
+
+
+class DriverSchedule:
+    """One driver's assignments sorted by start, with driving minutes per day"""
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+        self.daily = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _conflict_index(self, start, end):
+        i = bisect_left(self.starts, end + TURNAROUND_MINUTES) - 1
+        return i if i >= 0 and self.ends[i] + TURNAROUND_MINUTES > start else None
+
+    def conflict(self, start, end):
+        """Id of an assignment too close to [start, end), or None"""
+        i = self._conflict_index(start, end)
+        return self.ids[i] if i is not None else None
+
+    def plan(self, start, driving):
+        """Driving blocks for ``driving`` minutes from ``start``: ``(end, blocks, minutes per day)``"""
+        blocks, by_day = [], {}
+        t, left, continuous = start, driving, 0
+        while left > 0:
+            day = t // DAY_MINUTES
+            day_left = MAX_DAILY_DRIVING_MINUTES - self.daily.get(day, 0) - by_day.get(day, 0)
+            if day_left <= 0:
+                t, continuous = t + DAILY_REST_MINUTES, 0
+                continue
+            if continuous >= MAX_CONTINUOUS_DRIVING_MINUTES:
+                t, continuous = t + BREAK_MINUTES, 0
+                continue
+            length = min(left, MAX_CONTINUOUS_DRIVING_MINUTES - continuous, day_left, (day + 1) * DAY_MINUTES - t)
+            if blocks and blocks[-1][1] == t:
+                blocks[-1][1] = t + length
+            else:
+                blocks.append([t, t + length])
+            by_day[day] = by_day.get(day, 0) + length
+            t, left, continuous = t + length, left - length, continuous + length
+        return t, blocks, by_day
+
+    def week_minutes(self, week):
+        return sum(self.daily.get(day, 0) for day in range(week * 7 - 3, week * 7 + 4))
+
+    def exceeds_week(self, by_day):
+        """Whether adding ``by_day`` driving minutes breaks the weekly limit"""
+        added = {}
+        for day, minutes in by_day.items():
+            added[_week(day)] = added.get(_week(day), 0) + minutes
+        return any(self.week_minutes(week) + minutes > MAX_WEEKLY_DRIVING_MINUTES for week, minutes in added.items())
+
+    def find_slot(self, earliest, driving, latest):
+        """First legal start between ``earliest`` and ``latest``: ``(start, end, blocks, by_day)`` or None"""
+        start = earliest
+        while start <= latest:
+            end, blocks, by_day = self.plan(start, driving)
+            i = self._conflict_index(start, end)
+            if i is None:
+                return None if self.exceeds_week(by_day) else (start, end, blocks, by_day)
+            start = self.ends[i] + TURNAROUND_MINUTES
+        return None
+
+    def add(self, assignment_id, start, end, by_day):
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.ids.insert(i, assignment_id)
+        for day, minutes in by_day.items():
+            self.daily[day] = self.daily.get(day, 0) + minutes
+
+    def remove(self, assignment_id, start, by_day):
+        i = bisect_left(self.starts, start)
+        if i < len(self.ids) and self.ids[i] == assignment_id:
+            del self.starts[i], self.ends[i], self.ids[i]
+            for day, minutes in by_day.items():
+                self.daily[day] -= minutes
+
+    def between(self, start, end):
+        """Ids of the assignments overlapping [start, end)"""
+        return self.ids[bisect_left(self.ends, start + 1):bisect_left(self.starts, end)]
+
+
+class Scheduler:
+    """Every driver's schedule, assignments by id, route and idempotency key"""
+
+    def __init__(self, storage=None):
+        self.storage = storage
+        self.assignments = {}
+        self.schedules = {}
+        self._blocks = {}
+        self._by_route = {}
+        self._by_key = {}
+        self._lock = threading.Lock()
+
+    def load(self, records):
+        """Index stored assignments without writing them back"""
+        with self._lock:
+            for record in sorted(records, key=lambda r: r['start']):
+                blocks = [[to_minute(s), to_minute(e)] for s, e in record['driving_blocks']]
+                self._index(record, to_minute(record['start']), to_minute(record['end']), _minutes_by_day(blocks))
+
+    def _index(self, record, start, end, by_day):
+        assignment_id = record['assignment_id']
+        self.assignments[assignment_id] = record
+        self._blocks[assignment_id] = (start, by_day)
+        self.schedules.setdefault(record['driver_id'], DriverSchedule()).add(assignment_id, start, end, by_day)
+        self._by_route[record['route_id']] = assignment_id
+        if record.get('idempotency_key'):
+            self._by_key[record['idempotency_key']] = assignment_id
+
+    def _new_id(self):
+        while True:
+            assignment_id = f'asg_{uuid.uuid4().hex[:16]}'
+            if assignment_id not in self.assignments:
+                return assignment_id
+
+    def _book(self, driver, route, slot, driving, details=None, idempotency_key=None):
+        start, end, blocks, by_day = slot
+        record = dict(
+            details or {},
+            assignment_id=self._new_id(),
+            driver_id=driver.id,
+            driver=driver.name,
+            route_id=route.id,
+            route=route_label(route),
+            start=minute_iso(start),
+            end=minute_iso(end),
+            driving_minutes=driving,
+            estimated_duration=format_minutes(end - start),
+            driving_blocks=[[minute_iso(s), minute_iso(e)] for s, e in blocks],
+            status='scheduled',
+            idempotency_key=idempotency_key,
+            created_at=datetime.now().isoformat(timespec='seconds')
+        )
+        self._index(record, start, end, by_day)
+        return record
+
+    def _existing(self, driver, route, start, idempotency_key):
+        """The assignment a repeated request refers to, or None for a new one"""
+        assignment_id = self._by_key.get(idempotency_key) if idempotency_key else None
+        if assignment_id is None:
+            assignment_id = self._by_route.get(route.id)
+            if assignment_id is None:
+                return None
+        record = self.assignments[assignment_id]
+        if record['driver_id'] == driver.id and record['route_id'] == route.id and record['start'] == minute_iso(start):
+            return record
+        if idempotency_key and self._by_key.get(idempotency_key) == assignment_id:
+            raise ScheduleConflict('Chave de idempotência já usada em outra atribuição')
+        raise ScheduleConflict(f'Rota {route.id} já atribuída ({assignment_id})')
+
+    def assign(self, driver, route, start, duration=None, details=None, idempotency_key=None):
+        """Assign ``route`` to ``driver`` from minute ``start``: ``(assignment, created)``"""
+        driving = duration or route_minutes(route)
+        if driving > MAX_WEEKLY_DRIVING_MINUTES:
+            raise ScheduleConflict(f'Limite semanal de {MAX_WEEKLY_DRIVING_MINUTES // 60}h de direção excedido')
+        with self._lock:
+            existing = self._existing(driver, route, start, idempotency_key)
+            if existing is not None:
+                return self._public(existing), False
+            schedule = self.schedules.get(driver.id) or DriverSchedule()
+            end, blocks, by_day = schedule.plan(start, driving)
+            conflict = schedule.conflict(start, end)
+            if conflict is not None:
+                other = self.assignments[conflict]
+                raise ScheduleConflict(f"Conflito com a atribuição {conflict} ({other['start']} – {other['end']})")
+            if schedule.exceeds_week(by_day):
+                raise ScheduleConflict(f'Limite semanal de {MAX_WEEKLY_DRIVING_MINUTES // 60}h de direção excedido')
+            record = self._book(driver, route, (start, end, blocks, by_day), driving, details, idempotency_key)
+        if self.storage is not None:
+            self.storage.save_assignments([record])
+        return self._public(record), True
+
+    def cancel(self, assignment_id):
+        """Cancel an assignment and free its time; returns it, or None if unknown"""
+        with self._lock:
+            record = self.assignments.get(assignment_id)
+            if record is None:
+                return None
+            if record['status'] != CANCELLED:
+                self._unindex(record)
+                record['status'] = CANCELLED
+        if self.storage is not None:
+            self.storage.update_assignment_status(assignment_id, CANCELLED)
+        return self._public(record)
+
+    def _unindex(self, record):
+        assignment_id = record['assignment_id']
+        start, by_day = self._blocks.pop(assignment_id)
+        self.schedules[record['driver_id']].remove(assignment_id, start, by_day)
+        if self._by_route.get(record['route_id']) == assignment_id:
+            del self._by_route[record['route_id']]
+        if record.get('idempotency_key') and self._by_key.get(record['idempotency_key']) == assignment_id:
+            del self._by_key[record['idempotency_key']]
+
+    def schedule(self, driver_id, first_day, days=7):
+        """Assignments and driving hours of a driver over ``days`` days from ``first_day``"""
+        start = local_seconds(first_day) // 60
+        end = start + days * DAY_MINUTES
+        with self._lock:
+            schedule = self.schedules.get(driver_id) or DriverSchedule()
+            records = [self._public(self.assignments[i]) for i in schedule.between(start, end)]
+            first = start // DAY_MINUTES
+            hours = [{
+                'date': minute_iso(day * DAY_MINUTES)[:10],
+                'driving_minutes': schedule.daily.get(day, 0),
+                'remaining_minutes': max(MAX_DAILY_DRIVING_MINUTES - schedule.daily.get(day, 0), 0)
+            } for day in range(first, first + days)]
+            week = schedule.week_minutes(_week(first))
+        return {
+            'assignments': records,
+            'hours': hours,
+            'week_driving_minutes': week,
+            'week_remaining_minutes': max(MAX_WEEKLY_DRIVING_MINUTES - week, 0)
+        }
+
+    def auto_assign(self, drivers, routes, first_day, days=7, dry_run=False):
+        """Give the pending, unassigned routes dated in the period to available drivers"""
+        first = local_seconds(first_day) // 60 // DAY_MINUTES
+        now = to_minute(datetime.now())
+        drivers = [d for d in drivers if d.status in AVAILABLE_DRIVER_STATUSES]
+        hubs = {hub['name']: hub for hub in HUB_CITIES}
+        depots = [hubs.get(d.depot) for d in drivers]
+        lat = np.array([h['lat'] if h else np.nan for h in depots], dtype=float)
+        lng = np.array([h['lng'] if h else np.nan for h in depots], dtype=float)
+        efficiency = np.array([d.efficiency_score or 0 for d in drivers], dtype=float)
+        # End of each driver's last assignment booked here: routes come in date
+        # order, so drivers busy past a route's latest start are skipped unseen
+        free_at = np.zeros(len(drivers), dtype=np.int64)
+
+        booked, unassigned = [], []
+        with self._lock:
+            pending = []
+            for route in routes:
+                day = local_seconds(route.date) // 86400 if route.date else first
+                if route.status == PENDING_ROUTE_STATUS and route.id not in self._by_route \
+                        and first <= day < first + days:
+                    pending.append((day, -route_minutes(route), route.id, route))
+            pending.sort(key=lambda item: item[:3])
+
+            for day, _, _, route in pending:
+                if not drivers:
+                    unassigned.append({'route_id': route.id, 'reason': 'Nenhum motorista disponível'})
+                    continue
+                driving = route_minutes(route)
+                if driving > MAX_WEEKLY_DRIVING_MINUTES:
+                    unassigned.append({'route_id': route.id, 'reason': 'Rota excede o limite semanal de direção'})
+                    continue
+                distance = np.nan_to_num(haversine_km(lat, lng, route.origin.lat, route.origin.lng),
+                                         nan=PROXIMITY_KM_PER_POINT * 100)
+                earliest = max(day * DAY_MINUTES + DEFAULT_START_HOUR * 60, now)
+                latest = day * DAY_MINUTES + LATEST_START_HOUR * 60
+                score = np.where(free_at <= latest, efficiency - distance / PROXIMITY_KM_PER_POINT, -np.inf)
+                for i in np.argsort(-score, kind='stable')[:MAX_CANDIDATES].tolist():
+                    if score[i] == -np.inf:
+                        break
+                    driver = drivers[i]
+                    slot = self.schedules.setdefault(driver.id, DriverSchedule()).find_slot(earliest, driving, latest)
+                    if slot is None:
+                        continue
+                    record = self._book(driver, route, slot, driving)
+                    record['deadhead_km'] = round(float(distance[i]), 1)
+                    booked.append(record)
+                    # The driver's next route starts from where this one ends
+                    lat[i], lng[i] = route.destination.lat, route.destination.lng
+                    free_at[i] = slot[1] + TURNAROUND_MINUTES
+                    break
+                else:
+                    unassigned.append({'route_id': route.id,
+                                       'reason': 'Nenhum motorista com jornada disponível no dia'})
+            if dry_run:
+                for record in booked:
+                    self._unindex(record)
+                    del self.assignments[record['assignment_id']]
+        if booked and not dry_run and self.storage is not None:
+            self.storage.save_assignments(booked)
+        return {'assigned': [self._public(r) for r in booked], 'unassigned': unassigned, 'dry_run': dry_run}
+
+    def route_driver(self, route_id):
+        """Id of the driver booked on ``route_id``, or None"""
+        with self._lock:
+            assignment_id = self._by_route.get(route_id)
+            return self.assignments[assignment_id]['driver_id'] if assignment_id else None
+
+    def _public(self, record, now=None):
+        """Copy of ``record`` with its status as of ``now``"""
+        record = dict(record)
+        if record['status'] != CANCELLED:
+            now = minute_iso(to_minute(now or datetime.now()))
+            record['status'] = ('scheduled' if now < record['start'] else
+                                'in_progress' if now < record['end'] else 'completed')
+        return record
+
+    def stats(self):
+        with self._lock:
+            return {
+                'assignments': len(self._blocks),
+                'drivers': sum(1 for s in self.schedules.values() if len(s)),
+                'routes': len(self._by_route)
+            }
+
+
+def _minutes_by_day(blocks):
+    by_day = {}
+    for start, end in blocks:
+        day = start // DAY_MINUTES
+        by_day[day] = by_day.get(day, 0) + end - start
+    return by_day
+
+
+def get_scheduler():
+    """Return the shared scheduler with the assignments stored in the database"""
+    global _scheduler
+    if _scheduler is None:
+        with _lock:
+            if _scheduler is None:
+                from data.storage import get_storage
+
+                # Only the assignments table is written, so an unseeded
+                # database still serves the synthetic fleet
+                storage = get_storage()
+                storage.init_schema()
+                scheduler = Scheduler(storage)
+                since = (datetime.now() - timedelta(days=7)).isoformat(timespec='minutes')
+                scheduler.load(storage.load_assignments(since))
+                _scheduler = scheduler
+    return _scheduler
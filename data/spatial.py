@@ -0,0 +1,189 @@
+"""In-memory grid index of everything on the map: vehicles, live routes,
+waypoints and depots.
+
+Points are bucketed in fixed ``CELL_DEGREES`` lat/lng cells, so moving a point
+costs two dict operations and a query only looks at the cells overlapping its
+area. Candidates from those cells are filtered with a vectorized haversine
+(radius) or coordinate test (bounding box). k-nearest queries run radius
+queries of doubling size until k points are found.
+
+The shared index is seeded from the fleet store (vehicles are placed at the
+depot of the driver they are assigned to) and then kept current by live
+tracking updates, telemetry and ``/api/waypoints``.
+"""
+import math
+import threading
+
+import numpy as np
+
+from data.road_graph import haversine_km
+from data.synthetic_data import HUB_CITIES
+
+CELL_DEGREES = 0.25
+KM_PER_DEGREE = 111.32
+KINDS = ('vehicle', 'route', 'waypoint', 'depot')
+MAX_RADIUS_KM = 5000
+MAX_RESULTS = 1000
+
+_lock = threading.Lock()
+_index = None
+
+
+def _cell(lat, lng):
+    if not (math.isfinite(lat) and math.isfinite(lng)):
+        raise ValueError('Latitude e longitude devem ser números finitos')
+    return math.floor(lat / CELL_DEGREES), math.floor(lng / CELL_DEGREES)
+
+
+class SpatialIndex:
+    """Points keyed by ``(kind, id)`` in a uniform lat/lng grid"""
+
+    def __init__(self):
+        self._points = {}
+        self._cells = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def update(self, kind, item_id, lat, lng, **props):
+        """Insert or move a point; ``props`` are merged into its properties"""
+        key = (kind, str(item_id))
+        cell = _cell(lat, lng)
+        with self._lock:
+            point = self._points.get(key)
+            if point is None:
+                point = self._points[key] = {'kind': kind, 'id': str(item_id)}
+            elif point['cell'] != cell:
+                self._discard(key, point['cell'])
+            point.update(props, lat=lat, lng=lng, cell=cell)
+            self._cells.setdefault(cell, set()).add(key)
+
+    def remove(self, kind, item_id):
+        key = (kind, str(item_id))
+        with self._lock:
+            point = self._points.pop(key, None)
+            if point is not None:
+                self._discard(key, point['cell'])
+        return point is not None
+
+    def remove_kind(self, kind):
+        with self._lock:
+            for key in [k for k in self._points if k[0] == kind]:
+                self._discard(key, self._points.pop(key)['cell'])
+
+    def _discard(self, key, cell):
+        keys = self._cells[cell]
+        keys.discard(key)
+        if not keys:
+            del self._cells[cell]
+
+    def _candidates(self, rows, cols, kinds, where):
+        """Points in the cells ``rows`` x ``cols`` (inclusive ranges)"""
+        (row_min, row_max), (col_min, col_max) = rows, cols
+        with self._lock:
+            if (row_max - row_min + 1) * (col_max - col_min + 1) > len(self._cells):
+                cells = [c for c in self._cells if row_min <= c[0] <= row_max and col_min <= c[1] <= col_max]
+            else:
+                cells = [(r, c) for r in range(row_min, row_max + 1) for c in range(col_min, col_max + 1)]
+            points = [self._points[key] for cell in cells for key in self._cells.get(cell, ())
+                      if kinds is None or key[0] in kinds]
+            points = [dict(p) for p in points if where is None or where(p)]
+        lat = np.array([p['lat'] for p in points], dtype=float)
+        lng = np.array([p['lng'] for p in points], dtype=float)
+        return points, lat, lng
+
+    def within_radius(self, lat, lng, km, kinds=None, where=None, limit=MAX_RESULTS):
+        """Points within ``km`` of (lat, lng), nearest first, with ``distance_km``"""
+        lat_span = km / KM_PER_DEGREE
+        lng_span = km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        row_min, col_min = _cell(lat - lat_span, lng - lng_span)
+        row_max, col_max = _cell(lat + lat_span, lng + lng_span)
+        points, lats, lngs = self._candidates((row_min, row_max), (col_min, col_max), kinds, where)
+        if not points:
+            return []
+        distances = haversine_km(lat, lng, lats, lngs)
+        inside = np.flatnonzero(distances <= km)
+        order = inside[np.argsort(distances[inside], kind='stable')][:limit]
+        return [_public(points[i], round(float(distances[i]), 2)) for i in order.tolist()]
+
+    def in_bbox(self, south, west, north, east, kinds=None, where=None, limit=MAX_RESULTS):
+        """Points inside a bounding box"""
+        row_min, col_min = _cell(south, west)
+        row_max, col_max = _cell(north, east)
+        points, lats, lngs = self._candidates((row_min, row_max), (col_min, col_max), kinds, where)
+        if not points:
+            return []
+        inside = np.flatnonzero((lats >= south) & (lats <= north) & (lngs >= west) & (lngs <= east))
+        return [_public(points[i]) for i in inside[:limit].tolist()]
+
+    def nearest(self, lat, lng, k=5, kinds=None, where=None):
+        """The ``k`` points closest to (lat, lng) within MAX_RADIUS_KM"""
+        km = CELL_DEGREES * KM_PER_DEGREE
+        while True:
+            found = self.within_radius(lat, lng, km, kinds, where, limit=k)
+            if len(found) >= k or km >= MAX_RADIUS_KM:
+                return found
+            km = min(km * 2, MAX_RADIUS_KM)
+
+    def stats(self):
+        with self._lock:
+            counts = {kind: 0 for kind in KINDS}
+            for kind, _ in self._points:
+                counts[kind] = counts.get(kind, 0) + 1
+            return {'points': len(self._points), 'cells': len(self._cells), 'by_kind': counts}
+
+
+def _public(point, distance_km=None):
+    point.pop('cell', None)
+    if distance_km is not None:
+        point['distance_km'] = distance_km
+    return point
+
+
+def index_fleet(index, store):
+    """(Re)load depots and vehicles from the fleet store"""
+    hubs = {hub['name']: hub for hub in HUB_CITIES}
+    index.remove_kind('depot')
+    for hub in HUB_CITIES:
+        index.update('depot', hub['name'], hub['lat'], hub['lng'], name=hub['name'])
+
+    depot_of_plate = {d.vehicle_assigned: d.depot for d in store.drivers}
+    index.remove_kind('vehicle')
+    for vehicle in store.vehicles:
+        hub = hubs.get(depot_of_plate.get(vehicle.plate))
+        if hub is not None:
+            index.update('vehicle', vehicle.id, hub['lat'], hub['lng'], plate=vehicle.plate,
+                         model=vehicle.model, status=vehicle.status)
+
+
+def track_positions(index, positions):
+    """Keep route markers in ``index`` in step with a live position store"""
+    def on_update(route_id, changed):
+        if changed is None:
+            index.remove('route', route_id)
+            return
+        position = changed.get('current_position')
+        if position:
+            index.update('route', route_id, position['lat'], position['lng'])
+
+    positions.subscribe(on_update)
+    _, states = positions.snapshot()
+    for route_id, state in states.items():
+        on_update(route_id, state)
+
+
+def get_spatial_index():
+    """Return the shared index, seeded from the fleet and live positions on first use"""
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                from data.fleet_store import get_fleet_store
+                from data.live_tracking import get_position_store
+
+                index = SpatialIndex()
+                index_fleet(index, get_fleet_store())
+                track_positions(index, get_position_store())
+                _index = index
+    return _index
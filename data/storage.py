@@ -0,0 +1,420 @@
+"""Persistent storage for drivers, vehicles, routes and driver assignments.
+
+SQLite in WAL mode is the default backend (``instance/wise_routes.db``, or
+the file named by ``WISE_ROUTES_DATABASE``): any number of worker processes
+can read while one writes. Connections come from a fixed-size
+``ConnectionPool``; any DB-API driver can be plugged in with
+``set_storage(Storage(ConnectionPool(connect, paramstyle=...)))``.
+
+Queries are module-level constants, so every pooled connection reuses its
+prepared statements, and bulk writes go through ``executemany`` in large
+chunks inside a single transaction.
+
+``get_drivers_data()``, ``get_vehicles_data()`` and ``get_routes_data()``
+keep the signatures of the synthetic generators: each reads its table once
+it has rows and falls back to synthetic data otherwise, and returns
+``data.records`` records. Only
+routes that are not yet completed, or are scheduled from today on, are
+loaded; history stays in the database and is queried with
+``routes_between()``.
+
+Seed the database with ``python -m data.storage seed --history-days 365``.
+"""
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from data import synthetic_data
+from data.paths import instance_path
+from data.records import Driver, Route, RouteStatus, Vehicle, place, plain
+
+DATABASE_PATH = os.environ.get('WISE_ROUTES_DATABASE') or instance_path('wise_routes.db')
+POOL_SIZE = 8
+BULK_CHUNK_SIZE = 5000
+COMPLETED_STATUS = RouteStatus.COMPLETED
+
+DRIVER_COLUMNS = (
+    'id', 'name', 'avg_consumption', 'km_driven', 'efficiency_score', 'penalties', 'bonuses', 'status',
+    'license_number', 'hire_date', 'experience_years', 'safety_score', 'punctuality_score',
+    'training_completed', 'monthly_performance', 'performance_history', 'certifications',
+    'vehicle_assigned', 'depot', 'contact', 'emergency_contact'
+)
+# Nested driver fields, stored as JSON text
+DRIVER_JSON_COLUMNS = ('monthly_performance', 'performance_history', 'certifications', 'contact',
+                       'emergency_contact')
+VEHICLE_COLUMNS = ('id', 'model', 'plate', 'fuel_type', 'avg_consumption', 'cargo_capacity',
+                   'maintenance_cost', 'status')
+ROUTE_COLUMNS = (
+    'id', 'origin_name', 'origin_lat', 'origin_lng', 'destination_name', 'destination_lat',
+    'destination_lng', 'distance', 'estimated_time', 'fuel_cost', 'cargo_weight', 'status', 'date'
+)
+ASSIGNMENT_COLUMNS = ('id', 'driver_id', 'route_id', 'start_at', 'end_at', 'driving_minutes', 'status', 'details',
+                      'idempotency_key', 'created_at')
+CANCELLED_STATUS = 'cancelled'
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS drivers (
+        id INTEGER PRIMARY KEY, name TEXT NOT NULL, avg_consumption REAL, km_driven INTEGER,
+        efficiency_score INTEGER, penalties INTEGER, bonuses INTEGER, status TEXT, license_number TEXT,
+        hire_date TEXT, experience_years INTEGER, safety_score INTEGER, punctuality_score INTEGER,
+        training_completed INTEGER, monthly_performance TEXT, performance_history TEXT, certifications TEXT,
+        vehicle_assigned TEXT, depot TEXT, contact TEXT, emergency_contact TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS vehicles (
+        id INTEGER PRIMARY KEY, model TEXT, plate TEXT NOT NULL, fuel_type TEXT, avg_consumption REAL,
+        cargo_capacity INTEGER, maintenance_cost INTEGER, status TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS routes (
+        id INTEGER PRIMARY KEY, origin_name TEXT, origin_lat REAL, origin_lng REAL,
+        destination_name TEXT, destination_lat REAL, destination_lng REAL, distance INTEGER,
+        estimated_time TEXT, fuel_cost REAL, cargo_weight INTEGER, status TEXT, date TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS assignments (
+        id TEXT PRIMARY KEY, driver_id INTEGER NOT NULL, route_id INTEGER, start_at TEXT NOT NULL,
+        end_at TEXT NOT NULL, driving_minutes INTEGER, status TEXT, details TEXT, idempotency_key TEXT,
+        created_at TEXT
+    )""",
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_vehicles_plate ON vehicles (plate)',
+    'CREATE INDEX IF NOT EXISTS idx_drivers_vehicle ON drivers (vehicle_assigned)',
+    'CREATE INDEX IF NOT EXISTS idx_routes_status ON routes (status)',
+    'CREATE INDEX IF NOT EXISTS idx_routes_date ON routes (date)',
+    'CREATE INDEX IF NOT EXISTS idx_assignments_end ON assignments (end_at)',
+]
+
+
+def _upsert(table, columns):
+    updates = ', '.join(f'{c} = excluded.{c}' for c in columns if c != 'id')
+    return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f'ON CONFLICT (id) DO UPDATE SET {updates}')
+
+
+UPSERT_DRIVER = _upsert('drivers', DRIVER_COLUMNS)
+UPSERT_VEHICLE = _upsert('vehicles', VEHICLE_COLUMNS)
+UPSERT_ROUTE = _upsert('routes', ROUTE_COLUMNS)
+UPSERT_ASSIGNMENT = _upsert('assignments', ASSIGNMENT_COLUMNS)
+SELECT_DRIVERS = f"SELECT {', '.join(DRIVER_COLUMNS)} FROM drivers ORDER BY id"
+SELECT_VEHICLES = f"SELECT {', '.join(VEHICLE_COLUMNS)} FROM vehicles ORDER BY id"
+SELECT_ACTIVE_ROUTES = (f"SELECT {', '.join(ROUTE_COLUMNS)} FROM routes "
+                        'WHERE status <> ? UNION '
+                        f"SELECT {', '.join(ROUTE_COLUMNS)} FROM routes WHERE date >= ? ORDER BY id")
+SELECT_ROUTES_BETWEEN = f"SELECT {', '.join(ROUTE_COLUMNS)} FROM routes WHERE date >= ? AND date <= ? ORDER BY date, id"
+SELECT_ROUTES_BETWEEN_STATUS = (f"SELECT {', '.join(ROUTE_COLUMNS)} FROM routes "
+                                'WHERE date >= ? AND date <= ? AND status = ? ORDER BY date, id')
+DAILY_ROUTE_TOTALS = ('SELECT date, COUNT(*), SUM(distance) FROM routes '
+                      'WHERE status = ? AND date >= ? GROUP BY date ORDER BY date')
+SELECT_ASSIGNMENTS_SINCE = (f"SELECT {', '.join(ASSIGNMENT_COLUMNS)} FROM assignments "
+                            'WHERE end_at >= ? AND status <> ? ORDER BY start_at')
+UPDATE_ASSIGNMENT_STATUS = 'UPDATE assignments SET status = ? WHERE id = ?'
+COUNT_ROWS = {table: f'SELECT COUNT(*) FROM {table}' for table in ('drivers', 'vehicles', 'routes', 'assignments')}
+
+
+class ConnectionPool:
+    """Fixed-size pool of DB-API connections.
+
+    ``connect`` opens a new connection; ``paramstyle`` is the driver's
+    placeholder style ('qmark' or 'format'). The pool is recreated after a
+    fork so worker processes never share a connection.
+    """
+
+    def __init__(self, connect, size=POOL_SIZE, paramstyle='qmark'):
+        self._connect = connect
+        self.size = size
+        self.paramstyle = paramstyle
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def sql(self, query):
+        """Adapt a '?'-placeholder query to the driver's paramstyle"""
+        return query.replace('?', '%s') if self.paramstyle in ('format', 'pyformat') else query
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; the transaction commits on success"""
+        if os.getpid() != self._pid:
+            self._reset()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            conn = self._connect() if can_open else self._idle.get()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+
+class SQLitePool(ConnectionPool):
+    """Pool of SQLite connections in WAL mode"""
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        super().__init__(self._open, size)
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, cached_statements=256)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        return conn
+
+
+def _driver_row(driver):
+    row = []
+    for column in DRIVER_COLUMNS:
+        value = getattr(driver, column)
+        if column in DRIVER_JSON_COLUMNS:
+            value = json.dumps(plain(value), ensure_ascii=False)
+        elif isinstance(value, (datetime, date)):
+            value = value.isoformat()
+        row.append(value)
+    return row
+
+
+def _driver_record(row):
+    driver = dict(zip(DRIVER_COLUMNS, row))
+    for column in DRIVER_JSON_COLUMNS:
+        driver[column] = json.loads(driver[column]) if driver[column] else None
+    if driver['hire_date']:
+        driver['hire_date'] = datetime.fromisoformat(driver['hire_date'])
+    return Driver(**driver)
+
+
+def _route_row(route):
+    origin, destination = route.origin, route.destination
+    return (route.id, origin.name, origin.lat, origin.lng, destination.name, destination.lat, destination.lng,
+            route.distance, route.estimated_time, route.fuel_cost, route.cargo_weight, route.status, route.date)
+
+
+def _route_record(row):
+    (route_id, origin_name, origin_lat, origin_lng, destination_name, destination_lat, destination_lng,
+     distance, estimated_time, fuel_cost, cargo_weight, status, route_date) = row
+    return Route(route_id, place(origin_name, origin_lat, origin_lng),
+                 place(destination_name, destination_lat, destination_lng), distance, estimated_time,
+                 fuel_cost, cargo_weight, status, route_date)
+
+
+def _assignment_row(assignment):
+    details = {k: v for k, v in assignment.items()
+               if k not in ASSIGNMENT_COLUMNS + ('assignment_id', 'start', 'end')}
+    return (assignment['assignment_id'], assignment['driver_id'], assignment['route_id'], assignment['start'],
+            assignment['end'], assignment['driving_minutes'], assignment['status'],
+            json.dumps(details, ensure_ascii=False), assignment.get('idempotency_key'), assignment['created_at'])
+
+
+def _assignment_record(row):
+    (assignment_id, driver_id, route_id, start, end, driving_minutes, status, details, idempotency_key,
+     created_at) = row
+    return dict(json.loads(details) if details else {}, assignment_id=assignment_id, driver_id=driver_id,
+                route_id=route_id, start=start, end=end, driving_minutes=driving_minutes, status=status,
+                idempotency_key=idempotency_key, created_at=created_at)
+
+
+class Storage:
+    """Fleet tables on top of a connection pool"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def init_schema(self):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            for statement in SCHEMA:
+                cursor.execute(statement)
+
+    def _query(self, query, params=()):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self.pool.sql(query), params)
+            return cursor.fetchall()
+
+    def _execute(self, query, params=()):
+        with self.pool.connection() as conn:
+            conn.cursor().execute(self.pool.sql(query), params)
+
+    def bulk_write(self, query, rows):
+        """``executemany`` in chunks, all in one transaction; returns the row count"""
+        count = 0
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) == BULK_CHUNK_SIZE:
+                    cursor.executemany(self.pool.sql(query), chunk)
+                    count += len(chunk)
+                    chunk = []
+            if chunk:
+                cursor.executemany(self.pool.sql(query), chunk)
+                count += len(chunk)
+        return count
+
+    def save_drivers(self, drivers):
+        return self.bulk_write(UPSERT_DRIVER, (_driver_row(d) for d in drivers))
+
+    def save_vehicles(self, vehicles):
+        return self.bulk_write(UPSERT_VEHICLE, ([getattr(v, c) for c in VEHICLE_COLUMNS] for v in vehicles))
+
+    def save_routes(self, routes):
+        return self.bulk_write(UPSERT_ROUTE, (_route_row(r) for r in routes))
+
+    def save_assignments(self, assignments):
+        return self.bulk_write(UPSERT_ASSIGNMENT, (_assignment_row(a) for a in assignments))
+
+    def update_assignment_status(self, assignment_id, status):
+        self._execute(UPDATE_ASSIGNMENT_STATUS, (status, assignment_id))
+
+    def update_driver(self, driver_id, fields):
+        """Write changed driver columns"""
+        columns = [c for c in fields if c in DRIVER_COLUMNS and c not in DRIVER_JSON_COLUMNS]
+        if not columns:
+            return
+        assignments = ', '.join(f'{c} = ?' for c in columns)
+        self._execute(f'UPDATE drivers SET {assignments} WHERE id = ?', [fields[c] for c in columns] + [driver_id])
+
+    def load_drivers(self):
+        return [_driver_record(row) for row in self._query(SELECT_DRIVERS)]
+
+    def load_vehicles(self):
+        return [Vehicle(*row) for row in self._query(SELECT_VEHICLES)]
+
+    def load_active_routes(self, today=None):
+        """Routes not yet completed, plus everything dated from ``today`` on"""
+        today = today or date.today().isoformat()
+        return [_route_record(row) for row in self._query(SELECT_ACTIVE_ROUTES, (COMPLETED_STATUS, today))]
+
+    def routes_between(self, start, end, status=None):
+        """Routes dated between ``start`` and ``end`` (ISO dates, inclusive)"""
+        if status is None:
+            rows = self._query(SELECT_ROUTES_BETWEEN, (start, end))
+        else:
+            rows = self._query(SELECT_ROUTES_BETWEEN_STATUS, (start, end, status))
+        return [_route_record(row) for row in rows]
+
+    def iter_routes_between(self, start, end, batch_size=BULK_CHUNK_SIZE):
+        """Like ``routes_between`` but fetched ``batch_size`` rows at a time"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self.pool.sql(SELECT_ROUTES_BETWEEN), (start, end))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield _route_record(row)
+
+    def load_assignments(self, since):
+        """Assignments that are not cancelled and end at or after ``since`` (ISO datetime)"""
+        return [_assignment_record(row) for row in self._query(SELECT_ASSIGNMENTS_SINCE, (since, CANCELLED_STATUS))]
+
+    def daily_route_totals(self, start, status=COMPLETED_STATUS):
+        """``(date, routes, distance)`` per day since ``start`` for routes in ``status``"""
+        return self._query(DAILY_ROUTE_TOTALS, (status, start))
+
+    def counts(self):
+        return {table: self._query(query)[0][0] for table, query in COUNT_ROWS.items()}
+
+    def has_data(self, table='drivers'):
+        try:
+            return self._query(COUNT_ROWS[table])[0][0] > 0
+        except Exception:
+            # Tables not created yet
+            return False
+
+
+_lock = threading.Lock()
+_storage = None
+
+
+def set_storage(storage):
+    """Use another storage (e.g. a pooled PostgreSQL backend)"""
+    global _storage
+    _storage = storage
+
+
+def get_storage():
+    """Return the configured storage, opening the SQLite database on first use"""
+    global _storage
+    if _storage is None:
+        with _lock:
+            if _storage is None:
+                _storage = Storage(SQLitePool(DATABASE_PATH))
+    return _storage
+
+
+def get_drivers_data():
+    """Drivers from the database, or synthetic drivers when it has none"""
+    storage = get_storage()
+    if storage.has_data():
+        return storage.load_drivers()
+    return [Driver.from_dict(d) for d in synthetic_data.get_drivers_data()]
+
+
+def get_vehicles_data():
+    """Vehicles from the database, or synthetic vehicles when it has none"""
+    storage = get_storage()
+    if storage.has_data('vehicles'):
+        return storage.load_vehicles()
+    return [Vehicle.from_dict(v) for v in synthetic_data.get_vehicles_data()]
+
+
+def get_routes_data():
+    """Active routes from the database, or synthetic routes when it has none"""
+    storage = get_storage()
+    if storage.has_data('routes'):
+        return storage.load_active_routes()
+    return [Route.from_dict(r) for r in synthetic_data.get_routes_data()]
+
+
+def seed(storage, history_days=0, routes_per_day=200):
+    """Fill the database with synthetic fleet data and route history"""
+    storage.init_schema()
+    counts = {
+        'drivers': storage.save_drivers(map(Driver.from_dict, synthetic_data.get_drivers_data())),
+        'vehicles': storage.save_vehicles(map(Vehicle.from_dict, synthetic_data.get_vehicles_data())),
+        'routes': storage.save_routes(map(Route.from_dict, synthetic_data.get_routes_data())),
+    }
+    if history_days:
+        history = synthetic_data.get_route_history(history_days, routes_per_day, first_id=counts['routes'] + 1)
+        counts['history'] = storage.save_routes(map(Route.from_dict, history))
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage the Wise Routes database')
+    parser.add_argument('command', choices=['init', 'seed', 'stats'])
+    parser.add_argument('--history-days', type=int, default=0, help='days of completed route history to seed')
+    parser.add_argument('--routes-per-day', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    storage = get_storage()
+    started = time.perf_counter()
+    if args.command == 'init':
+        storage.init_schema()
+        print(f'Schema criado em {DATABASE_PATH}')
+    elif args.command == 'seed':
+        counts = seed(storage, args.history_days, args.routes_per_day)
+        print(f'{counts} em {time.perf_counter() - started:.2f}s')
+    else:
+        print(storage.counts())
+
+
+if __name__ == '__main__':
+    main()
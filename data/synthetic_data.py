@@ -1,6 +1,15 @@
 import random
 from datetime import datetime, timedelta
 
+# Logistics hubs the fleet plans between
+HUB_CITIES = [
+    {'name': 'Curitiba', 'lat': -25.4284, 'lng': -49.2733},
+    {'name': 'São Paulo', 'lat': -23.5505, 'lng': -46.6333},
+    {'name': 'Rio de Janeiro', 'lat': -22.9068, 'lng': -43.1729},
+    {'name': 'Belo Horizonte', 'lat': -19.9167, 'lng': -43.9345},
+    {'name': 'Porto Alegre', 'lat': -30.0346, 'lng': -51.2177}
+]
+
 def get_dashboard_metrics():
     """Generate enhanced synthetic dashboard metrics"""
     return {
@@ -12,12 +21,6 @@ def get_dashboard_metrics():
         'monthly_fuel_cost': 45780.50,
         'routes_completed_today': 12,
         'pending_routes': 8,
-        'fuel_prices': {
-            'gasolina_comum': 5.89,
-            'gasolina_aditivada': 6.15,
-            'diesel_s10': 5.45,
-            'vale_gasolina': 5.95
-        },
         # Enhanced metrics for advanced dashboard
         'kpis': {
             'punctuality': 94.2,
@@ -84,11 +87,7 @@ def get_dashboard_metrics():
         ],
         'performance_trends': {
             'hourly_routes': [2, 1, 8, 15, 12, 6],
-            'efficiency_trend': [85, 87, 92, 89, 94, 91],
-            'fuel_price_history': {
-                'gasolina': [5.95, 5.92, 5.89, 5.91, 5.89, 5.87, 5.89],
-                'diesel': [5.52, 5.48, 5.45, 5.47, 5.45, 5.43, 5.45]
-            }
+            'efficiency_trend': [85, 87, 92, 89, 94, 91]
         }
     }
 
@@ -138,6 +137,7 @@ def get_drivers_data():
             ],
             'certifications': random.sample(['Direção Defensiva', 'Transporte de Cargas Perigosas', 'Primeiros Socorros', 'Economia de Combustível'], random.randint(1, 3)),
             'vehicle_assigned': f'ABC-{1234 + (i % 10)}',
+            'depot': random.choice(HUB_CITIES)['name'],
             'contact': {
                 'phone': f'(41) 9{random.randint(1000, 9999)}-{random.randint(1000, 9999)}',
                 'email': f'{name.lower().replace(" ", ".")}@wiseroutes.com'
@@ -260,17 +260,10 @@ def get_vehicles_data():
 def get_routes_data():
     """Generate synthetic route data"""
     routes = []
-    cities = [
-        {'name': 'Curitiba', 'lat': -25.4284, 'lng': -49.2733},
-        {'name': 'São Paulo', 'lat': -23.5505, 'lng': -46.6333},
-        {'name': 'Rio de Janeiro', 'lat': -22.9068, 'lng': -43.1729},
-        {'name': 'Belo Horizonte', 'lat': -19.9167, 'lng': -43.9345},
-        {'name': 'Porto Alegre', 'lat': -30.0346, 'lng': -51.2177}
-    ]
     
     for i in range(10):
-        origin = random.choice(cities)
-        destination = random.choice([c for c in cities if c != origin])
+        origin = random.choice(HUB_CITIES)
+        destination = random.choice([c for c in HUB_CITIES if c != origin])
         
         routes.append({
             'id': i + 1,
@@ -280,11 +273,33 @@ def get_routes_data():
             'estimated_time': f"{random.randint(3, 12)}h {random.randint(0, 59)}min",
             'fuel_cost': round(random.uniform(150, 600), 2),
             'cargo_weight': random.randint(5000, 25000),
-            'status': random.choice(['Planejada', 'Em Andamento', 'Concluída'])
+            'status': random.choice(['Planejada', 'Em Andamento', 'Concluída']),
+            'date': datetime.now().strftime('%Y-%m-%d')
         })
     
     return routes
 
+def get_route_history(days=365, routes_per_day=200, first_id=1):
+    """Generate completed routes for the past ``days`` days"""
+    today = datetime.now()
+    route_id = first_id
+    for day in range(days, 0, -1):
+        route_date = (today - timedelta(days=day)).strftime('%Y-%m-%d')
+        for _ in range(routes_per_day):
+            origin, destination = random.sample(HUB_CITIES, 2)
+            yield {
+                'id': route_id,
+                'origin': origin,
+                'destination': destination,
+                'distance': random.randint(200, 800),
+                'estimated_time': f"{random.randint(3, 12)}h {random.randint(0, 59)}min",
+                'fuel_cost': round(random.uniform(150, 600), 2),
+                'cargo_weight': random.randint(5000, 25000),
+                'status': 'Concluída',
+                'date': route_date
+            }
+            route_id += 1
+
 def get_weather_data():
     """Generate synthetic weather data"""
     cities = ['Curitiba', 'São Paulo', 'Rio de Janeiro', 'Belo Horizonte', 'Porto Alegre']
@@ -303,30 +318,3 @@ def get_weather_data():
         })
     
     return weather
-
-def get_cost_analysis():
-    """Generate synthetic cost analysis data"""
-    return {
-        'operational_costs': {
-            'fuel': 45780.50,
-            'maintenance': 12500.00,
-            'tolls': 8900.00,
-            'insurance': 3200.00,
-            'driver_salaries': 28000.00
-        },
-        'cost_per_km': 2.85,
-        'monthly_savings': 15.2,
-        'electric_vehicle_analysis': {
-            'initial_investment': 450000.00,
-            'monthly_energy_cost': 8500.00,
-            'payback_period': '3.2 anos',
-            'co2_reduction': '65%'
-        },
-        'efficiency_trends': [
-            {'month': 'Jan', 'efficiency': 8.2},
-            {'month': 'Fev', 'efficiency': 8.5},
-            {'month': 'Mar', 'efficiency': 8.8},
-            {'month': 'Abr', 'efficiency': 8.6},
-            {'month': 'Mai', 'efficiency': 9.1}
-        ]
-    }
@@ -0,0 +1,271 @@
+"""Vehicle telemetry ingestion into per-vehicle columnar ring buffers.
+
+Samples arrive in batches, either as JSON or in a compact binary framing:
+
+    b'WRT1' | uint32 count | count x SAMPLE_DTYPE records (little-endian)
+
+Each vehicle owns a fixed-size NumPy ring buffer, so memory is bounded by
+``BUFFER_CAPACITY`` samples per vehicle no matter how fast samples arrive,
+and by ``MAX_VEHICLES`` buffers (the least recently fed one is evicted).
+``ingest()`` can be limited to known vehicle ids. ``flush()`` appends
+everything written since the last successful flush to a Parquet file under
+``instance/telemetry/``; ``start_flusher()`` runs it periodically.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from data.paths import instance_path
+
+SAMPLE_DTYPE = np.dtype([
+    ('vehicle_id', '<u4'),
+    ('route_id', '<u4'),
+    ('ts', '<f8'),
+    ('lat', '<f8'),
+    ('lng', '<f8'),
+    ('speed_kmh', '<f4'),
+    ('fuel_level', '<f4'),
+    ('odometer_km', '<f8'),
+    ('engine_rpm', '<f4'),
+])
+ID_FIELDS = ('vehicle_id', 'route_id')
+VALUE_FIELDS = tuple(name for name in SAMPLE_DTYPE.names if name not in ID_FIELDS)
+MAX_ID = 2 ** 32 - 1
+FRAME_MAGIC = b'WRT1'
+FRAME_HEADER_SIZE = 8
+BUFFER_CAPACITY = 3600
+MAX_VEHICLES = int(os.environ.get('WISE_ROUTES_TELEMETRY_VEHICLES', 0)) or 2000
+MAX_BATCH_SIZE = 100000
+FLUSH_DIR = 'telemetry'
+
+_store = None
+_flusher = None
+_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
+
+def decode_frame(payload):
+    """Decode a binary telemetry frame into a SAMPLE_DTYPE array"""
+    if len(payload) < FRAME_HEADER_SIZE or payload[:4] != FRAME_MAGIC:
+        raise ValueError('Frame de telemetria inválido')
+    count = int.from_bytes(payload[4:8], 'little')
+    if len(payload) != FRAME_HEADER_SIZE + count * SAMPLE_DTYPE.itemsize:
+        raise ValueError('Tamanho do frame não corresponde ao número de amostras')
+    return np.frombuffer(payload, SAMPLE_DTYPE, count, FRAME_HEADER_SIZE)
+
+
+def encode_frame(samples):
+    """Encode a SAMPLE_DTYPE array as a binary telemetry frame"""
+    samples = np.ascontiguousarray(samples, dtype=SAMPLE_DTYPE)
+    return FRAME_MAGIC + len(samples).to_bytes(4, 'little') + samples.tobytes()
+
+
+def samples_from_json(records):
+    """Build a SAMPLE_DTYPE array from a list of JSON sample dicts"""
+    if not all('vehicle_id' in r for r in records):
+        raise ValueError('Toda amostra precisa de vehicle_id')
+    # Ids are unsigned 32-bit: anything else would overflow the column
+    for name in ID_FIELDS:
+        if not all(isinstance(v, int) and not isinstance(v, bool) and 0 <= v <= MAX_ID
+                   for v in (r.get(name, 0) for r in records)):
+            raise ValueError(f'{name} deve ser um inteiro entre 0 e {MAX_ID}')
+    samples = np.zeros(len(records), SAMPLE_DTYPE)
+    now = time.time()
+    for name in SAMPLE_DTYPE.names:
+        default = now if name == 'ts' else 0
+        samples[name] = [r.get(name, default) for r in records]
+    return samples
+
+
+class RingBuffer:
+    """Fixed-capacity columnar buffer of the latest samples of one vehicle"""
+
+    def __init__(self, capacity=BUFFER_CAPACITY):
+        self.data = np.zeros(capacity, SAMPLE_DTYPE)
+        self.capacity = capacity
+        self.written = 0
+        self.flushed = 0
+
+    def append(self, samples):
+        if len(samples) > self.capacity:
+            self.written += len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+        start = self.written % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self.data[start:start + first] = samples[:first]
+        self.data[:len(samples) - first] = samples[first:]
+        self.written += len(samples)
+
+    def tail(self, count):
+        """The last ``count`` samples, oldest first"""
+        count = min(count, self.written, self.capacity)
+        end = self.written % self.capacity
+        if count <= end:
+            return self.data[end - count:end].copy()
+        return np.concatenate([self.data[self.capacity - (count - end):], self.data[:end]])
+
+    def unflushed(self):
+        """Samples written since the last flush, how many were overwritten, and
+        the write count to pass to ``mark_flushed`` once they are on disk"""
+        pending = self.written - self.flushed
+        dropped = max(pending - self.capacity, 0)
+        return self.tail(pending - dropped), dropped, self.written
+
+    def mark_flushed(self, written):
+        self.flushed = max(self.flushed, written)
+
+
+class TelemetryStore:
+    """Ring buffers keyed by vehicle id"""
+
+    def __init__(self, capacity=BUFFER_CAPACITY, max_vehicles=MAX_VEHICLES):
+        self.capacity = capacity
+        self.max_vehicles = max_vehicles
+        self._buffers = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_samples = 0
+        self.dropped_samples = 0
+        self.rejected_samples = 0
+
+    def ingest(self, samples, vehicle_ids=None):
+        """Append a batch; returns ``(latest sample of each vehicle, rejected count)``
+
+        With ``vehicle_ids``, samples of any other vehicle are rejected. A
+        batch with a non-finite value raises ValueError before anything is
+        written.
+        """
+        if len(samples) > MAX_BATCH_SIZE:
+            raise ValueError(f'Máximo de {MAX_BATCH_SIZE} amostras por lote')
+        for name in VALUE_FIELDS:
+            if not np.isfinite(samples[name]).all():
+                raise ValueError(f'{name} deve ser um número finito')
+        rejected = 0
+        if vehicle_ids is not None:
+            known = np.isin(samples['vehicle_id'], np.fromiter(vehicle_ids, np.int64))
+            rejected = int(len(samples) - known.sum())
+            if rejected:
+                samples = samples[known]
+        # Group by vehicle keeping arrival order inside each vehicle
+        order = np.argsort(samples['vehicle_id'], kind='stable')
+        grouped = samples[order]
+        ids, starts = np.unique(grouped['vehicle_id'], return_index=True)
+        ends = np.append(starts[1:], len(grouped))
+        latest = {}
+        with self._lock:
+            for vehicle_id, start, end in zip(ids.tolist(), starts, ends):
+                buffer = self._buffers.get(vehicle_id)
+                if buffer is None:
+                    buffer = self._buffers[vehicle_id] = RingBuffer(self.capacity)
+                    self._evict()
+                else:
+                    self._buffers.move_to_end(vehicle_id)
+                buffer.append(grouped[start:end])
+                latest[vehicle_id] = grouped[end - 1]
+            self.total_samples += len(samples)
+            self.rejected_samples += rejected
+        return latest, rejected
+
+    def _evict(self):
+        while len(self._buffers) > self.max_vehicles:
+            _, buffer = self._buffers.popitem(last=False)
+            self.dropped_samples += buffer.written - buffer.flushed
+
+    def recent(self, vehicle_id, count=BUFFER_CAPACITY):
+        with self._lock:
+            buffer = self._buffers.get(vehicle_id)
+            return buffer.tail(count) if buffer is not None else np.zeros(0, SAMPLE_DTYPE)
+
+    def vehicle_summary(self, vehicle_id):
+        """Driving statistics over the buffered samples of one vehicle"""
+        samples = self.recent(vehicle_id)
+        if not len(samples):
+            return None
+        last = samples[-1]
+        return {
+            'vehicle_id': vehicle_id,
+            'samples': int(len(samples)),
+            'since': datetime.fromtimestamp(float(samples['ts'][0])).isoformat(),
+            'last_seen': datetime.fromtimestamp(float(last['ts'])).isoformat(),
+            'last_position': {'lat': float(last['lat']), 'lng': float(last['lng'])},
+            'avg_speed_kmh': round(float(samples['speed_kmh'].mean()), 1),
+            'max_speed_kmh': round(float(samples['speed_kmh'].max()), 1),
+            'distance_km': round(float(samples['odometer_km'][-1] - samples['odometer_km'][0]), 1),
+            'fuel_used_percent': round(float(samples['fuel_level'][0] - samples['fuel_level'][-1]), 1),
+            'avg_engine_rpm': round(float(samples['engine_rpm'].mean()))
+        }
+
+    def flush(self):
+        """Write unflushed samples of every vehicle to a Parquet file.
+
+        Buffers are marked flushed only after the file is written, so a failed
+        write is retried with the same samples on the next call.
+        """
+        with self._lock:
+            parts, marks = [], []
+            for buffer in self._buffers.values():
+                samples, dropped, written = buffer.unflushed()
+                marks.append((buffer, dropped, written))
+                if len(samples):
+                    parts.append(samples)
+        path = None
+        if parts:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            samples = np.concatenate(parts)
+            table = pa.table({name: samples[name] for name in SAMPLE_DTYPE.names})
+            path = instance_path(FLUSH_DIR, f"telemetry-{datetime.now():%Y%m%d-%H%M%S-%f}.parquet")
+            pq.write_table(table, f'{path}.tmp')
+            os.replace(f'{path}.tmp', path)
+        with self._lock:
+            for buffer, dropped, written in marks:
+                buffer.mark_flushed(written)
+                self.dropped_samples += dropped
+        return path
+
+    def stats(self):
+        with self._lock:
+            return {
+                'vehicles': len(self._buffers),
+                'total_samples': self.total_samples,
+                'dropped_samples': self.dropped_samples,
+                'rejected_samples': self.rejected_samples,
+                'max_vehicles': self.max_vehicles,
+                'buffer_capacity': self.capacity
+            }
+
+
+def get_telemetry_store():
+    """Return the shared telemetry store"""
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                _store = TelemetryStore()
+    return _store
+
+
+def start_flusher(interval=60.0):
+    """Flush the shared store to disk every ``interval`` seconds"""
+    global _flusher
+    store = get_telemetry_store()
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                store.flush()
+            except Exception:
+                # Nothing was marked flushed; the next run writes these samples again
+                logger.exception('Falha ao gravar telemetria em disco')
+
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=run, name='telemetry-flusher', daemon=True)
+            _flusher.start()
+    return _flusher
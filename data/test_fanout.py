@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+
+from data import fanout
+
+
+def _wait_remembered(*keys):
+    deadline = time.monotonic() + 5
+    while not all(key in fanout._last_known and key not in fanout._in_flight for key in keys):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_pages_sharing_a_source_name_get_their_own_data():
+    release = threading.Event()
+
+    def slow_all_routes():
+        release.wait(5)
+        return ['all']
+
+    # The map's fetch is still in flight while the drivers page asks for its own 'routes'
+    started = threading.Thread(target=fanout.gather, args=('test_map', {'routes': slow_all_routes}))
+    started.start()
+    try:
+        results, stale = fanout.gather('test_drivers', {'routes': lambda: ['pending']})
+        assert results == {'routes': ['pending']}
+        assert stale == []
+    finally:
+        release.set()
+        started.join()
+    _wait_remembered('test_map.routes', 'test_drivers.routes')
+
+    # Each page falls back on its own last known value
+    blocked = threading.Event()
+    try:
+        for page, expected in (('test_map', ['all']), ('test_drivers', ['pending'])):
+            results, stale = fanout.gather(page, {'routes': lambda: blocked.wait(5)}, timeout=0.05)
+            assert results == {'routes': expected}
+            assert stale == ['routes']
+    finally:
+        blocked.set()
+
+
+def test_a_source_without_a_last_known_value_still_times_out():
+    release = threading.Event()
+    started = time.monotonic()
+    try:
+        with pytest.raises(fanout.SourceUnavailable):
+            fanout.gather('test_cold', {'slow': lambda: release.wait(5) and 'late'}, timeout=0.05)
+        assert time.monotonic() - started < 1
+    finally:
+        release.set()
+    # The fetch kept running and is the fallback from now on
+    _wait_remembered('test_cold.slow')
+    blocked = threading.Event()
+    try:
+        results, stale = fanout.gather('test_cold', {'slow': lambda: blocked.wait(5)}, timeout=0.05)
+        assert (results, stale) == ({'slow': 'late'}, ['slow'])
+    finally:
+        blocked.set()
@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+from data.importer import coerce_chunk
+
+DRIVER = {'id': '1', 'name': 'Ana', 'avg_consumption': '3,2', 'efficiency_score': '90', 'safety_score': '95',
+          'punctuality_score': '88'}
+
+
+def test_valid_driver_rows_are_imported():
+    records, rejected = coerce_chunk(pd.DataFrame([DRIVER]), 'drivers')
+    assert rejected == []
+    assert records[0].avg_consumption == 3.2
+
+
+@pytest.mark.parametrize('column, value', [
+    ('avg_consumption', '0'),
+    ('avg_consumption', '-1'),
+    ('avg_consumption', 'inf'),
+    ('avg_consumption', 'nan'),
+    ('efficiency_score', '101'),
+    ('safety_score', '-5'),
+    ('km_driven', '-10'),
+    ('training_completed', '150'),
+])
+def test_driver_rows_out_of_range_are_rejected(column, value):
+    records, rejected = coerce_chunk(pd.DataFrame([dict(DRIVER, **{column: value})]), 'drivers')
+    assert records == []
+    assert rejected == [(0, f'{column} inválido')]
+
+
+def test_routes_with_non_finite_costs_are_rejected():
+    route = {'id': '7', 'origin_name': 'Curitiba', 'origin_lat': '-25.4', 'origin_lng': '-49.3',
+             'destination_name': 'Londrina', 'destination_lat': '-23.3', 'destination_lng': '-51.2',
+             'distance': '380', 'fuel_cost': 'inf'}
+    records, rejected = coerce_chunk(pd.DataFrame([route]), 'routes')
+    assert (records, rejected) == ([], [(0, 'fuel_cost inválido')])
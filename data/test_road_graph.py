@@ -0,0 +1,25 @@
+import math
+
+import pytest
+
+from benchmarks.road_graph import far_pairs, grid_graph
+from data.road_graph import DIESEL_PRICE, METRICS
+
+
+def _cost(metric, distance, duration, fuel, toll):
+    return {'fastest': duration, 'shortest': distance, 'economical': fuel * DIESEL_PRICE + toll}[metric]
+
+
+@pytest.mark.parametrize('metric', METRICS)
+@pytest.mark.parametrize('avoid_tolls', [False, True])
+def test_a_star_matches_dijkstra_on_a_generated_state_grid(metric, avoid_tolls):
+    graph = grid_graph(2500, seed=3)
+    for source, target in far_pairs(graph, 5, seed=3):
+        path = graph.shortest_path(source, target, metric, avoid_tolls)
+        tree = [column[target] for column in graph.shortest_path_tree(source, metric, avoid_tolls)]
+        if path is None:
+            assert math.isinf(tree[0])
+            continue
+        assert (path['nodes'][0], path['nodes'][-1]) == (source, target)
+        found = _cost(metric, path['distance_km'], path['duration_min'], path['fuel_liters'], path['toll_cost'])
+        assert found == pytest.approx(_cost(metric, *tree), rel=1e-4)
@@ -0,0 +1,176 @@
+from datetime import date, timedelta
+
+import pytest
+
+from data.records import Driver, Route, place
+from data.scheduler import (
+    MAX_WEEKLY_DRIVING_MINUTES, ScheduleConflict, Scheduler, duration_minutes, minute_iso, to_minute
+)
+from data.storage import SQLitePool, Storage
+
+CURITIBA = place('Curitiba', -25.4284, -49.2733)
+SAO_PAULO = place('São Paulo', -23.5505, -46.6333)
+# Next Monday, so every slot is in the future and the week starts on day one
+MONDAY = date.today() + timedelta(days=7 - date.today().weekday())
+
+
+def day(offset=0):
+    return (MONDAY + timedelta(days=offset)).isoformat()
+
+
+def at(offset, clock):
+    return to_minute(f'{day(offset)}T{clock}')
+
+
+def driver(driver_id=1, efficiency=90, depot='Curitiba'):
+    return Driver(id=driver_id, name=f'Motorista {driver_id}', avg_consumption=3.0, km_driven=0,
+                  efficiency_score=efficiency, depot=depot)
+
+
+def route(route_id=1, estimated_time='2h 0min', route_date=None):
+    return Route(id=route_id, origin=CURITIBA, destination=SAO_PAULO, distance=400,
+                 estimated_time=estimated_time, date=route_date)
+
+
+def test_long_route_takes_a_break_and_rests_after_the_daily_limit():
+    scheduler = Scheduler()
+    assignment, created = scheduler.assign(driver(), route(), at(0, '08:00'), duration=720)
+
+    assert created
+    # 5h30 driving, 30min break, 4h30 driving (10h for the day), 11h rest, 2h driving
+    assert assignment['driving_blocks'] == [
+        [f'{day(0)}T08:00', f'{day(0)}T13:30'],
+        [f'{day(0)}T14:00', f'{day(0)}T18:30'],
+        [f'{day(1)}T05:30', f'{day(1)}T07:30'],
+    ]
+    assert assignment['end'] == f'{day(1)}T07:30'
+    hours = scheduler.schedule(1, day(0), days=2)['hours']
+    assert [h['driving_minutes'] for h in hours] == [600, 120]
+    assert hours[0]['remaining_minutes'] == 0
+
+
+def test_weekly_limit_rejects_without_booking():
+    scheduler = Scheduler()
+    for offset in range(5):
+        scheduler.assign(driver(), route(offset + 1), at(offset, '08:00'), duration=600)
+
+    with pytest.raises(ScheduleConflict, match='Limite semanal'):
+        scheduler.assign(driver(), route(6), at(5, '08:00'), duration=600)
+    assert scheduler.route_driver(6) is None
+
+    # What is left of the week still fits
+    left = MAX_WEEKLY_DRIVING_MINUTES - 5 * 600
+    scheduler.assign(driver(), route(6), at(5, '08:00'), duration=left)
+    assert scheduler.schedule(1, day(0))['week_remaining_minutes'] == 0
+
+
+def test_overlapping_and_too_close_assignments_conflict():
+    scheduler = Scheduler()
+    first, _ = scheduler.assign(driver(), route(1), at(0, '08:00'))
+
+    with pytest.raises(ScheduleConflict, match=first['assignment_id']):
+        scheduler.assign(driver(), route(2), at(0, '09:00'))
+    # The next assignment needs the 30min turnaround after the first one ends at 10:00
+    with pytest.raises(ScheduleConflict):
+        scheduler.assign(driver(), route(2), at(0, '10:10'))
+    _, created = scheduler.assign(driver(), route(2), at(0, '10:30'))
+    assert created
+
+    # Another driver is free, but the route is taken
+    with pytest.raises(ScheduleConflict, match='já atribuída'):
+        scheduler.assign(driver(2), route(1), at(1, '08:00'))
+
+
+def test_repeated_requests_return_the_existing_assignment():
+    scheduler = Scheduler()
+    first, created = scheduler.assign(driver(), route(1), at(0, '08:00'), idempotency_key='k1')
+    assert created
+
+    again, created = scheduler.assign(driver(), route(1), at(0, '08:00'))
+    assert not created
+    assert again['assignment_id'] == first['assignment_id']
+    again, created = scheduler.assign(driver(), route(1), at(0, '08:00'), idempotency_key='k1')
+    assert not created
+    assert again['assignment_id'] == first['assignment_id']
+    assert scheduler.stats()['assignments'] == 1
+
+    with pytest.raises(ScheduleConflict, match='idempotência'):
+        scheduler.assign(driver(), route(2), at(1, '08:00'), idempotency_key='k1')
+
+
+def test_cancel_frees_the_slot():
+    scheduler = Scheduler()
+    first, _ = scheduler.assign(driver(), route(1), at(0, '08:00'))
+
+    assert scheduler.cancel(first['assignment_id'])['status'] == 'cancelled'
+    assert scheduler.route_driver(1) is None
+    _, created = scheduler.assign(driver(2), route(1), at(0, '08:00'))
+    assert created
+
+
+def test_cancel_releases_the_idempotency_key():
+    scheduler = Scheduler()
+    first, _ = scheduler.assign(driver(), route(1), at(0, '08:00'), idempotency_key='k1')
+    scheduler.cancel(first['assignment_id'])
+
+    again, created = scheduler.assign(driver(), route(1), at(0, '08:00'), idempotency_key='k1')
+    assert created
+    assert again['assignment_id'] != first['assignment_id']
+    assert again['status'] == 'scheduled'
+
+
+@pytest.mark.parametrize('value, minutes', [
+    (90, 90), (90.5, 90), ('5h 30min', 330), ('2h', 120), (MAX_WEEKLY_DRIVING_MINUTES, MAX_WEEKLY_DRIVING_MINUTES),
+    (MAX_WEEKLY_DRIVING_MINUTES + 1, None), ('99999999h', None), (1e8, None), (float('inf'), None),
+    (float('nan'), None), (0, None), (-5, None), (True, None), ([1], None), ({}, None), ('', None), ('soon', None),
+])
+def test_duration_minutes(value, minutes):
+    assert duration_minutes(value) == minutes
+
+
+def test_routes_longer_than_a_week_of_driving_are_refused():
+    scheduler = Scheduler()
+    with pytest.raises(ScheduleConflict, match='Limite semanal'):
+        scheduler.assign(driver(), route(1), at(0, '08:00'), duration=10 ** 8)
+    assert scheduler.stats()['assignments'] == 0
+
+    far = Route(id=1, origin=CURITIBA, destination=SAO_PAULO, distance=10 ** 6, estimated_time=None, date=day(0))
+    result = scheduler.auto_assign([driver()], [far], day(0))
+    assert result['assigned'] == []
+    assert result['unassigned'][0]['route_id'] == 1
+
+
+def test_assignments_survive_a_restart(tmp_path):
+    storage = Storage(SQLitePool(str(tmp_path / 'schedule.db')))
+    storage.init_schema()
+    scheduler = Scheduler(storage)
+    kept, _ = scheduler.assign(driver(), route(1), at(0, '08:00'), idempotency_key='k1')
+    cancelled, _ = scheduler.assign(driver(), route(2), at(1, '08:00'))
+    scheduler.cancel(cancelled['assignment_id'])
+
+    restarted = Scheduler(storage)
+    restarted.load(storage.load_assignments(f'{day(0)}T00:00'))
+    assert restarted.route_driver(1) == 1
+    assert restarted.route_driver(2) is None
+    again, created = restarted.assign(driver(), route(1), at(0, '08:00'), idempotency_key='k1')
+    assert not created
+    assert again['assignment_id'] == kept['assignment_id']
+
+
+def test_auto_assign_dry_run_books_nothing():
+    scheduler = Scheduler()
+    drivers = [driver(1, efficiency=70), driver(2, efficiency=95, depot='São Paulo')]
+    routes = [route(1, route_date=day(0)), route(2, route_date=day(0)), route(3, route_date=day(10))]
+
+    preview = scheduler.auto_assign(drivers, routes, day(0), days=7, dry_run=True)
+    assert preview['dry_run']
+    assert [a['route_id'] for a in preview['assigned']] == [1, 2]
+    assert scheduler.stats() == {'assignments': 0, 'drivers': 0, 'routes': 0}
+    assert scheduler.route_driver(1) is None
+
+    # The real run makes the same choices
+    result = scheduler.auto_assign(drivers, routes, day(0), days=7)
+    assert [(a['route_id'], a['driver_id'], a['start']) for a in result['assigned']] == \
+        [(a['route_id'], a['driver_id'], a['start']) for a in preview['assigned']]
+    assert scheduler.stats()['assignments'] == 2
+    assert minute_iso(at(0, '08:00')) <= result['assigned'][0]['start']
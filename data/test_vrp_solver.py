@@ -0,0 +1,37 @@
+import pytest
+
+from data.records import Vehicle
+from data.vrp_solver import MAX_DELIVERIES, solve_cvrp
+
+DEPOT = {'lat': -25.43, 'lng': -49.27}
+
+
+def vehicle(vehicle_id=1, capacity=1000):
+    return Vehicle(id=vehicle_id, model='Truck', plate=f'ABC-{vehicle_id:04d}', cargo_capacity=capacity)
+
+
+def delivery(i, weight=100.0):
+    return {'id': i, 'lat': -25.43 + i * 0.01, 'lng': -49.27 + i * 0.01, 'weight': weight}
+
+
+def test_stops_are_packed_within_capacity():
+    plan = solve_cvrp(DEPOT, [delivery(i, 300) for i in range(1, 6)], [vehicle(1), vehicle(2)], time_budget=0.1)
+    assert sorted(s for t in plan['tours'] for s in t['stops']) == [1, 2, 3, 4, 5]
+    assert all(t['load'] <= t['cargo_capacity'] for t in plan['tours'])
+    assert plan['unassigned'] == []
+
+
+@pytest.mark.parametrize('weight', [float('nan'), float('inf'), -1.0])
+def test_invalid_weights_are_rejected(weight):
+    with pytest.raises(ValueError, match='Peso inválido'):
+        solve_cvrp(DEPOT, [delivery(1, weight)], [vehicle()])
+
+
+def test_vehicles_without_capacity_are_rejected():
+    with pytest.raises(ValueError, match='Capacidade'):
+        solve_cvrp(DEPOT, [delivery(1, 0.0)], [vehicle(capacity=0)])
+
+
+def test_too_many_deliveries_are_rejected():
+    with pytest.raises(ValueError, match='Máximo'):
+        solve_cvrp(DEPOT, [delivery(i) for i in range(MAX_DELIVERIES + 1)], [vehicle()])
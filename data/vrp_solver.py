@@ -0,0 +1,212 @@
+"""Capacity-constrained multi-stop vehicle routing (CVRP).
+
+Deliveries are assigned to vehicles with a sweep heuristic around the depot:
+stops are visited in polar-angle order and packed into vehicles until their
+``cargo_capacity`` is reached. Stops that do not fit are then offered to any
+vehicle with spare capacity by cheapest insertion. Each tour is built
+nearest-neighbour and improved with 2-opt and or-opt moves until no move
+helps or the time budget runs out.
+
+Distances are great-circle km scaled by ``ROAD_FACTOR``; stops are arbitrary
+coordinates, not road graph nodes.
+"""
+import math
+import time
+
+import numpy as np
+
+from data.road_graph import haversine_km
+
+ROAD_FACTOR = 1.25
+AVG_SPEED_KMH = 70
+DEFAULT_TIME_BUDGET = 2.0
+MAX_TIME_BUDGET = 30.0
+# The distance matrix is n x n Python floats
+MAX_DELIVERIES = 1000
+
+
+def distance_matrix_km(points):
+    """Road-estimated km between every pair of (lat, lng) points"""
+    lat = np.array([p[0] for p in points])
+    lng = np.array([p[1] for p in points])
+    return haversine_km(lat[:, None], lng[:, None], lat[None, :], lng[None, :]) * ROAD_FACTOR
+
+
+def solve_cvrp(depot, deliveries, vehicles, time_budget=DEFAULT_TIME_BUDGET):
+    """Assign deliveries to vehicles and order each tour.
+
+    ``depot`` is ``{'lat', 'lng'}``, ``deliveries`` are dicts with ``id``,
+    ``lat``, ``lng`` and ``weight`` and ``vehicles`` are ``Vehicle`` records.
+    Returns ``{'tours', 'unassigned', ...}``. Raises ValueError for more than
+    MAX_DELIVERIES stops, negative or non-finite weights and vehicles without
+    a positive cargo capacity.
+    """
+    started = time.perf_counter()
+    deadline = started + min(max(float(time_budget), 0.0), MAX_TIME_BUDGET)
+    if len(deliveries) > MAX_DELIVERIES:
+        raise ValueError(f'Máximo de {MAX_DELIVERIES} entregas por plano')
+    for stop in deliveries:
+        if not math.isfinite(stop['weight']) or stop['weight'] < 0:
+            raise ValueError(f"Peso inválido na entrega {stop['id']}")
+    for vehicle in vehicles:
+        if not math.isfinite(vehicle.cargo_capacity) or vehicle.cargo_capacity <= 0:
+            raise ValueError(f'Capacidade de carga inválida no veículo {vehicle.id}')
+
+    # Node 0 is the depot, node i is deliveries[i - 1]
+    points = [(depot['lat'], depot['lng'])] + [(s['lat'], s['lng']) for s in deliveries]
+    d = distance_matrix_km(points).tolist()
+    weights = [0.0] + [float(s['weight']) for s in deliveries]
+
+    fleet = sorted(vehicles, key=lambda v: v.cargo_capacity, reverse=True)
+    assigned, unassigned = _sweep(points, weights, [v.cargo_capacity for v in fleet])
+    tours = [_nearest_neighbour(nodes, d) for nodes in assigned]
+    unassigned = _insert_leftovers(tours, unassigned, d, weights, [v.cargo_capacity for v in fleet])
+
+    for i, tour in enumerate(tours):
+        # Share what is left of the budget among the remaining tours
+        remaining = deadline - time.perf_counter()
+        _improve(tour, d, time.perf_counter() + remaining / (len(tours) - i))
+
+    result_tours = []
+    for vehicle, tour in zip(fleet, tours):
+        if len(tour) <= 2:
+            continue
+        distance = _tour_length(tour, d)
+        load = sum(weights[n] for n in tour)
+        result_tours.append({
+            'vehicle_id': vehicle.id,
+            'plate': vehicle.plate,
+            'model': vehicle.model,
+            'cargo_capacity': vehicle.cargo_capacity,
+            'load': round(load, 1),
+            'utilization': round(load / vehicle.cargo_capacity * 100, 1),
+            'stops': [deliveries[n - 1]['id'] for n in tour[1:-1]],
+            'distance_km': round(distance, 1),
+            'duration_minutes': int(distance / AVG_SPEED_KMH * 60)
+        })
+
+    return {
+        'tours': result_tours,
+        'unassigned': [deliveries[n - 1]['id'] for n in unassigned],
+        'total_distance_km': round(sum(t['distance_km'] for t in result_tours), 1),
+        'vehicles_used': len(result_tours),
+        'solve_time_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def _sweep(points, weights, capacities):
+    """Pack stops into vehicles in polar-angle order around the depot"""
+    depot_lat, depot_lng = points[0]
+    angles = sorted(
+        (math.atan2(lat - depot_lat, lng - depot_lng), n)
+        for n, (lat, lng) in enumerate(points) if n
+    )
+    # Start the sweep at the widest angular gap so clusters are not split
+    if len(angles) > 1:
+        gaps = [(angles[(i + 1) % len(angles)][0] - angles[i][0]) % (2 * math.pi) for i in range(len(angles))]
+        start = (gaps.index(max(gaps)) + 1) % len(angles)
+        angles = angles[start:] + angles[:start]
+
+    assigned = [[] for _ in capacities]
+    loads = [0.0] * len(capacities)
+    unassigned = []
+    vehicle = 0
+    for _, n in angles:
+        while vehicle < len(capacities) and loads[vehicle] + weights[n] > capacities[vehicle]:
+            vehicle += 1
+        if vehicle == len(capacities):
+            unassigned.append(n)
+            continue
+        assigned[vehicle].append(n)
+        loads[vehicle] += weights[n]
+    return assigned, unassigned
+
+
+def _nearest_neighbour(nodes, d):
+    tour = [0]
+    remaining = set(nodes)
+    while remaining:
+        last = d[tour[-1]]
+        nearest = min(remaining, key=last.__getitem__)
+        tour.append(nearest)
+        remaining.remove(nearest)
+    tour.append(0)
+    return tour
+
+
+def _insert_leftovers(tours, unassigned, d, weights, capacities):
+    """Cheapest insertion of leftover stops into tours with spare capacity"""
+    loads = [sum(weights[n] for n in tour) for tour in tours]
+    still_unassigned = []
+    for n in sorted(unassigned, key=lambda n: -weights[n]):
+        best = None
+        for t, tour in enumerate(tours):
+            if loads[t] + weights[n] > capacities[t]:
+                continue
+            for i in range(len(tour) - 1):
+                delta = d[tour[i]][n] + d[n][tour[i + 1]] - d[tour[i]][tour[i + 1]]
+                if best is None or delta < best[0]:
+                    best = (delta, t, i + 1)
+        if best is None:
+            still_unassigned.append(n)
+            continue
+        _, t, position = best
+        tours[t].insert(position, n)
+        loads[t] += weights[n]
+    return still_unassigned
+
+
+def _tour_length(tour, d):
+    return sum(d[a][b] for a, b in zip(tour, tour[1:]))
+
+
+def _improve(tour, d, deadline):
+    """Alternate 2-opt and or-opt passes until neither improves"""
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = _two_opt(tour, d, deadline)
+        improved = _or_opt(tour, d, deadline) or improved
+
+
+def _two_opt(tour, d, deadline):
+    improved = False
+    n = len(tour)
+    for i in range(1, n - 2):
+        if time.perf_counter() > deadline:
+            break
+        for j in range(i + 1, n - 1):
+            a, b, c, e = tour[i - 1], tour[i], tour[j], tour[j + 1]
+            if d[a][c] + d[b][e] - d[a][b] - d[c][e] < -1e-9:
+                tour[i:j + 1] = tour[i:j + 1][::-1]
+                improved = True
+    return improved
+
+
+def _or_opt(tour, d, deadline):
+    """Move segments of one to three stops to a cheaper position"""
+    improved = False
+    for length in (1, 2, 3):
+        i = 1
+        while i + length < len(tour):
+            if time.perf_counter() > deadline:
+                return improved
+            first, last = tour[i], tour[i + length - 1]
+            prev, nxt = tour[i - 1], tour[i + length]
+            gain = d[prev][first] + d[last][nxt] - d[prev][nxt]
+            best = None
+            for j in range(len(tour) - 1):
+                if i - 1 <= j < i + length:
+                    continue
+                a, b = tour[j], tour[j + 1]
+                delta = d[a][first] + d[last][b] - d[a][b] - gain
+                if delta < -1e-9 and (best is None or delta < best[0]):
+                    best = (delta, j)
+            if best is None:
+                i += 1
+                continue
+            segment = tour[i:i + length]
+            del tour[i:i + length]
+            j = best[1] if best[1] < i else best[1] - length
+            tour[j + 1:j + 1] = segment
+            improved = True
+    return improved
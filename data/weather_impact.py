@@ -0,0 +1,382 @@
+"""Weather impact of routes, sampled from a forecast along their polylines.
+
+A forecast is either a set of stations (one per city, from the weather feed or
+a JSON file) interpolated by inverse distance weighting, or a regular lat/lng
+grid (``.npz`` file) interpolated bilinearly. ``WISE_ROUTES_FORECAST`` names
+the file; without it the per-city weather feed is used.
+
+Route polylines are cut into segments, each segment is sampled every
+``SAMPLE_SPACING_KM`` and the samples of every segment of every route are
+interpolated in one vectorized call. Rain, wind and low visibility turn into
+a per-segment risk (0-1), a delay (extra minutes) and a fuel factor.
+
+``WeatherImpactEngine`` rescores all active routes in one batch whenever
+the forecast changes (or expires), so the ``/weather`` page only reads the
+stored scores; planned routes are scored with the same function, but only
+against a real forecast (a file or a posted one). The synthetic weather feed
+is random on every reload, and would make the same route plan differently
+each time the forecast expires.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from data.records import RouteStatus
+from data.road_graph import haversine_km
+from data.synthetic_data import HUB_CITIES, get_weather_data
+
+FIELDS = ('precipitation_mm_h', 'wind_kmh', 'visibility_km', 'temperature_c')
+FORECAST_PATH = os.environ.get('WISE_ROUTES_FORECAST')
+FORECAST_TTL_SECONDS = 600
+SAMPLE_SPACING_KM = 10
+# Road-graph polylines kept for scoring fleet routes, by origin/destination
+MAX_CACHED_PATHS = 4096
+COMPLETED_STATUS = RouteStatus.COMPLETED
+
+# Station values derived from the weather feed's text fields
+CONDITION_PRECIPITATION = {'Chuva Leve': 2.5, 'Chuva Forte': 12.0}
+VISIBILITY_KM = {'Boa': 10.0, 'Moderada': 4.0, 'Ruim': 1.0}
+ALERT_OVERRIDES = {
+    'Chuva Forte': ('precipitation_mm_h', 12.0),
+    'Neblina': ('visibility_km', 0.5),
+    'Vento Forte': ('wind_kmh', 70.0),
+}
+
+# Risk weights on travel time and fuel
+DELAY_WEIGHTS = {'precipitation': 0.3, 'wind': 0.2, 'visibility': 0.4}
+FUEL_WEIGHTS = {'precipitation': 0.08, 'wind': 0.1}
+IMPACT_LEVELS = ((0.2, 'minimal'), (0.5, 'moderate'), (1.01, 'severe'))
+
+_lock = threading.Lock()
+_engine = None
+
+
+class StationForecast:
+    """Point observations interpolated by inverse distance weighting"""
+
+    # True for the random stand-in built from the synthetic weather feed
+    synthetic = False
+
+    def __init__(self, lat, lng, values, records=None, issued_at=None):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lng = np.asarray(lng, dtype=float)
+        self.values = {name: np.asarray(values[name], dtype=float) for name in FIELDS}
+        self.records = records or []
+        self.issued_at = issued_at or datetime.now()
+
+    def sample(self, lat, lng):
+        distances = haversine_km(lat[:, None], lng[:, None], self.lat[None, :], self.lng[None, :])
+        weights = 1 / np.maximum(distances, 1.0) ** 2
+        weights /= weights.sum(axis=1, keepdims=True)
+        return {name: weights @ values for name, values in self.values.items()}
+
+
+class GridForecast:
+    """Regular lat/lng grid interpolated bilinearly (clamped at the edges)"""
+
+    synthetic = False
+
+    def __init__(self, lats, lngs, values, issued_at=None):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        self.values = {name: np.asarray(values[name], dtype=float) for name in FIELDS}
+        self.records = []
+        self.issued_at = issued_at or datetime.now()
+
+    @staticmethod
+    def _axis(axis, points):
+        points = np.clip(points, axis[0], axis[-1])
+        upper = np.clip(np.searchsorted(axis, points, side='right'), 1, len(axis) - 1)
+        lower = upper - 1
+        span = axis[upper] - axis[lower]
+        return lower, upper, np.where(span > 0, (points - axis[lower]) / np.where(span > 0, span, 1), 0)
+
+    def sample(self, lat, lng):
+        i0, i1, ty = self._axis(self.lats, lat)
+        j0, j1, tx = self._axis(self.lngs, lng)
+        samples = {}
+        for name, grid in self.values.items():
+            top = grid[i0, j0] * (1 - tx) + grid[i0, j1] * tx
+            bottom = grid[i1, j0] * (1 - tx) + grid[i1, j1] * tx
+            samples[name] = top * (1 - ty) + bottom * ty
+        return samples
+
+
+def _finite(value, name, city):
+    try:
+        value = math.nan if isinstance(value, bool) else float(value)
+    except (TypeError, ValueError):
+        value = math.nan
+    if not math.isfinite(value):
+        raise ValueError(f'Valor inválido para {name} em {city}: use um número finito')
+    return value
+
+
+def stations_from_weather(records):
+    """StationForecast from weather-feed records (``city``, ``condition``, ...)
+
+    Records may carry ``lat``/``lng`` and the numeric FIELDS directly; missing
+    values are derived from the condition, visibility and alerts. Raises
+    ValueError for unknown cities and for values that are not finite numbers.
+    """
+    hubs = {hub['name']: hub for hub in HUB_CITIES}
+    lat, lng, values = [], [], {name: [] for name in FIELDS}
+    for record in records:
+        city = record.get('city')
+        hub = hubs.get(city, {}) if isinstance(city, str) else {}
+        if 'lat' not in record and not hub:
+            raise ValueError(f'Local desconhecido: {city}')
+        lat.append(_finite(record.get('lat', hub.get('lat')), 'lat', city))
+        lng.append(_finite(record.get('lng', hub.get('lng')), 'lng', city))
+        derived = {
+            'precipitation_mm_h': CONDITION_PRECIPITATION.get(str(record.get('condition')), 0.0),
+            'wind_kmh': _finite(record.get('wind_speed', 0), 'wind_speed', city),
+            'visibility_km': VISIBILITY_KM.get(str(record.get('visibility')), 10.0),
+            'temperature_c': _finite(record.get('temperature', 20), 'temperature', city),
+        }
+        alerts = record.get('alerts') or []
+        if not isinstance(alerts, list) or not all(isinstance(a, str) for a in alerts):
+            raise ValueError(f'Alertas de {city} devem ser uma lista de nomes')
+        for alert in alerts:
+            if alert in ALERT_OVERRIDES:
+                name, value = ALERT_OVERRIDES[alert]
+                derived[name] = max(derived[name], value) if name != 'visibility_km' else min(derived[name], value)
+        for name in FIELDS:
+            values[name].append(_finite(record.get(name, derived[name]), name, city))
+    if not lat:
+        raise ValueError('Previsão sem estações')
+    return StationForecast(lat, lng, values, records=list(records))
+
+
+def load_forecast(path=FORECAST_PATH):
+    """Forecast from ``path`` (.npz grid or .json stations), or the weather feed"""
+    if not path:
+        forecast = stations_from_weather(get_weather_data())
+        forecast.synthetic = True
+        return forecast
+    issued_at = datetime.fromtimestamp(os.path.getmtime(path))
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            forecast = GridForecast(data['lat'], data['lng'], {name: data[name] for name in FIELDS}, issued_at)
+        return forecast
+    with open(path, encoding='utf-8') as f:
+        forecast = stations_from_weather(json.load(f))
+    forecast.issued_at = issued_at
+    return forecast
+
+
+def segment_impacts(forecast, lat1, lng1, lat2, lng2, minutes):
+    """Per-segment weather, risk, delay and fuel factor for segment arrays"""
+    length_km = haversine_km(lat1, lng1, lat2, lng2)
+    samples_per_segment = np.maximum(np.ceil(length_km / SAMPLE_SPACING_KM), 1).astype(np.int64)
+    starts = np.cumsum(samples_per_segment) - samples_per_segment
+    segment = np.repeat(np.arange(len(lat1)), samples_per_segment)
+    fraction = (np.arange(len(segment)) - starts[segment] + 0.5) / samples_per_segment[segment]
+    sampled = forecast.sample(lat1[segment] + (lat2 - lat1)[segment] * fraction,
+                              lng1[segment] + (lng2 - lng1)[segment] * fraction)
+    weather = {name: np.add.reduceat(values, starts) / samples_per_segment for name, values in sampled.items()}
+
+    rain = np.clip(weather['precipitation_mm_h'] / 20, 0, 1)
+    wind = np.clip((weather['wind_kmh'] - 30) / 60, 0, 1)
+    fog = np.clip((5 - weather['visibility_km']) / 5, 0, 1)
+    risk = 1 - (1 - rain) * (1 - wind) * (1 - fog)
+    delay_factor = DELAY_WEIGHTS['precipitation'] * rain + DELAY_WEIGHTS['wind'] * wind + DELAY_WEIGHTS['visibility'] * fog
+    fuel_factor = 1 + FUEL_WEIGHTS['precipitation'] * rain + FUEL_WEIGHTS['wind'] * wind
+    return dict(weather, length_km=length_km, risk=risk, delay_minutes=minutes * delay_factor, fuel_factor=fuel_factor)
+
+
+def score_polylines(forecast, polylines):
+    """Score many routes in one pass.
+
+    ``polylines`` is a list of ``(lats, lngs, segment_minutes)``. Returns the
+    per-segment impacts of all routes concatenated and the index of each
+    route's first segment.
+    """
+    counts = np.array([max(len(lats) - 1, 0) for lats, _, _ in polylines], dtype=np.int64)
+    starts = np.cumsum(counts) - counts
+    if not counts.sum():
+        return None, starts, counts
+    lat1 = np.concatenate([np.asarray(lats[:-1], float) for lats, _, _ in polylines])
+    lat2 = np.concatenate([np.asarray(lats[1:], float) for lats, _, _ in polylines])
+    lng1 = np.concatenate([np.asarray(lngs[:-1], float) for _, lngs, _ in polylines])
+    lng2 = np.concatenate([np.asarray(lngs[1:], float) for _, lngs, _ in polylines])
+    minutes = np.concatenate([np.asarray(m, float) for _, _, m in polylines])
+    return segment_impacts(forecast, lat1, lng1, lat2, lng2, minutes), starts, counts
+
+
+def impact_level(risk):
+    for threshold, level in IMPACT_LEVELS:
+        if risk < threshold:
+            return level
+    return IMPACT_LEVELS[-1][1]
+
+
+def _summary(segments, start, count):
+    """Route-level totals of ``count`` segments starting at ``start``"""
+    if not count:
+        return {'level': 'minimal', 'risk': 0.0, 'delay_minutes': 0, 'fuel_increase_percent': 0.0, 'worst_segment': None}
+    part = slice(start, start + count)
+    length = segments['length_km'][part]
+    fuel_factor = float(np.average(segments['fuel_factor'][part], weights=length)) if length.sum() else 1.0
+    worst = start + int(np.argmax(segments['risk'][part]))
+    risk = float(segments['risk'][worst])
+    return {
+        'level': impact_level(risk),
+        'risk': round(risk, 2),
+        'delay_minutes': int(round(float(segments['delay_minutes'][part].sum()))),
+        'fuel_increase_percent': round((fuel_factor - 1) * 100, 1),
+        'worst_segment': worst - start,
+        'max_precipitation_mm_h': round(float(segments['precipitation_mm_h'][worst]), 1),
+        'max_wind_kmh': round(float(segments['wind_kmh'][worst]), 1),
+        'min_visibility_km': round(float(segments['visibility_km'][worst]), 1),
+        'avg_temperature_c': round(float(np.average(segments['temperature_c'][part], weights=length + 1e-9)), 1)
+    }
+
+
+def apply_weather(plan, forecast, segment_minutes=None):
+    """Add weather delay, risk and fuel to a ``plan_route`` result in place.
+
+    ``segment_minutes`` are the travel times between consecutive waypoints;
+    by default the plan's duration is split by segment length.
+    """
+    waypoints = plan['waypoints']
+    lats = np.array([w['lat'] for w in waypoints], dtype=float)
+    lngs = np.array([w['lng'] for w in waypoints], dtype=float)
+    if segment_minutes is None:
+        lengths = haversine_km(lats[:-1], lngs[:-1], lats[1:], lngs[1:])
+        total = lengths.sum()
+        segment_minutes = plan['duration_minutes'] * (lengths / total if total else np.zeros_like(lengths))
+    minutes = np.asarray(segment_minutes, dtype=float)
+    segments, starts, counts = score_polylines(forecast, [(lats, lngs, minutes)])
+    summary = _summary(segments, 0, int(counts[0]))
+
+    fuel_factor = 1 + summary['fuel_increase_percent'] / 100
+    plan['fuel_cost'] = round(plan['fuel_cost'] * fuel_factor, 2)
+    plan['estimated_fuel_consumption'] = round(plan['estimated_fuel_consumption'] * fuel_factor, 1)
+    plan['total_cost'] = round(plan['fuel_cost'] + plan['toll_cost'], 2)
+    plan['duration_minutes'] += summary['delay_minutes']
+    plan['duration_formatted'] = f"{plan['duration_minutes'] // 60}h {plan['duration_minutes'] % 60}min"
+    plan['weather_impact'] = summary['level']
+    plan['weather'] = dict(summary, forecast_issued_at=forecast.issued_at.isoformat(timespec='seconds'), segments=[
+        {
+            'from': waypoints[i]['name'],
+            'to': waypoints[i + 1]['name'],
+            'risk': round(float(segments['risk'][i]), 2),
+            'delay_minutes': round(float(segments['delay_minutes'][i]), 1),
+            'precipitation_mm_h': round(float(segments['precipitation_mm_h'][i]), 1),
+            'wind_kmh': round(float(segments['wind_kmh'][i]), 1),
+            'visibility_km': round(float(segments['visibility_km'][i]), 1)
+        }
+        for i in range(int(counts[0]))
+    ])
+    return plan
+
+
+class WeatherImpactEngine:
+    """Current forecast plus the batch-scored impact of every active route"""
+
+    def __init__(self, provider=load_forecast, ttl=FORECAST_TTL_SECONDS):
+        self.provider = provider
+        self.ttl = ttl
+        self.version = 0
+        self._forecast = None
+        self._loaded_at = 0.0
+        self._route_impacts = []
+        self._fleet_version = None
+        self._paths = OrderedDict()
+        self._lock = threading.Lock()
+
+    def forecast(self):
+        """The current forecast, reloaded (and routes rescored) once it expires"""
+        if self._forecast is None or time.monotonic() - self._loaded_at > self.ttl:
+            with self._lock:
+                if self._forecast is None or time.monotonic() - self._loaded_at > self.ttl:
+                    self._set_forecast(self.provider())
+        return self._forecast
+
+    def planning_forecast(self):
+        """The forecast to plan routes against, or None while only the synthetic feed is loaded"""
+        forecast = self.forecast()
+        return None if forecast.synthetic else forecast
+
+    def update_forecast(self, forecast):
+        """Swap in a new forecast and rescore every active route"""
+        with self._lock:
+            self._set_forecast(forecast)
+        return self.version
+
+    def _set_forecast(self, forecast):
+        self._forecast = forecast
+        self._loaded_at = time.monotonic()
+        self.version += 1
+        self._fleet_version = None
+
+    def conditions(self):
+        """Per-city conditions behind the forecast (the weather feed for grids)"""
+        return self.forecast().records or get_weather_data()
+
+    def _route_polyline(self, graph, route):
+        """Road-graph polyline and per-edge minutes of a fleet route"""
+        key = (route.origin.name, route.destination.name)
+        if key in self._paths:
+            self._paths.move_to_end(key)
+        else:
+            source, target = graph.find_node(key[0]), graph.find_node(key[1])
+            path = graph.shortest_path(source, target) if source is not None and target is not None else None
+            if path is None:
+                # Off the road graph: straight line between the endpoints
+                self._paths[key] = ([route.origin.lat, route.destination.lat],
+                                    [route.origin.lng, route.destination.lng],
+                                    [route.distance / 70 * 60])
+            else:
+                nodes, edges = path['nodes'], np.asarray(path['edges'], dtype=np.int64)
+                self._paths[key] = (graph.lat[nodes], graph.lng[nodes], graph.duration_min[edges])
+            if len(self._paths) > MAX_CACHED_PATHS:
+                self._paths.popitem(last=False)
+        return self._paths[key]
+
+    def route_impacts(self, fleet_store):
+        """Impact of every route not yet completed, worst first.
+
+        All routes are rescored together after a forecast or fleet change.
+        """
+        forecast = self.forecast()
+        with self._lock:
+            if self._fleet_version == (self.version, fleet_store.version):
+                return self._route_impacts
+            from data.road_graph import get_road_graph
+
+            graph = get_road_graph()
+            routes = [r for r in fleet_store.routes if r.status != COMPLETED_STATUS]
+            polylines = [self._route_polyline(graph, r) for r in routes]
+            segments, starts, counts = score_polylines(forecast, polylines)
+            impacts = []
+            for route, (_, _, minutes), start, count in zip(routes, polylines, starts.tolist(), counts.tolist()):
+                impacts.append(dict(
+                    _summary(segments, start, count),
+                    route_id=route.id,
+                    origin=route.origin.name,
+                    destination=route.destination.name,
+                    status=route.status,
+                    normal_minutes=int(round(float(np.sum(minutes))))
+                ))
+            impacts.sort(key=lambda i: (-i['risk'], -i['delay_minutes']))
+            self._route_impacts = impacts
+            self._fleet_version = (self.version, fleet_store.version)
+        return impacts
+
+
+def get_weather_engine():
+    """Return the shared weather impact engine"""
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                _engine = WeatherImpactEngine()
+    return _engine
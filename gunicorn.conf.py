@@ -0,0 +1,57 @@
+"""Gunicorn settings for production: ``gunicorn -c gunicorn.conf.py``.
+
+The app is preloaded in the master (wsgi.py warms it up there), so workers
+start by forking with the fleet, road graph, price series, indexes and
+compiled templates already built, and share those pages copy-on-write. To
+keep them shared the collector stays off while the master loads, everything
+loaded is frozen before the first fork and collection resumes in each worker.
+
+Live state is kept in process memory: schedule conflicts and idempotency
+keys, rollups, live positions and their streams, telemetry buffers, the
+spatial index, the forecast, driver edits and fuel quotes. Workers would
+each see and write their own copy, so there is one worker by default and
+the server scales with threads. More workers (``WISE_ROUTES_WORKERS``) are
+only safe for read-only traffic. For the same reason workers are never
+recycled (no ``max_requests``): a restarted worker would come back without
+the live state of its predecessor.
+"""
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:app'
+preload_app = True
+bind = os.environ.get('WISE_ROUTES_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WISE_ROUTES_WORKERS', 0)) or 1
+worker_class = 'gthread'
+threads = int(os.environ.get('WISE_ROUTES_THREADS', 0)) or 32
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+# Split the CPUs between the workers' process pools, and keep half of each
+# worker's threads free of live-tracking streams
+_cpus = multiprocessing.cpu_count()
+os.environ.setdefault('WISE_ROUTES_BATCH_WORKERS', str(max(_cpus // workers, 1)))
+os.environ.setdefault('WISE_ROUTES_REPORT_WORKERS', str(min(max(_cpus // workers, 1), 2)))
+os.environ.setdefault('WISE_ROUTES_MAX_STREAMS', str(max(threads // 2, 1)))
+
+gc.disable()
+
+
+def when_ready(server):
+    if workers > 1:
+        server.log.warning('%d workers: live state (schedules, positions, telemetry, edits) '
+                           'is per worker; keep writes on a single worker', workers)
+    # Frozen objects are never scanned by the collector, which would otherwise
+    # write to (and copy) every shared page in each worker
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+    from wsgi import start_background_tasks, start_process_pools
+    # The worker has one thread until the background tasks start: fork the
+    # pools now, so their processes never inherit another thread's locks
+    start_process_pools()
+    start_background_tasks()
@@ -0,0 +1,251 @@
+"""Opt-in request instrumentation (enable with WISE_ROUTES_INSTRUMENT=1).
+
+Every request is split into phases:
+
+- ``fetch``: ``get_*`` functions and source fan-out from the data layer
+- ``compute``: other data layer calls (route planning, solvers, ...)
+- ``render``: Jinja template rendering
+- ``serialize``: ``jsonify`` / JSON encoding
+- ``handler``: whatever is left in the view itself
+
+Phase times are sent in a ``Server-Timing`` header and aggregated into
+Prometheus latency histograms served at ``/metrics``. A sampling profiler
+(``WISE_ROUTES_PROFILE_SLOW_MS`` or ``POST /debug/profiler``) records the
+stacks of in-flight requests and writes those slower than the threshold to
+``instance/profiles/*.folded``, ready for flamegraph.pl or speedscope.
+``/debug/profiler`` answers only in debug mode or to requests carrying the
+``WISE_ROUTES_DEBUG_TOKEN`` in an ``X-Debug-Token`` header. Metrics are per
+process.
+"""
+import hmac
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+
+from flask import Response, g, jsonify, request, template_rendered, before_render_template
+
+from data.paths import instance_path
+
+PHASES = ('fetch', 'compute', 'render', 'serialize', 'handler')
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILE_INTERVAL_SECONDS = 0.005
+# Lower thresholds would dump a profile for nearly every request
+MIN_PROFILE_THRESHOLD_MS = 10
+DEBUG_TOKEN = os.environ.get('WISE_ROUTES_DEBUG_TOKEN')
+# Data layer calls that are data fetches despite not being named get_*
+FETCH_FUNCTIONS = {'gather'}
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label tuples"""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, labels))
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+                lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+REQUEST_DURATION = Histogram('wise_routes_request_duration_seconds', 'Request latency',
+                             ('route', 'method', 'status'))
+PHASE_DURATION = Histogram('wise_routes_phase_duration_seconds', 'Time spent per request phase',
+                           ('route', 'phase'))
+
+
+class SamplingProfiler(threading.Thread):
+    """Samples the stacks of threads serving requests"""
+
+    def __init__(self, threshold_ms):
+        super().__init__(name='request-profiler', daemon=True)
+        self.threshold_ms = threshold_ms
+        self.enabled = True
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def begin(self, thread_id):
+        with self._lock:
+            self._active[thread_id] = Counter()
+
+    def end(self, thread_id):
+        with self._lock:
+            return self._active.pop(thread_id, None)
+
+    def run(self):
+        while True:
+            time.sleep(PROFILE_INTERVAL_SECONDS)
+            if not self.enabled:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[_collapse(frame)] += 1
+
+    def dump(self, stacks, route, elapsed_ms):
+        name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{route.strip('/').replace('/', '_') or 'root'}.folded"
+        path = instance_path('profiles', name)
+        with open(path, 'w') as f:
+            f.write(f'# {route} {elapsed_ms:.1f} ms\n')
+            for stack, count in stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        return path
+
+
+def _collapse(frame):
+    """Folded stack ('outer;...;inner') of a frame"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _timings():
+    timings = g.get('_timings')
+    if timings is None:
+        timings = g._timings = dict.fromkeys(PHASES, 0.0)
+    return timings
+
+
+def timed(phase, func):
+    """Wrap ``func`` so its time counts towards ``phase`` (outermost call only)"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not g or g.get('_phase'):
+            return func(*args, **kwargs)
+        g._phase = phase
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _timings()[phase] += time.perf_counter() - started
+            g._phase = None
+    return wrapper
+
+
+def instrument_namespace(namespace):
+    """Wrap data layer callables imported into a module namespace"""
+    for name, value in list(namespace.items()):
+        module = getattr(value, '__module__', '') or ''
+        if callable(value) and not isinstance(value, type) and module.startswith('data.'):
+            fetch = name.startswith('get_') or name in FETCH_FUNCTIONS
+            namespace[name] = timed('fetch' if fetch else 'compute', value)
+
+
+def init_instrumentation(app, namespace, profile_threshold_ms=None):
+    """Install timers, ``/metrics`` and the profiler toggle on ``app``.
+
+    Returns the profiler thread unstarted, so a preforking server can start
+    it in each worker.
+    """
+    instrument_namespace(namespace)
+    app.json.response = timed('serialize', app.json.response)
+    profiler = SamplingProfiler(profile_threshold_ms or 0)
+    profiler.enabled = profile_threshold_ms is not None
+
+    @before_render_template.connect_via(app)
+    def start_render(sender, template, context, **extra):
+        g._render_started = time.perf_counter()
+
+    @template_rendered.connect_via(app)
+    def end_render(sender, template, context, **extra):
+        started = g.pop('_render_started', None)
+        if started is not None:
+            _timings()['render'] += time.perf_counter() - started
+
+    @app.before_request
+    def start_timer():
+        g._request_started = time.perf_counter()
+        if profiler.enabled:
+            profiler.begin(threading.get_ident())
+
+    @app.after_request
+    def record_timings(response):
+        started = g.get('_request_started')
+        if started is None:
+            return response
+        total = time.perf_counter() - started
+        timings = _timings()
+        timings['handler'] = max(total - sum(v for k, v in timings.items() if k != 'handler'), 0.0)
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+
+        REQUEST_DURATION.observe((route, request.method, str(response.status_code)), total)
+        for phase, seconds in timings.items():
+            PHASE_DURATION.observe((route, phase), seconds)
+        response.headers['Server-Timing'] = ', '.join(
+            [f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in timings.items()] +
+            [f'total;dur={total * 1000:.2f}']
+        )
+
+        stacks = profiler.end(threading.get_ident())
+        if stacks and total * 1000 >= profiler.threshold_ms:
+            profiler.dump(stacks, route, total * 1000)
+        return response
+
+    @app.teardown_request
+    def stop_profiling(exc):
+        # after_request is skipped when a view raises; don't keep sampling this thread
+        profiler.end(threading.get_ident())
+
+    def metrics():
+        body = REQUEST_DURATION.render() + '\n' + PHASE_DURATION.render() + '\n'
+        return Response(body, mimetype='text/plain; version=0.0.4')
+
+    def toggle_profiler():
+        token = request.headers.get('X-Debug-Token', '')
+        if not app.debug and not (DEBUG_TOKEN and hmac.compare_digest(token, DEBUG_TOKEN)):
+            return jsonify({'error': 'Acesso negado'}), 403
+        if request.method == 'POST':
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({'error': 'Envie um objeto JSON'}), 400
+            enabled = data.get('enabled', not profiler.enabled)
+            threshold_ms = data.get('threshold_ms', profiler.threshold_ms)
+            if not isinstance(enabled, bool):
+                return jsonify({'error': 'enabled deve ser true ou false'}), 400
+            if isinstance(threshold_ms, bool) or not isinstance(threshold_ms, (int, float)) \
+                    or not math.isfinite(threshold_ms) or threshold_ms < MIN_PROFILE_THRESHOLD_MS:
+                return jsonify({'error': f'threshold_ms deve ser um número a partir de {MIN_PROFILE_THRESHOLD_MS}'}), 400
+            profiler.enabled = enabled
+            profiler.threshold_ms = float(threshold_ms)
+        return jsonify({'enabled': profiler.enabled, 'threshold_ms': profiler.threshold_ms})
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
+    app.add_url_rule('/debug/profiler', 'toggle_profiler', toggle_profiler, methods=['GET', 'POST'])
+    return profiler
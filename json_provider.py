@@ -0,0 +1,143 @@
+"""JSON encoding for API responses.
+
+``install_json_provider(app)`` picks the fastest available encoder: orjson
+when it is installed, the standard library otherwise. Both write datetimes as
+ISO 8601 and accept NumPy scalars and arrays and fleet records
+(``data.records``), so payloads look the same whichever one is active.
+
+Large collections are not built as one document: ``collection_response``
+streams a JSON array in chunks (or NDJSON with ``?format=ndjson``) and applies
+``?fields=id,name,...`` projection to every record.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+from flask import Response, request
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+from data.records import PerformanceHistory, Record
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Records encoded per chunk of a streamed collection
+STREAM_CHUNK_SIZE = 500
+
+
+def _default(o):
+    """Types neither encoder handles natively"""
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    if isinstance(o, Decimal):
+        return float(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    if isinstance(o, Record):
+        return o.to_dict()
+    if isinstance(o, PerformanceHistory):
+        return o.to_list()
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    """Flask's provider with ISO 8601 datetimes and NumPy support"""
+
+    default = staticmethod(_default)
+    ensure_ascii = False
+    sort_keys = False
+
+
+class OrjsonProvider(JSONProvider):
+    """orjson-backed provider"""
+
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=self.options).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=self.options)
+        return self._app.response_class(body, mimetype='application/json')
+
+
+def install_json_provider(app):
+    """Use orjson for ``app`` when available, falling back to the stdlib"""
+    provider_class = OrjsonProvider if orjson is not None else StdlibJSONProvider
+    app.json_provider_class = provider_class
+    app.json = provider_class(app)
+    return app.json
+
+
+def dumps(obj):
+    """Encode ``obj`` to a str with the same rules as the app's provider"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=OrjsonProvider.options).decode()
+    return json.dumps(obj, default=_default, ensure_ascii=False)
+
+
+def requested_fields():
+    """Field names from ``?fields=a,b,c``, or None for every field"""
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    return tuple(f.strip() for f in fields.split(',') if f.strip())
+
+
+def project(record, fields):
+    """Copy of ``record`` restricted to ``fields`` (unknown names are skipped)"""
+    if isinstance(record, Record):
+        return record.to_dict(fields)
+    if fields is None:
+        return record
+    return {f: record[f] for f in fields if f in record}
+
+
+def iter_json_array(records, fields=None):
+    """Chunks of a JSON array, STREAM_CHUNK_SIZE records at a time"""
+    yield '['
+    chunk = []
+    first = True
+    for record in records:
+        chunk.append(dumps(project(record, fields)))
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            yield ('' if first else ',') + ','.join(chunk)
+            first = False
+            chunk = []
+    if chunk:
+        yield ('' if first else ',') + ','.join(chunk)
+    yield ']'
+
+
+def iter_ndjson(records, fields=None):
+    """Chunks of newline-delimited JSON"""
+    chunk = []
+    for record in records:
+        chunk.append(dumps(project(record, fields)))
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+
+
+def collection_response(records):
+    """Stream ``records`` as a JSON array, or NDJSON with ``?format=ndjson``.
+
+    Honours ``?fields=`` projection.
+    """
+    fields = requested_fields()
+    if request.args.get('format') == 'ndjson':
+        return Response(iter_ndjson(records, fields), mimetype='application/x-ndjson')
+    return Response(iter_json_array(records, fields), mimetype='application/json')
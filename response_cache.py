@@ -0,0 +1,211 @@
+"""Response caching with TTL, content-hash ETags and conditional GET.
+
+Decorate a view with ``@cached_response('tag', ttl=...)`` to store its
+rendered body and headers in the configured backend. Every response carries an ETag
+computed from the body, and a request whose ``If-None-Match`` matches gets an
+empty ``304 Not Modified``.
+
+Backends:
+
+- ``MemoryCache``: in-process LRU with per-entry TTL (default)
+- ``FileCache``: directory shared by every worker process on one machine,
+  the local stand-in for a networked cache
+- ``ClientCache``: adapter for any Redis-style client with ``get``,
+  ``set(key, value, ex=ttl)``, ``delete``, ``incr`` and ``expire``
+
+Invalidation: ``invalidate(tag)`` bumps the tag's generation (an atomic
+``incr`` of the backend) so all of its entries miss, and ``depends_on`` lets a view add a data version (such as the
+fleet store version) to its keys so changes invalidate it automatically.
+"""
+import fcntl
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+
+class MemoryCache:
+    """In-process LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def incr(self, key, ttl):
+        with self._lock:
+            entry = self._entries.get(key)
+            value = entry[0] + 1 if entry is not None and entry[1] >= time.monotonic() else 1
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileCache:
+    """Cache in a local directory, shared by every process that opens it"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return value if expires >= time.time() else None
+
+    def set(self, key, value, ttl):
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((time.time() + ttl, value), f)
+        os.replace(tmp_path, path)
+
+    def incr(self, key, ttl):
+        # flock serializes the read and write with other processes too
+        with open(os.path.join(self.directory, 'incr.lock'), 'wb') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            value = (self.get(key) or 0) + 1
+            self.set(key, value, ttl)
+            return value
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name == 'incr.lock':
+                continue
+            os.remove(os.path.join(self.directory, name))
+
+
+class ClientCache:
+    """Adapter for a Redis-style client"""
+
+    def __init__(self, client, prefix='wise-routes:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        # Counters written by incr() are plain integers, never pickles
+        return int(value) if value.isdigit() else pickle.loads(value)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=max(int(ttl), 1))
+
+    def incr(self, key, ttl):
+        value = self.client.incr(self.prefix + key)
+        self.client.expire(self.prefix + key, max(int(ttl), 1))
+        return value
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+_backend = MemoryCache()
+# Tag generations live in the backend so invalidation reaches every worker
+GENERATION_TTL = 30 * 24 * 3600
+# Part of every key, so entries in an older layout are never read back
+ENTRY_FORMAT = 2
+# Recomputed for every response served from the cache
+SKIPPED_HEADERS = ('content-length', 'etag')
+
+
+def set_cache_backend(backend):
+    """Replace the cache backend (e.g. with a FileCache shared by workers)"""
+    global _backend
+    _backend = backend
+
+
+def get_cache_backend():
+    return _backend
+
+
+def _generation(tag):
+    return _backend.get(f'generation:{tag}') or 0
+
+
+def invalidate(*tags):
+    """Drop every cached response of the given tags"""
+    for tag in tags:
+        _backend.incr(f'generation:{tag}', GENERATION_TTL)
+
+
+def content_etag(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+def cached_response(tag, ttl=60, depends_on=None):
+    """Cache a GET view's 200 responses for ``ttl`` seconds"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            version = depends_on() if depends_on is not None else ''
+            key = f'response{ENTRY_FORMAT}:{tag}:{_generation(tag)}:{version}:{request.full_path}'
+            entry = _backend.get(key)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                # Pages built from stale sources carry a Warning; don't keep them
+                if response.status_code != 200 or response.is_streamed or 'Warning' in response.headers:
+                    return response
+                body = response.get_data()
+                headers = [(name, value) for name, value in response.headers if name.lower() not in SKIPPED_HEADERS]
+                entry = (body, headers, content_etag(body))
+                _backend.set(key, entry, ttl)
+
+            body, headers, etag = entry
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = Response(body, headers=headers)
+            response.set_etag(etag)
+            # Clients revalidate every time; unchanged data costs a 304
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
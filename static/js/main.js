@@ -121,6 +121,33 @@ async function getLiveTracking(routeId) {
   }
 }
 
+// Live tracking for every route over a single Server-Sent Events connection.
+// onUpdate receives the full state of each route that changed.
+function subscribeLiveTracking(onUpdate, routeIds) {
+  const routes = {}
+  const query = routeIds ? `?routes=${routeIds.join(",")}` : ""
+  const source = new EventSource(`/api/live-tracking/stream${query}`)
+
+  source.addEventListener("snapshot", (event) => {
+    Object.assign(routes, JSON.parse(event.data))
+    onUpdate(routes)
+  })
+
+  source.addEventListener("delta", (event) => {
+    const deltas = JSON.parse(event.data)
+    Object.keys(deltas).forEach((routeId) => {
+      if (deltas[routeId] === null) {
+        delete routes[routeId]
+      } else {
+        routes[routeId] = { ...routes[routeId], ...deltas[routeId] }
+      }
+    })
+    onUpdate(routes, Object.keys(deltas))
+  })
+
+  return source
+}
+
 async function manageWaypoints(action, data) {
   try {
     const response = await fetch("/api/waypoints", {
@@ -157,6 +184,7 @@ window.WiseRoutes = {
   optimizeRoute,
   getRouteAlternatives,
   getLiveTracking,
+  subscribeLiveTracking,
   manageWaypoints,
   updateFuelPrices,
 }
@@ -0,0 +1,250 @@
+import io
+
+import pytest
+
+from data.road_graph import get_road_graph
+
+
+@pytest.mark.parametrize('body', [
+    [1],
+    {'origins': 'Curitiba'},
+    {'origins': [1, 2]},
+    {'origins': ['Curitiba'], 'avoidTolls': 'false'},
+    {'origins': ['Curitiba'], 'optimizationType': 'scenic'},
+    {'origins': ['Atlântida']},
+])
+def test_distance_matrix_rejects_bad_bodies(client, body):
+    assert client.post('/api/distance-matrix', json=body).status_code == 400
+
+
+def test_distance_matrix_dedupes_and_bounds_places(client):
+    response = client.post('/api/distance-matrix', json={'origins': ['Curitiba', 'curitiba, PR', 'São Paulo']})
+    assert response.status_code == 200
+    assert response.json['origins'] == ['Curitiba', 'São Paulo']
+    assert len(response.json['cost']) == 2
+
+    too_many = ['Curitiba'] * (get_road_graph().node_count + 1)
+    assert client.post('/api/distance-matrix', json={'origins': too_many}).status_code == 400
+
+
+def test_distance_matrix_prices_fuel_from_the_price_store(client):
+    body = {'origins': ['Curitiba'], 'destinations': ['São Paulo'], 'avoidTolls': True}
+    before = client.post('/api/distance-matrix', json=body).json['cost'][0][0]
+    quote = {'fuel_type': 'diesel_s10', 'region': 'PR', 'price': 50.0}
+    assert client.post('/api/fuel-prices', json=quote).status_code == 200
+    assert client.post('/api/distance-matrix', json=body).json['cost'][0][0] > before * 5
+
+
+@pytest.mark.parametrize('duration', [[1], {'h': 1}, 'inf', '99999999h', 10 ** 8, -1])
+def test_assign_route_rejects_bad_durations(client, duration):
+    body = {'driver_id': 1, 'route_id': 1, 'scheduled_date': '2030-01-07', 'estimated_duration': duration}
+    assert client.post('/api/driver/assign-route', json=body).status_code == 400
+
+
+@pytest.mark.parametrize('path', ['/api/driver/assign-route', '/api/driver/auto-assign'])
+@pytest.mark.parametrize('body', [[1], 'x', 5])
+def test_scheduling_endpoints_reject_non_object_bodies(client, path, body):
+    assert client.post(path, json=body).status_code == 400
+
+
+def test_assign_route_rejects_a_non_text_idempotency_key(client):
+    body = {'driver_id': 1, 'route_id': 1, 'scheduled_date': '2030-01-07', 'idempotency_key': [1]}
+    assert client.post('/api/driver/assign-route', json=body).status_code == 400
+
+
+@pytest.fixture
+def available_vehicle():
+    """Synthetic vehicle statuses are random: make sure one can take deliveries"""
+    from data.fleet_store import get_fleet_store
+    from data.records import VehicleStatus
+
+    vehicle = get_fleet_store().vehicles[0]
+    status = vehicle.status
+    vehicle.status = VehicleStatus.AVAILABLE
+    yield vehicle
+    vehicle.status = status
+
+
+@pytest.mark.parametrize('body', [
+    [1],
+    {'deliveries': [1]},
+    {'deliveries': {'lat': 1}},
+    {'deliveries': [{'lat': -25.4, 'lng': -49.2}], 'vehicleIds': 5},
+    {'deliveries': [{'lat': -25.4, 'lng': -49.2}], 'vehicleIds': ['1']},
+    {'deliveries': [{'lat': -25.4, 'lng': -49.2}], 'timeBudget': [1]},
+    {'deliveries': [{'lat': -25.4, 'lng': -49.2}], 'timeBudget': 'nan'},
+    {'deliveries': [{'lat': -25.4, 'lng': -49.2, 'weight': 'nan'}]},
+    {'deliveries': [{'lat': 'nan', 'lng': -49.2}]},
+    {'deliveries': [{'lat': -25.4, 'lng': -49.2}] * 1001},
+])
+def test_vrp_rejects_bad_bodies(client, available_vehicle, body):
+    assert client.post('/api/route-optimization/vrp', json=body).status_code == 400
+
+
+def test_vrp_plans_deliveries(client, available_vehicle):
+    body = {'deliveries': [{'lat': -25.4, 'lng': -49.2, 'weight': 100}], 'timeBudget': 0.1}
+    response = client.post('/api/route-optimization/vrp', json=body)
+    assert response.status_code == 200
+    assert response.json['tours'][0]['stops'] == [1]
+
+
+@pytest.mark.parametrize('k', ['-1', '0', '101'])
+def test_leaderboard_rejects_k_outside_1_to_100(client, k):
+    assert client.get(f'/api/drivers/leaderboard?k={k}').status_code == 400
+
+
+def test_leaderboard_pages_by_k(client):
+    response = client.get('/api/drivers/leaderboard?k=3&offset=1')
+    assert response.status_code == 200
+    assert [d['rank'] for d in response.json['leaderboard']] == [2, 3, 4]
+
+
+@pytest.mark.parametrize('body', [
+    [1],
+    {'avg_consumption': 0},
+    {'avg_consumption': -2.5},
+    {'efficiency_score': 101},
+    {'safety_score': -1},
+    {'km_driven': -10},
+    {'efficiency_score': '90'},
+    {'status': 'Dormindo'},
+    {'depot': 'Atlântida'},
+    {'name': 'Outro'},
+])
+def test_update_driver_rejects_bad_fields(client, body):
+    before = client.get('/api/driver/1').json
+    assert client.patch('/api/driver/1', json=body).status_code == 400
+    assert client.get('/api/driver/1').json == before
+
+
+def fleet_vehicle_id():
+    from data.fleet_store import get_fleet_store
+    return get_fleet_store().vehicles[0].id
+
+
+@pytest.mark.parametrize('lat', ['nan', 'inf', '-inf'])
+def test_telemetry_with_non_finite_coordinates_writes_nothing(client, lat):
+    vehicle_id = fleet_vehicle_id()
+    before = client.get(f'/api/telemetry/vehicle/{vehicle_id}')
+    sample = {'vehicle_id': vehicle_id, 'lat': lat, 'lng': -49.2, 'speed_kmh': 80}
+    assert client.post('/api/telemetry/ingest', json={'samples': [sample]}).status_code == 400
+    after = client.get(f'/api/telemetry/vehicle/{vehicle_id}')
+    assert (after.status_code, after.json) == (before.status_code, before.json)
+
+
+@pytest.mark.parametrize('body', [[1], 'add', {'action': 'add', 'lat': 'nan', 'lng': -49.2}, {'action': 'add'}])
+def test_waypoints_reject_bad_bodies(client, body):
+    assert client.post('/api/waypoints', json=body).status_code == 400
+
+
+@pytest.mark.parametrize('query', ['lat=nan&lng=-49.2&km=10', 'lat=-25.4&lng=inf&km=10', 'lat=-25.4&km=10'])
+def test_geo_radius_rejects_bad_coordinates(client, query):
+    assert client.get(f'/api/geo/radius?{query}').status_code == 400
+
+
+@pytest.mark.parametrize('sample', [
+    {'vehicle_id': -1},
+    {'vehicle_id': 2 ** 32},
+    {'vehicle_id': 1.5},
+    {'vehicle_id': 1, 'route_id': -3},
+    {'vehicle_id': 1, 'speed_kmh': 'nan'},
+    {'vehicle_id': 1, 'ts': 'inf'},
+])
+def test_telemetry_rejects_bad_samples(client, sample):
+    sample = dict(sample, lat=-25.4, lng=-49.2)
+    assert client.post('/api/telemetry/ingest', json={'samples': [sample]}).status_code == 400
+
+
+def test_telemetry_ignores_unknown_routes_and_feeds_driver_analytics(client):
+    from data.fleet_store import get_fleet_store
+    from data.live_tracking import get_position_store
+
+    store = get_fleet_store()
+    driver = next(d for d in store.drivers if store.get_vehicle_by_plate(d.vehicle_assigned))
+    vehicle = store.get_vehicle_by_plate(driver.vehicle_assigned)
+    samples = [{'vehicle_id': vehicle.id, 'route_id': 987654, 'lat': -25.4, 'lng': -49.2, 'speed_kmh': speed,
+                'odometer_km': km} for speed, km in ((80, 100.0), (100, 110.0))]
+    assert client.post('/api/telemetry/ingest', json={'samples': samples}).status_code == 200
+    assert get_position_store().get(987654) is None
+
+    telemetry = client.get('/api/drivers/analytics').json['telemetry']
+    row = next(r for r in telemetry['drivers'] if r['driver_id'] == driver.id)
+    assert row['vehicle_id'] == vehicle.id
+    assert row['speeding_percent'] > 0
+    assert row['distance_km'] >= 10.0
+
+
+@pytest.mark.parametrize('body', [[1], 'operational', 5])
+def test_reports_reject_non_object_bodies(client, body):
+    assert client.post('/api/reports', json=body).status_code == 400
+
+
+def test_reports_fill_an_unseeded_period_with_synthetic_history(client):
+    import time
+
+    response = client.post('/api/reports', json={'type': 'operational', 'period': 'last-week', 'format': 'csv'})
+    assert response.status_code in (200, 202)
+    assert 'seed' in response.json['notice']
+    for _ in range(300):
+        state = client.get(response.json['status_url']).json
+        if state['status'] not in ('queued', 'running'):
+            break
+        time.sleep(0.1)
+    assert state['status'] == 'completed'
+    days = client.get(response.json['download_url']).get_data(as_text=True).splitlines()[1:]
+    assert len(days) >= 6
+
+    drivers = client.post('/api/reports', json={'type': 'efficiency', 'period': 'last-week', 'format': 'csv'})
+    assert drivers.json['notice'] is None
+
+
+@pytest.mark.parametrize('kind, data', [
+    ('trucks', {'file': (io.BytesIO(b'id\n1\n'), 'drivers.csv')}),
+    ('drivers', {}),
+    ('drivers', {'other': (io.BytesIO(b'id\n1\n'), 'drivers.csv')}),
+    ('drivers', {'file': (io.BytesIO(b'id\n1\n'), 'drivers.txt')}),
+    ('drivers', {'file': (io.BytesIO(b'id\n1\n'), '')}),
+])
+def test_import_rejects_bad_uploads(client, kind, data):
+    response = client.post(f'/api/import/{kind}', data=data, content_type='multipart/form-data')
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('body', [[1], {'file': 'x'}])
+def test_import_rejects_json_bodies(client, body):
+    assert client.post('/api/import/drivers', json=body).status_code == 400
+
+
+@pytest.mark.parametrize('import_id', ['nope', '..', 'a.b'])
+def test_import_status_of_unknown_imports_is_404(client, import_id):
+    assert client.get(f'/api/import/{import_id}').status_code == 404
+
+
+@pytest.mark.parametrize('body', [
+    [1], 'x', 5, [], {'quotes': 5}, {'quotes': [1]},
+    {'fuel_type': [1], 'price': 5.0},
+    {'fuel_type': 'querosene', 'price': 5.0},
+    {'fuel_type': 'diesel_s10', 'price': 5.0, 'region': [1]},
+    {'fuel_type': 'diesel_s10', 'price': '5,45'},
+    {'fuel_type': 'diesel_s10', 'price': True},
+    {'fuel_type': 'diesel_s10', 'price': 0},
+    {'fuel_type': 'diesel_s10', 'price': 1e6},
+    {'fuel_type': 'diesel_s10', 'price': 5.0, 'ts': [1]},
+    {'fuel_type': 'diesel_s10', 'price': 5.0, 'ts': True},
+    {'fuel_type': 'diesel_s10', 'price': 5.0, 'ts': 1e300},
+    {'fuel_type': 'diesel_s10', 'price': 5.0, 'ts': -1e300},
+    {'fuel_type': 'diesel_s10', 'price': 5.0, 'ts': '2026-13-01'},
+    {'quotes': [{'fuel_type': 'diesel_s10', 'price': 5.0}, {'fuel_type': 'diesel_s10', 'price': -1}]},
+])
+def test_fuel_prices_reject_bad_quotes(client, body):
+    from data.fuel_prices import get_fuel_prices
+
+    version = get_fuel_prices().version
+    assert client.post('/api/fuel-prices', json=body).status_code == 400
+    assert get_fuel_prices().version == version
+
+
+@pytest.mark.parametrize('raw', ['Infinity', 'NaN', '1e400'])
+def test_fuel_prices_reject_non_finite_prices(client, raw):
+    body = f'{{"fuel_type": "diesel_s10", "price": {raw}}}'
+    assert client.post('/api/fuel-prices', data=body, content_type='application/json').status_code == 400
@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+from flask import Flask
+
+import response_cache
+from response_cache import FileCache, MemoryCache, cached_response, invalidate
+
+
+@pytest.fixture(params=['memory', 'file'])
+def backend(request, tmp_path):
+    previous = response_cache.get_cache_backend()
+    backend = MemoryCache() if request.param == 'memory' else FileCache(str(tmp_path))
+    response_cache.set_cache_backend(backend)
+    yield backend
+    response_cache.set_cache_backend(previous)
+
+
+def test_concurrent_invalidations_all_count(backend):
+    def bump():
+        for _ in range(50):
+            invalidate('race')
+
+    threads = [threading.Thread(target=bump) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend.get('generation:race') == 400
+
+
+def test_cache_hits_keep_the_response_headers(backend):
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/page')
+    @cached_response('page')
+    def page():
+        calls.append(1)
+        return 'body', 200, {'Content-Type': 'text/csv', 'Content-Disposition': 'attachment', 'X-Source': 'db'}
+
+    client = app.test_client()
+    first, second = client.get('/page'), client.get('/page')
+    assert len(calls) == 1
+    for response in (first, second):
+        assert response.data == b'body'
+        assert response.headers['Content-Type'] == 'text/csv'
+        assert response.headers['Content-Disposition'] == 'attachment'
+        assert response.headers['X-Source'] == 'db'
+        assert response.headers['Content-Length'] == '4'
+    assert second.headers['ETag'] == first.headers['ETag']
@@ -0,0 +1,17 @@
+"""Production entry point for preforking WSGI servers.
+
+``gunicorn -c gunicorn.conf.py`` imports this module once, in the master:
+the app is loaded without its background threads and warmed up, then every
+forked worker shares it copy-on-write. gunicorn.conf.py forks the process
+pools and then starts the threads in each worker after the fork.
+"""
+import os
+
+os.environ.setdefault('WISE_ROUTES_PRELOAD', '1')
+
+from app import PRELOAD, app, start_background_tasks, start_process_pools, warm_up  # noqa: E402
+
+if PRELOAD:
+    warm_up()
+
+__all__ = ['app', 'start_background_tasks', 'start_process_pools']